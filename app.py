@@ -1,11 +1,28 @@
 import streamlit as st
+from query_metrics import (
+    export_metrics_json,
+    export_metrics_prometheus,
+    summarize_trace,
+    trace_queries
+)
 from sup_signin import sign_in_with_google
-from supplier_db import get_or_create_supplier
-from home import show_home_page
-from purchase_order.main_po import show_main_po_page  # 🔥 Updated import for PO management
+
+# Pages (and the DB layer behind them) are imported when first shown, so the
+# login screen doesn't load psycopg2/pandas/PIL. Python caches the modules, so
+# later reruns pay nothing for these imports.
 
 def main():
     """Main entry point for the AMAS Supplier App."""
+    # Opt-in per-rerun query summary: [debug] query_summary = true in secrets
+    if st.secrets.get("debug", {}).get("query_summary", False):
+        with trace_queries() as trace:
+            render_app()
+        show_query_summary(trace)
+    else:
+        render_app()
+
+def render_app():
+    """Renders the app for the signed-in supplier."""
     st.title("AMAS Supplier App")
 
     # 1. Sign in with Google
@@ -14,6 +31,7 @@ def main():
         st.stop()
 
     # 2. Get supplier record
+    from supplier_db import get_or_create_supplier
     supplier = get_or_create_supplier(user_info["email"])
 
     # 3. Sidebar Navigation
@@ -22,22 +40,61 @@ def main():
 
     # 4. Show the selected page
     if menu_choice == "🏠 Home":
+        from home import show_home_page
         show_home_page()
     elif menu_choice == "📦 Purchase Orders":
+        from purchase_order.main_po import show_main_po_page  # 🔥 Updated import for PO management
         show_main_po_page(supplier)  # 🔥 Now using `main_po.py` to manage PO pages
     else:
         show_supplier_dashboard(supplier)
 
 def show_supplier_dashboard(supplier):
     """Displays the supplier dashboard."""
+    from purchase_order.po_handler import get_supplier_po_kpis
+
     st.subheader("📊 Supplier Dashboard")
-    st.write(f"Welcome, **{supplier['suppliername']}**!")
-    st.write(f"Your Supplier ID is: **{supplier['supplierid']}**")
+    st.write(f"Welcome, **{supplier.suppliername}**!")
+    st.write(f"Your Supplier ID is: **{supplier.supplierid}**")
+
+    # KPIs (aggregated in SQL, read from the SupplierPOStats summary row)
+    kpis = get_supplier_po_kpis(supplier.supplierid)
+    percent = lambda rate: f"{rate:.0%}" if rate is not None else "N/A"
+
+    st.write("**Open Purchase Orders**")
+    status_cols = st.columns(len(kpis["open_by_status"]))
+    for col, (status, count) in zip(status_cols, kpis["open_by_status"].items()):
+        col.metric(status, count)
+
+    # Delivery times are only recorded from migration 0001 on
+    delivery_help = (f"Based on the {kpis['measured_deliveries']} of {kpis['delivered_orders']} delivered "
+                     "orders with a recorded delivery time.")
+
+    col1, col2, col3 = st.columns(3)
+    col1.metric("On-time Delivery", percent(kpis["on_time_rate"]), help=delivery_help)
+    col2.metric("Acceptance Rate", percent(kpis["acceptance_rate"]))
+    col3.metric("Decline Rate", percent(kpis["decline_rate"]))
+
+    col1, col2, col3 = st.columns(3)
+    lead_time = kpis["avg_lead_time_days"]
+    col1.metric("Avg. Lead Time", f"{lead_time:.1f} days" if lead_time is not None else "N/A",
+                help=delivery_help)
+    col2.metric("Estimated Value", f"{kpis['estimated_value']:,.2f}")
+    col3.metric("Proposed Value", f"{kpis['proposed_value']:,.2f}")
 
     # Logout button
     if st.button("Log out"):
         st.logout()
         st.rerun()
 
+def show_query_summary(trace):
+    """Shows how many queries this rerun issued and how long they took (sidebar)."""
+    count, total_ms, total_bytes = summarize_trace(trace)
+    with st.sidebar.expander(f"🛠️ Queries: {count} in {total_ms:.0f} ms"):
+        st.caption(f"{total_bytes / 1024:.1f} KiB returned")
+        for q in sorted(trace, key=lambda q: q["ms"], reverse=True):
+            st.write(f"`{q['call_site']}` — {q['ms']:.1f} ms, {q['rows']} rows")
+        st.download_button("Metrics (JSON)", export_metrics_json(), "query_metrics.json", "application/json")
+        st.download_button("Metrics (Prometheus)", export_metrics_prometheus(), "query_metrics.prom", "text/plain")
+
 if __name__ == "__main__":
     main()
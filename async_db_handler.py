@@ -0,0 +1,128 @@
+import asyncio
+import itertools
+import re
+import threading
+import time
+
+import streamlit as st
+from query_metrics import current_trace, find_call_site, record_query, result_size
+
+# Quoted strings/identifiers and comments (left as they are), or a %s / %% outside them
+_QUERY_TOKEN = re.compile(r"""'(?:[^']|'')*'|"(?:[^"]|"")*"|--[^\n]*|/\*.*?\*/|%s|%%""", re.DOTALL)
+
+
+def to_asyncpg_query(query):
+    """
+    Converts a psycopg2-style query (%s placeholders, %% for a literal %) to asyncpg
+    style ($1, $2, ...). A %s inside a string literal, quoted identifier or comment
+    is left alone; %% becomes % everywhere, as psycopg2 does.
+    """
+    counter = itertools.count(1)
+
+    def replace(match):
+        token = match.group()
+        if token == "%s":
+            return f"${next(counter)}"
+        return token.replace("%%", "%")
+
+    return _QUERY_TOKEN.sub(replace, query)
+
+
+class AsyncQueryRunner:
+    """
+    Runs read queries concurrently on an asyncpg pool.
+
+    The pool lives on a dedicated event loop in a background thread, so the
+    (synchronous) Streamlit script thread can submit work with `run_sync` /
+    `fetch_many` and block only until all queries have finished.
+    """
+
+    def __init__(self, dsn, min_size=1, max_size=10, statement_cache_size=0):
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.statement_cache_size = statement_cache_size
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="async-db-loop", daemon=True)
+        self._thread.start()
+        self._pool = self.run_sync(self._create_pool())
+
+    async def _create_pool(self):
+        import asyncpg  # imported with the first runner, not with every page
+
+        # Named prepared statements don't survive transaction-mode poolers such as
+        # Neon's pooled endpoint (PgBouncer), so asyncpg's statement cache is off
+        # unless configured
+        return await asyncpg.create_pool(self.dsn, min_size=self.min_size, max_size=self.max_size,
+                                         statement_cache_size=self.statement_cache_size)
+
+    def run_sync(self, coro):
+        """Runs a coroutine on the runner's event loop and waits for its result."""
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    async def fetch(self, query, params=None, call_site="unknown", trace=None, row_factory=None):
+        """
+        Executes a SELECT (psycopg2-style placeholders) and returns a list of dicts
+        keyed by column name, or of row_factory(tuple) results, like run_query.
+        """
+        async with self._pool.acquire() as conn:
+            start = time.perf_counter()
+            records = await conn.fetch(to_asyncpg_query(query), *(params or ()))
+            elapsed = time.perf_counter() - start
+        rows = [(dict if row_factory is None else tuple)(record) for record in records]
+        record_query(call_site, query, elapsed, rows=len(rows), nbytes=result_size(rows), trace=trace)
+        if row_factory is not None:
+            rows = [row_factory(row) for row in rows]
+        return rows
+
+    async def gather(self, queries, call_site="unknown", trace=None):
+        return await asyncio.gather(*(
+            self.fetch(query, params, call_site=call_site, trace=trace, row_factory=row_factory)
+            for query, params, row_factory in (q if len(q) == 3 else (*q, None) for q in queries)
+        ))
+
+    def fetch_many(self, queries, call_site=None, trace=None):
+        """
+        Runs several independent SELECTs concurrently.
+
+        Args:
+            queries (list[tuple]): (query, params) pairs, or (query, params, row_factory).
+            call_site (str, optional): Caller recorded in query metrics (default: detected).
+            trace (list, optional): Per-rerun trace to record into (default: caller's active trace).
+
+        Returns:
+            list[list[dict]]: One result list per query, in the same order.
+        """
+        # Metrics context must be captured here: the queries run on the loop thread
+        call_site = call_site or find_call_site()
+        trace = trace if trace is not None else current_trace()
+        return self.run_sync(self.gather(queries, call_site=call_site, trace=trace))
+
+    def close(self):
+        self.run_sync(self._pool.close())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+
+@st.cache_resource
+def get_async_runner():
+    """
+    Process-wide async runner with its own pool. Uses [neon] dsn from secrets and
+    optional async_pool_min_size / async_pool_max_size, and async_statement_cache_size
+    (default 0: no prepared-statement cache, required behind a transaction-mode
+    pooler; raise it, e.g. to 100, only on a direct connection).
+    """
+    config = st.secrets["neon"]
+    return AsyncQueryRunner(
+        config["dsn"],
+        min_size=int(config.get("async_pool_min_size", 1)),
+        max_size=int(config.get("async_pool_max_size", 10)),
+        statement_cache_size=int(config.get("async_statement_cache_size", 0)),
+    )
+
+def fetch_many(queries):
+    """Runs several independent SELECTs concurrently from synchronous code."""
+    try:
+        return get_async_runner().fetch_many(queries, call_site=find_call_site())
+    except Exception as e:
+        st.error(f"🚨 Query Execution Error: {e}")
+        raise
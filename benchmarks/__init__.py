@@ -0,0 +1,7 @@
+"""
+Reproducible performance benchmarks for the supplier app.
+
+`python -m benchmarks.run --dsn postgresql://localhost/amas_bench --scale small`
+seeds a local PostgreSQL with synthetic data, times the data-layer and page
+render functions, and writes the results as JSON (see benchmarks/run.py).
+"""
@@ -0,0 +1,97 @@
+"""
+Benchmark: sequential psycopg2 page loading vs. concurrent asyncpg loading.
+
+Needs a local PostgreSQL holding the supplier/PO schema and some data:
+    BENCH_DSN=postgresql://localhost/amas_bench BENCH_SUPPLIER_ID=1 \\
+        python -m benchmarks.bench_async_loading
+
+The asyncpg path runs with the app's default (no prepared-statement cache, as
+needed behind a transaction-mode pooler) and with asyncpg's own default of 100.
+"""
+import os
+import statistics
+import time
+
+import psycopg2
+from psycopg2.extras import RealDictCursor
+
+from async_db_handler import AsyncQueryRunner
+
+ROUNDS = 20
+
+ACTIVE_QUERY = """
+SELECT POID, OrderDate, ExpectedDelivery, Status, SupProposedDeliver, ProposedStatus, SupplierNote
+FROM PurchaseOrders
+WHERE SupplierID = %s AND Status IN ('Pending', 'Accepted', 'Shipping')
+ORDER BY OrderDate DESC;
+"""
+ARCHIVED_QUERY = """
+SELECT POID, OrderDate, ExpectedDelivery, Status, SupProposedDeliver, ProposedStatus, SupplierNote
+FROM PurchaseOrders
+WHERE SupplierID = %s AND Status = ANY(%s)
+ORDER BY OrderDate DESC, POID DESC
+LIMIT %s;
+"""
+ITEMS_QUERY = """
+SELECT poi.POID, i.ItemID, i.ItemNameEnglish, md5(i.ItemPicture) AS PictureHash,
+       poi.OrderedQuantity, poi.EstimatedPrice, poi.SupProposedQuantity, poi.SupProposedPrice
+FROM PurchaseOrderItems poi
+JOIN Item i ON poi.ItemID = i.ItemID
+WHERE poi.POID = %s;
+"""
+
+
+def sequential(conn, supplier_id):
+    """The old path: headers, then one items query per active PO."""
+    with conn.cursor() as cur:
+        cur.execute(ACTIVE_QUERY, (supplier_id,))
+        active = cur.fetchall()
+        cur.execute(ARCHIVED_QUERY, (supplier_id, ["Declined", "Delivered", "Completed"], 21))
+        cur.fetchall()
+        for po in active:
+            cur.execute(ITEMS_QUERY, (po["poid"],))
+            cur.fetchall()
+    conn.rollback()
+
+
+def concurrent(runner, supplier_id):
+    """The new path: the three page queries gathered on the asyncpg pool."""
+    runner.fetch_many([
+        (ACTIVE_QUERY, (supplier_id,)),
+        (ARCHIVED_QUERY, (supplier_id, ["Declined", "Delivered", "Completed"], 21)),
+        (ITEMS_QUERY.replace("WHERE poi.POID = %s", """JOIN PurchaseOrders po ON po.POID = poi.POID
+WHERE po.SupplierID = %s AND po.Status = ANY(%s)"""), (supplier_id, ["Pending", "Accepted", "Shipping"])),
+    ])
+
+
+def timed(func, *args):
+    samples = []
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        func(*args)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples), max(samples)
+
+
+def main():
+    dsn = os.environ["BENCH_DSN"]
+    supplier_id = int(os.environ.get("BENCH_SUPPLIER_ID", 1))
+
+    conn = psycopg2.connect(dsn, cursor_factory=RealDictCursor)
+    runner = AsyncQueryRunner(dsn, min_size=3, max_size=3)
+    cached_runner = AsyncQueryRunner(dsn, min_size=3, max_size=3, statement_cache_size=100)
+    try:
+        for label, func, arg in (("sequential (psycopg2)", sequential, conn),
+                                 ("concurrent (asyncpg)", concurrent, runner),
+                                 ("  + statement cache", concurrent, cached_runner)):
+            func(arg, supplier_id)  # warm up
+            median, worst = timed(func, arg, supplier_id)
+            print(f"{label:<24} median {median:8.2f} ms   max {worst:8.2f} ms")
+    finally:
+        conn.close()
+        runner.close()
+        cached_runner.close()
+
+
+if __name__ == "__main__":
+    main()
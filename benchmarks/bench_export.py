@@ -0,0 +1,66 @@
+"""
+Benchmark: export throughput and peak memory for a supplier with 1M order lines,
+per format. Each format runs in its own process so peak RSS isn't shared.
+
+    python -m benchmarks.bench_export --dsn postgresql://localhost/amas_bench [--formats csv,parquet]
+
+Seeds the "export" scale (one supplier, 25k orders × 40 lines) unless --no-seed is given.
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.run import configure_secrets
+from benchmarks.seed import REPO_DIR, seed, supplier_email
+
+FORMATS = ("csv", "xlsx", "parquet")
+
+
+def run_format(dsn, fmt):
+    """Exports supplier 1's orders in `fmt` (in this process); returns its measurements."""
+    configure_secrets(dsn)
+    from supplier_db import get_supplier_by_email
+    from purchase_order.po_export import EXPORT_FORMATS, export_purchase_orders
+
+    supplier_id = get_supplier_by_email(supplier_email(1)).supplierid
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    with tempfile.NamedTemporaryFile(suffix=f".{EXPORT_FORMATS[fmt][1]}") as out:
+        start = time.perf_counter()
+        lines = export_purchase_orders(supplier_id, fmt, out)
+        seconds = time.perf_counter() - start
+        out.flush()
+        size = os.path.getsize(out.name)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return {"format": fmt, "lines": lines, "seconds": seconds, "bytes": size,
+            "peak_rss_mb": peak, "added_rss_mb": peak - baseline}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dsn", default=os.environ.get("BENCH_DSN"), required="BENCH_DSN" not in os.environ)
+    parser.add_argument("--formats", default=",".join(FORMATS))
+    parser.add_argument("--no-seed", action="store_true")
+    parser.add_argument("--format", choices=FORMATS, help=argparse.SUPPRESS)  # child process
+    args = parser.parse_args()
+
+    if args.format:
+        print(json.dumps(run_format(args.dsn, args.format)))
+        return
+
+    if not args.no_seed:
+        seed(args.dsn, "export")
+    for fmt in args.formats.split(","):
+        command = [sys.executable, "-m", "benchmarks.bench_export", "--dsn", args.dsn, "--format", fmt]
+        result = json.loads(subprocess.check_output(command, cwd=REPO_DIR, text=True).strip().splitlines()[-1])
+        print(f"{fmt:<8} {result['lines']:>9} lines  {result['seconds']:7.2f} s  "
+              f"{result['lines'] / result['seconds']:>10,.0f} lines/s  {result['bytes'] / 2**20:8.1f} MiB file  "
+              f"peak RSS {result['peak_rss_mb']:7.1f} MiB (+{result['added_rss_mb']:.1f})")
+
+
+if __name__ == "__main__":
+    main()
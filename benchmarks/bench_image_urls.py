@@ -0,0 +1,114 @@
+"""
+Benchmark: page payload of a 100-line PO with inlined thumbnail data URIs vs.
+image-server URLs, and (with --dsn) the image server's response times.
+
+    python -m benchmarks.bench_image_urls [--dsn postgresql://localhost/amas_bench]
+
+With --dsn the database is seeded (tiny scale), variants are backfilled, and the
+server is checked: 200 with ETag / Cache-Control, then 304 on revalidation, and
+403 for an unsigned or wrongly signed URL.
+"""
+import argparse
+import hashlib
+import statistics
+import threading
+import time
+import urllib.request
+from urllib.error import HTTPError
+
+from benchmarks.bench_thumbnails import ITEM_COUNT, make_pictures
+from models import PurchaseOrderItem
+from purchase_order.po_render import render_items_table
+from purchase_order.thumbnails import ThumbnailCache, picture_url
+
+BASE_URL = "http://localhost:8502"
+SECRET = "bench-signing-key"
+ROUNDS = 50
+
+
+def items_with(pictures):
+    return [PurchaseOrderItem(
+        itemid=i,
+        itemnameenglish=f"Item {i}",
+        picturehash=None,
+        orderedquantity=10,
+        estimatedprice=9.5,
+        supproposedquantity=None,
+        supproposedprice=None,
+        itempicture=picture,
+    ) for i, picture in enumerate(pictures, start=1)]
+
+
+def payload_sizes():
+    pictures = make_pictures()
+    cache = ThumbnailCache(max_entries=ITEM_COUNT)
+    data_uris = [cache.put(i, hashlib.md5(p).hexdigest(), p) for i, p in enumerate(pictures, start=1)]
+    urls = [picture_url(BASE_URL, i, hashlib.md5(p).hexdigest(), SECRET) for i, p in enumerate(pictures, start=1)]
+    inline = len(render_items_table(items_with(data_uris)))
+    by_url = len(render_items_table(items_with(urls)))
+    print(f"items table, {ITEM_COUNT} pictured lines:  data URIs {inline / 1024:8.1f} KiB   "
+          f"URLs {by_url / 1024:8.1f} KiB  ({inline / by_url:.0f}x smaller)")
+
+
+def request(url, headers=None):
+    """Returns (status, headers, body length, ms)."""
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, headers=headers or {})) as response:
+            body = response.read()
+            status, response_headers = response.status, response.headers
+    except HTTPError as e:
+        body, status, response_headers = b"", e.code, e.headers
+    return status, response_headers, len(body), (time.perf_counter() - start) * 1000
+
+
+def check_server(dsn):
+    import psycopg2
+    from benchmarks.seed import seed
+    from image_server import backfill, make_server
+
+    seed(dsn, "tiny")
+    print(f"backfill wrote {backfill(dsn, log=lambda message: None)} variant(s)")
+
+    conn = psycopg2.connect(dsn)
+    with conn, conn.cursor() as cur:
+        cur.execute("SELECT ItemID, md5(ItemPicture) FROM Item WHERE ItemPicture IS NOT NULL ORDER BY ItemID LIMIT 1")
+        itemid, source_hash = cur.fetchone()
+    conn.close()
+
+    server = make_server(dsn, SECRET, "127.0.0.1", 0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = picture_url(f"http://127.0.0.1:{server.server_address[1]}", itemid, source_hash, SECRET)
+    try:
+        for forged in (url.split("&s=")[0], url[:-1] + ("0" if url[-1] != "0" else "1"),
+                       picture_url(url.split("/items/")[0], itemid, source_hash, "wrong key")):
+            status = request(forged)[0]
+            assert status == 403, (forged, status)
+
+        status, headers, size, _ = request(url)
+        assert status == 200 and size > 0, status
+        assert "immutable" in headers["Cache-Control"], headers["Cache-Control"]
+        tag = headers["ETag"]
+        status, _, _, _ = request(url, {"If-None-Match": tag})
+        assert status == 304, status
+
+        full = [request(url)[3] for _ in range(ROUNDS)]
+        revalidated = [request(url, {"If-None-Match": tag})[3] for _ in range(ROUNDS)]
+        print(f"GET {size} B thumbnail   median {statistics.median(full):6.2f} ms   "
+              f"304 revalidation median {statistics.median(revalidated):6.2f} ms")
+    finally:
+        server.shutdown()
+        server.RequestHandlerClass.store.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dsn")
+    args = parser.parse_args()
+    payload_sizes()
+    if args.dsn:
+        check_server(args.dsn)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Benchmark: cold-start import cost of the app, per path a user takes through it.
+Each sample runs `python -X importtime` in a fresh process (no database needed).
+
+    python -m benchmarks.bench_importtime [--rounds 5] [--top 10]
+
+Paths are measured against a bare `import streamlit` baseline. Exits with status 1
+if the login path loads any of LOGIN_FORBIDDEN beyond what streamlit itself loads.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+# Not imported from benchmarks.seed, which needs psycopg2 and PIL
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Path -> modules imported by a rerun of that path (app.py imports the rest lazily)
+SCENARIOS = {
+    "streamlit": ["streamlit"],
+    "login": ["app"],
+    "home": ["app", "supplier_db", "home"],
+    "dashboard": ["app", "supplier_db", "purchase_order.po_handler"],
+    "track_po": ["app", "supplier_db", "purchase_order.main_po", "purchase_order.track_po"],
+    "archived_po": ["app", "supplier_db", "purchase_order.main_po", "purchase_order.archived_po"],
+}
+
+# Heavy libraries / DB layer the login screen must not import
+LOGIN_FORBIDDEN = (
+    "psycopg2", "asyncpg", "pandas", "PIL", "openpyxl", "pyarrow",
+    "db_handler", "async_db_handler", "supplier_db", "purchase_order",
+)
+
+
+def import_profile(modules):
+    """
+    Imports `modules` in a fresh interpreter under -X importtime.
+
+    Returns:
+        dict[str, tuple[int, int]]: module -> (self µs, cumulative µs).
+    """
+    code = "; ".join(f"import {module}" for module in modules)
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                          cwd=REPO_DIR, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"`{code}` failed:\n{proc.stderr[-2000:]}")
+    profile = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        profile[name.strip()] = (int(self_us), int(cumulative_us))
+    return profile
+
+
+def measure(modules, rounds):
+    """Returns the median total import time (ms) and the per-module median self times (ms)."""
+    profiles = [import_profile(modules) for _ in range(rounds)]
+    totals = [sum(s for s, _ in profile.values()) / 1000 for profile in profiles]
+    names = set().union(*profiles)
+    self_ms = {name: statistics.median(p.get(name, (0, 0))[0] for p in profiles) / 1000 for name in names}
+    return statistics.median(totals), self_ms
+
+
+def _top_level(name):
+    return name.split(".")[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="Heaviest added packages to list per path")
+    args = parser.parse_args()
+
+    results = {name: measure(modules, args.rounds) for name, modules in SCENARIOS.items()}
+    baseline_ms, baseline_modules = results["streamlit"]
+
+    for name, (total_ms, self_ms) in results.items():
+        print(f"{name:<12} {total_ms:8.1f} ms  ({total_ms - baseline_ms:+8.1f} ms over streamlit, "
+              f"{len(self_ms)} modules)")
+        if name == "streamlit":
+            continue
+        # Attribute added modules' self time to their top-level package
+        packages = {}
+        for module, ms in self_ms.items():
+            if module not in baseline_modules:
+                packages[_top_level(module)] = packages.get(_top_level(module), 0) + ms
+        for package, ms in sorted(packages.items(), key=lambda p: p[1], reverse=True)[:args.top]:
+            print(f"    {package:<28} {ms:8.1f} ms")
+
+    login_modules = results["login"][1]
+    leaked = sorted({
+        _top_level(module) for module in login_modules
+        if module not in baseline_modules and _top_level(module) in LOGIN_FORBIDDEN
+    })
+    if leaked:
+        print(f"FAIL: the login path imports {', '.join(leaked)}")
+        sys.exit(1)
+    print("OK: the login path imports no DB layer, page modules or heavy libraries")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Micro-benchmark: PO items table rendering at 10, 100 and 1000 lines.
+
+Compares the old row-by-row DataFrame.to_html path with render_items_table
+(cold = first render, warm = unchanged PO on a later rerun).
+Run from the repo root:  python -m benchmarks.bench_items_table
+"""
+import time
+from decimal import Decimal
+
+import pandas as pd
+
+from models import PurchaseOrderItem
+from purchase_order.po_render import _render_rows, render_items_table
+
+LINE_COUNTS = (10, 100, 1000)
+ROUNDS = 20
+THUMBNAIL_URI = "data:image/jpeg;base64," + "A" * 3000
+
+
+def make_items(count):
+    return [PurchaseOrderItem(
+        itemid=i,
+        itemnameenglish=f"Item <{i}> & Co",
+        picturehash=f"{i:032x}" if i % 4 else None,
+        orderedquantity=i % 50 + 1,
+        estimatedprice=Decimal("9.99") if i % 3 else None,
+        supproposedquantity=i % 7 or None,
+        supproposedprice=Decimal("8.50") if i % 5 else None,
+        itempicture=THUMBNAIL_URI if i % 4 else None,
+    ) for i in range(count)]
+
+
+def legacy_render(items):
+    rows = []
+    for item in items:
+        img_html = f'<img src="{item.itempicture}" width="50" />' if item.itempicture else "No Image"
+        rows.append({
+            "ItemID": item.itemid,
+            "Picture": img_html,
+            "Item Name": item.itemnameenglish,
+            "Ordered Qty": item.orderedquantity,
+            "Est. Price": item.estimatedprice or "N/A",
+            "SupQty": item.supproposedquantity or "",
+            "SupPrice": item.supproposedprice or "",
+        })
+    df = pd.DataFrame(rows, columns=["ItemID", "Picture", "Item Name", "Ordered Qty", "Est. Price", "SupQty", "SupPrice"])
+    return df.to_html(escape=False, index=False)
+
+
+def timed(func, before=None):
+    total = 0.0
+    for _ in range(ROUNDS):
+        if before:
+            before()
+        start = time.perf_counter()
+        func()
+        total += time.perf_counter() - start
+    return total / ROUNDS * 1000
+
+
+def main():
+    print(f"{'lines':>6} {'legacy':>12} {'cold':>12} {'warm':>12}")
+    for count in LINE_COUNTS:
+        items = make_items(count)
+        legacy = timed(lambda: legacy_render(items))
+        cold = timed(lambda: render_items_table(items), before=_render_rows.cache_clear)
+        warm = timed(lambda: render_items_table(items))
+        print(f"{count:>6} {legacy:>9.3f} ms {cold:>9.3f} ms {warm:>9.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
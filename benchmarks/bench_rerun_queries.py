@@ -0,0 +1,124 @@
+"""
+Benchmark: database queries issued per render of each PO view, on the first
+render, on a rerun with a warm query cache, and on a rerun after the cache was
+emptied (as after its TTL or an invalidation).
+
+    python -m benchmarks.bench_rerun_queries --dsn postgresql://localhost/amas_bench \\
+        [--layout before|after] [--prefetch] [--feed]
+
+--layout before renders the original st.tabs page, which ran both views (and
+their shared load_purchase_order_pages) on every rerun; "after" renders the
+current show_main_po_page, which runs only the selected view. Queries on the
+rerun's own thread are what the user waits for; with --prefetch (after layout
+only) the hidden view is also loaded on a background thread, counted separately.
+With --feed the PO change feed is enabled ([feed] dsn = --dsn), so Track PO
+reads active orders from its snapshot.
+"""
+import argparse
+import os
+import time
+from collections import Counter
+
+from benchmarks.run import ACTIVE_VIEW, ARCHIVED_VIEW, configure_secrets
+from benchmarks.seed import SCALES, seed, supplier_email
+
+
+def _render_after(supplier, view):
+    import streamlit as st
+    from query_metrics import trace_queries
+    from purchase_order.main_po import show_main_po_page
+
+    st.session_state["po_view"] = view
+    with trace_queries() as trace:
+        show_main_po_page(supplier)
+    st.session_state["bench_queries"] = [q["call_site"] for q in trace]
+
+
+def _render_before(supplier, view):
+    """The page as it was before views were rendered lazily: both tabs, every rerun.
+       (AppTest runs this function's source alone: no module-level names.)"""
+    import streamlit as st
+    from query_metrics import trace_queries
+    from purchase_order.archived_po import show_archived_po_page
+    from purchase_order.po_handler import ARCHIVED_PAGE_SIZE, load_purchase_order_pages
+    from purchase_order.track_po import show_purchase_orders_page
+
+    with trace_queries() as trace:
+        st.title("Purchase Orders Management")
+        data = load_purchase_order_pages(supplier.supplierid, archived_page_size=ARCHIVED_PAGE_SIZE)
+        tab1, tab2 = st.tabs(["📦 Track PO", "📂 Archived PO"])
+        with tab1:
+            show_purchase_orders_page(supplier, data)
+        with tab2:
+            show_archived_po_page(supplier, data)
+    st.session_state["bench_queries"] = [q["call_site"] for q in trace]
+
+
+def _total_queries():
+    from query_metrics import get_query_metrics
+    return sum(stats["count"] for stats in get_query_metrics().values())
+
+
+def _wait_for_prefetch():
+    from purchase_order import main_po
+    while main_po._prefetching:
+        time.sleep(0.01)
+
+
+def _run(at):
+    before = _total_queries()
+    start = time.perf_counter()
+    at.run()
+    elapsed = (time.perf_counter() - start) * 1000
+    if at.exception:
+        raise RuntimeError(at.exception[0].message)
+    _wait_for_prefetch()
+    queries = at.session_state["bench_queries"]
+    return queries, _total_queries() - before - len(queries), elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dsn", default=os.environ.get("BENCH_DSN"), required="BENCH_DSN" not in os.environ)
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small")
+    parser.add_argument("--layout", choices=("before", "after"), default="after")
+    parser.add_argument("--prefetch", action="store_true", help="Prefetch the hidden view (after layout)")
+    parser.add_argument("--feed", action="store_true", help="Enable the PO change feed")
+    parser.add_argument("--no-seed", action="store_true")
+    args = parser.parse_args()
+
+    if not args.no_seed:
+        seed(args.dsn, args.scale)
+    configure_secrets(args.dsn)
+    if args.feed:
+        with open(os.path.join(".streamlit", "secrets.toml"), "a") as f:
+            f.write(f'[feed]\ndsn = "{args.dsn}"\n')
+
+    from streamlit.testing.v1 import AppTest
+    from query_cache import get_query_cache
+    from supplier_db import get_supplier_by_email
+    from purchase_order import main_po
+    from purchase_order.po_feed import po_feed_listening
+
+    main_po.PREFETCH_OTHER_VIEW = args.prefetch
+    render = _render_before if args.layout == "before" else _render_after
+    supplier = get_supplier_by_email(supplier_email(1))
+    if args.feed and not po_feed_listening():
+        raise SystemExit("Change feed is not listening (is migration 0003 applied?)")
+
+    print(f"layout: {args.layout}, prefetch: {'on' if args.prefetch else 'off'}, "
+          f"change feed: {'on' if args.feed else 'off'}")
+    for view in (ACTIVE_VIEW, ARCHIVED_VIEW):
+        get_query_cache().clear()
+        at = AppTest.from_function(render, args=(supplier, view), default_timeout=120)
+        runs = {"first render": _run(at), "rerun, warm cache": _run(at)}
+        get_query_cache().clear()
+        runs["rerun, cache emptied"] = _run(at)
+        for label, (queries, background, ms) in runs.items():
+            sites = ", ".join(f"{site} ×{n}" for site, n in Counter(queries).items()) or "-"
+            print(f"{view:<16} {label:<22} {len(queries):>3} queries (+{background} background) "
+                  f"{ms:8.1f} ms   {sites}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Micro-benchmark: per-row memory, construction and field-access time of the row
+models (models.py) against the dict rows RealDictCursor used to return.
+
+RealDictRow subclasses OrderedDict, so it is approximated by one; a plain dict
+(its lower bound) is shown too. Rows are built from the same pre-fetched tuples,
+so only the row container is measured, not the column values it shares.
+Run from the repo root:  python -m benchmarks.bench_row_models
+"""
+import timeit
+import tracemalloc
+from collections import OrderedDict
+from dataclasses import fields
+from datetime import date
+from decimal import Decimal
+from operator import attrgetter, itemgetter
+
+from models import PurchaseOrder, PurchaseOrderItem, Supplier
+
+ROWS = 100_000
+
+SAMPLE_ROWS = {
+    Supplier: (7, "Acme", "Distributor", "LB", "Beirut", "Main St", "1100", "Rita",
+               "+961", "rita@acme.test", "30 days", "IBAN LB00"),
+    PurchaseOrder: (42, date(2024, 5, 1), date(2024, 5, 20), "Pending", None, None, None, 1),
+    PurchaseOrderItem: (11, "Olive oil 1L", "9e107d9d372bb6826bd81d3542a419d6", 24,
+                        Decimal("9.99"), None, None),
+}
+
+
+def bytes_per_row(build, rows):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    built = [build(row) for row in rows]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    # Minus the list's pointer to each row
+    return (after - before) / len(built) - 8
+
+
+def ns_per_call(func, number):
+    return min(timeit.repeat(func, number=number, repeat=5)) / number * 1e9
+
+
+def main():
+    print(f"{'model':<18} {'row type':<12} {'bytes/row':>10} {'build ns':>9} {'access ns':>10}")
+    for model, sample in SAMPLE_ROWS.items():
+        columns = [f.name for f in fields(model)][:len(sample)]
+        rows = [tuple(sample) for _ in range(ROWS)]
+        get_item, get_attr = itemgetter(columns[0]), attrgetter(columns[0])
+        variants = (
+            ("RealDictRow", lambda row: OrderedDict(zip(columns, row)), get_item),
+            ("dict", lambda row: dict(zip(columns, row)), get_item),
+            ("model", model.from_row, get_attr),
+        )
+        for label, build, get in variants:
+            row = build(sample)
+            build_ns = ns_per_call(lambda: build(sample), 100_000)
+            access_ns = ns_per_call(lambda: get(row), 1_000_000)
+            print(f"{model.__name__:<18} {label:<12} {bytes_per_row(build, rows):>10.0f} "
+                  f"{build_ns:>9.0f} {access_ns:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Benchmark: hit rate, lookup latency and stale reads of the query cache backends
+as the number of server processes grows (no database needed).
+
+    python -m benchmarks.bench_shared_cache [--workers 1 2 4 8] [--ops 5000] [--db-ms 2]
+
+Each worker process reads suppliers (skewed: a few are hot) through the cache
+like a cached_query does, a fetch costing --db-ms of simulated database time, and
+now and then "writes" a supplier and invalidates its tag. A read is stale if it
+returns an older version than the one committed before the read began: the
+per-process "memory" backend can't see other processes' invalidations, the
+shared "sqlite" backend can.
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from query_cache import QueryCache, SQLiteQueryCache, supplier_tag
+
+SUPPLIERS = 200
+
+# Set in each worker by _init_worker: the simulated database and its write lock
+_versions = None
+_write_lock = None
+
+
+def _init_worker(versions, write_lock):
+    global _versions, _write_lock
+    _versions, _write_lock = versions, write_lock
+
+
+def _make_cache(backend, path, ttl):
+    if backend == "memory":
+        return QueryCache(ttl=ttl, max_entries=SUPPLIERS * 2)
+    return SQLiteQueryCache(path, ttl=ttl, max_entries=SUPPLIERS * 2)
+
+
+def _run_worker(job):
+    backend, path, ops, write_ratio, db_ms, ttl, seed = job
+    cache = _make_cache(backend, path, ttl)
+    rng = random.Random(seed)
+    weights = [1 / (n + 1) for n in range(SUPPLIERS)]
+    hit_us, read_ms, stale = [], [], 0
+    start = time.perf_counter()
+    for _ in range(ops):
+        supplier = rng.choices(range(SUPPLIERS), weights)[0]
+        if rng.random() < write_ratio:
+            with _write_lock:
+                _versions[supplier] += 1
+                cache.invalidate(supplier_tag(supplier))
+            continue
+        with _write_lock:
+            committed = _versions[supplier]
+        key = ("bench", "get_supplier", (supplier,), ())
+        read_start = time.perf_counter()
+        found, version = cache.get(key)
+        if found:
+            hit_us.append((time.perf_counter() - read_start) * 1e6)
+        else:
+            generation = cache.generation
+            time.sleep(db_ms / 1000)
+            version = _versions[supplier]
+            cache.set(key, version, [supplier_tag(supplier)], generation=generation)
+        read_ms.append((time.perf_counter() - read_start) * 1000)
+        stale += version < committed
+    return {"hit_us": hit_us, "read_ms": read_ms, "stale": stale, "seconds": time.perf_counter() - start}
+
+
+def run(backend, workers, args):
+    path = os.path.join(tempfile.mkdtemp(prefix="amas_cache_"), "cache.sqlite3")
+    if backend == "sqlite":
+        SQLiteQueryCache(path)  # create the schema before the workers race for it
+    versions = multiprocessing.Array("i", SUPPLIERS, lock=False)
+    write_lock = multiprocessing.Lock()
+    jobs = [(backend, path, args.ops, args.write_ratio, args.db_ms, args.ttl, n) for n in range(workers)]
+    with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(versions, write_lock)) as pool:
+        results = pool.map(_run_worker, jobs)
+    hit_us = sorted(us for r in results for us in r["hit_us"])
+    read_ms = [ms for r in results for ms in r["read_ms"]]
+    return {
+        "hit_rate": len(hit_us) / len(read_ms) if read_ms else 0.0,
+        "hit_p50_us": statistics.median(hit_us) if hit_us else 0.0,
+        "hit_p95_us": hit_us[int(len(hit_us) * 0.95)] if hit_us else 0.0,
+        "read_mean_ms": statistics.mean(read_ms) if read_ms else 0.0,
+        "stale": sum(r["stale"] for r in results),
+        "reads": len(read_ms),
+        "reads_per_s": len(read_ms) / max(r["seconds"] for r in results),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--backends", nargs="+", choices=["memory", "sqlite"], default=["memory", "sqlite"])
+    parser.add_argument("--ops", type=int, default=5000, help="Operations per worker")
+    parser.add_argument("--write-ratio", type=float, default=0.01)
+    parser.add_argument("--db-ms", type=float, default=2.0, help="Simulated cost of a cache miss")
+    parser.add_argument("--ttl", type=float, default=60.0)
+    args = parser.parse_args()
+
+    print(f"{'backend':<8} {'workers':>7} {'hit rate':>9} {'hit p50':>10} {'hit p95':>10} "
+          f"{'read mean':>10} {'reads/s':>9} {'stale':>12}")
+    for backend in args.backends:
+        for workers in args.workers:
+            r = run(backend, workers, args)
+            print(f"{backend:<8} {workers:>7} {r['hit_rate']:>8.1%} {r['hit_p50_us']:>7.1f} µs "
+                  f"{r['hit_p95_us']:>7.1f} µs {r['read_mean_ms']:>7.3f} ms {r['reads_per_s']:>9.0f} "
+                  f"{r['stale']:>5}/{r['reads']:<6}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Benchmark: peak memory of reading 100k order lines with run_query (fetchall into
+dicts) vs. stream_query (server-side cursor) with dict, namedtuple and tuple rows.
+Each mode runs in its own process so peak RSS isn't shared.
+
+    python -m benchmarks.bench_streaming --dsn postgresql://localhost/amas_bench [--with-pictures]
+
+Seeds the "medium" scale (200k lines) unless --no-seed is given.
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+from benchmarks.run import configure_secrets
+from benchmarks.seed import REPO_DIR, seed
+
+ROWS = 100_000
+MODES = ("fetchall", "stream:dict", "stream:namedtuple", "stream:tuple")
+
+LINES_QUERY = """
+SELECT po.POID, po.OrderDate, po.ExpectedDelivery, po.Status, po.SupplierNote,
+       i.ItemID, i.ItemNameEnglish, poi.OrderedQuantity, poi.EstimatedPrice,
+       poi.SupProposedQuantity, poi.SupProposedPrice{pictures}
+FROM PurchaseOrders po
+JOIN PurchaseOrderItems poi ON poi.POID = po.POID
+JOIN Item i ON poi.ItemID = i.ItemID
+ORDER BY po.POID, i.ItemID
+LIMIT %s;
+"""
+
+
+def peak_rss_mb():
+    # ru_maxrss is in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_mode(dsn, mode, with_pictures):
+    """Reads ROWS lines in `mode` (in this process); returns its measurements."""
+    configure_secrets(dsn)
+    from db_handler import run_query, stream_query
+
+    query = LINES_QUERY.format(pictures=", i.ItemPicture" if with_pictures else "")
+    baseline = peak_rss_mb()
+    start = time.perf_counter()
+    if mode == "fetchall":
+        count = len(run_query(query, (ROWS,)))
+    else:
+        count = sum(1 for _ in stream_query(query, (ROWS,), row_type=mode.split(":")[1]))
+    return {
+        "mode": mode,
+        "rows": count,
+        "seconds": time.perf_counter() - start,
+        "peak_rss_mb": peak_rss_mb(),
+        "added_rss_mb": peak_rss_mb() - baseline,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dsn", default=os.environ.get("BENCH_DSN"), required="BENCH_DSN" not in os.environ)
+    parser.add_argument("--with-pictures", action="store_true", help="Also select Item.ItemPicture blobs")
+    parser.add_argument("--no-seed", action="store_true")
+    parser.add_argument("--mode", choices=MODES, help=argparse.SUPPRESS)  # child process
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(run_mode(args.dsn, args.mode, args.with_pictures)))
+        return
+
+    if not args.no_seed:
+        seed(args.dsn, "medium")
+    for mode in MODES:
+        command = [sys.executable, "-m", "benchmarks.bench_streaming", "--dsn", args.dsn, "--mode", mode]
+        if args.with_pictures:
+            command.append("--with-pictures")
+        output = subprocess.check_output(command, cwd=REPO_DIR, text=True)
+        result = json.loads(output.strip().splitlines()[-1])
+        print(f"{mode:<20} {result['rows']:>7} rows  {result['seconds']:6.2f} s   "
+              f"peak RSS {result['peak_rss_mb']:8.1f} MiB  (+{result['added_rss_mb']:.1f} MiB for the rows)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Benchmark: picture handling for a PO with 100 pictured items.
+
+Compares the old per-render path (base64 decode → PIL open → full-size re-save →
+base64 encode) against the thumbnail cache, cold and warm.
+Run from the repo root:  python -m benchmarks.bench_thumbnails
+"""
+import base64
+import io
+import time
+import tracemalloc
+
+from PIL import Image
+
+from purchase_order.thumbnails import ThumbnailCache
+
+ITEM_COUNT = 100
+PICTURE_SIZE = (1200, 900)
+
+
+def make_pictures(count=ITEM_COUNT, size=PICTURE_SIZE):
+    """Synthetic JPEG item pictures, as stored in Item.ItemPicture."""
+    pictures = []
+    for i in range(count):
+        img = Image.new("RGB", size, ((i * 37) % 256, (i * 91) % 256, (i * 53) % 256))
+        buffer = io.BytesIO()
+        img.save(buffer, format="JPEG", quality=90)
+        pictures.append(buffer.getvalue())
+    return pictures
+
+
+def legacy_render(pictures):
+    """The pre-thumbnail path: what every rerun used to do for each item."""
+    html = []
+    for raw in pictures:
+        raw_b64 = base64.b64encode(raw).decode()  # encode(ItemPicture, 'base64') in SQL
+        img = Image.open(io.BytesIO(base64.b64decode(raw_b64)))
+        buffer = io.BytesIO()
+        img.save(buffer, format=img.format or "PNG")
+        uri = f"data:image/jpeg;base64,{base64.b64encode(buffer.getvalue()).decode()}"
+        html.append(f'<img src="{uri}" width="50" />')
+    return "".join(html)
+
+
+def thumbnail_render(cache, pictures):
+    html = []
+    for itemid, raw in enumerate(pictures):
+        uri = cache.get(itemid, "hash") or cache.put(itemid, "hash", raw)
+        html.append(f'<img src="{uri}" width="50" />')
+    return "".join(html)
+
+
+def measure(label, func):
+    tracemalloc.start()
+    start = time.perf_counter()
+    html = func()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<28} {elapsed * 1000:9.1f} ms   peak {peak / 1024 / 1024:7.1f} MiB   html {len(html) / 1024:9.1f} KiB")
+
+
+def main():
+    pictures = make_pictures()
+    cache = ThumbnailCache()
+    print(f"{ITEM_COUNT} items, {PICTURE_SIZE[0]}x{PICTURE_SIZE[1]} JPEG pictures")
+    measure("legacy (every rerun)", lambda: legacy_render(pictures))
+    measure("thumbnails (cold cache)", lambda: thumbnail_render(cache, pictures))
+    measure("thumbnails (warm cache)", lambda: thumbnail_render(cache, pictures))
+    print(f"cache: {cache.stats()}")
+
+
+if __name__ == "__main__":
+    main()
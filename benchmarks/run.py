@@ -0,0 +1,196 @@
+"""
+Benchmark suite: seeds a local PostgreSQL, times the data layer and page renders,
+and writes the results as JSON.
+
+    python -m benchmarks.run --dsn postgresql://localhost/amas_bench --scale small \\
+        --output bench_small.json [--baseline previous.json --threshold 0.2]
+
+With --baseline, exits with status 1 if any benchmark's median is more than
+`threshold` (fraction) slower than in the baseline file.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.seed import REPO_DIR, SCALES, seed, supplier_email
+
+ACTIVE_VIEW = "📦 Track PO"
+ARCHIVED_VIEW = "📂 Archived PO"
+
+
+def configure_secrets(dsn, **neon):
+    """
+    The app reads its DSN from st.secrets, so run from a scratch directory holding
+    a .streamlit/secrets.toml that points at the benchmark database. Extra keyword
+    arguments become further [neon] settings (e.g. replica_dsns=[...]).
+    """
+    workdir = tempfile.mkdtemp(prefix="amas_bench_")
+    os.makedirs(os.path.join(workdir, ".streamlit"))
+    with open(os.path.join(workdir, ".streamlit", "secrets.toml"), "w") as f:
+        f.write(f"[neon]\ndsn = {json.dumps(dsn)}\n")
+        # JSON strings, numbers and lists of them are valid TOML values
+        for key, value in neon.items():
+            f.write(f"{key} = {json.dumps(value)}\n")
+    os.chdir(workdir)
+    if REPO_DIR not in sys.path:
+        sys.path.insert(0, REPO_DIR)
+
+
+def measure(func, rounds, before=None):
+    """Runs `func` `rounds` times; returns latency statistics in milliseconds."""
+    samples = []
+    for _ in range(rounds):
+        if before is not None:
+            before()
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        "median_ms": statistics.median(samples),
+        "p95_ms": samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+        "min_ms": samples[0],
+        "rounds": rounds,
+    }
+
+
+def _render_po_view(supplier, view):
+    import streamlit as st
+    from purchase_order.main_po import show_main_po_page
+    st.session_state["po_view"] = view
+    show_main_po_page(supplier)
+
+
+def _render_dashboard(supplier):
+    from app import show_supplier_dashboard
+    show_supplier_dashboard(supplier)
+
+
+def page_render(script, *args):
+    """Returns a callable that renders a page headlessly with Streamlit's AppTest."""
+    from streamlit.testing.v1 import AppTest
+
+    def run():
+        at = AppTest.from_function(script, args=args, default_timeout=120)
+        at.run()
+        if at.exception:
+            raise RuntimeError(f"{script.__name__} failed: {at.exception[0].message}")
+    return run
+
+
+def run_benchmarks(rounds):
+    """Times data-layer functions (cold and warm cache) and page renders."""
+    from query_cache import get_query_cache
+    from purchase_order.thumbnails import get_thumbnail_cache
+    from supplier_db import get_supplier_by_email
+    from purchase_order import po_handler
+
+    def clear_caches():
+        get_query_cache().clear()
+        get_thumbnail_cache().clear()
+
+    supplier = get_supplier_by_email(supplier_email(1))
+    supplier_id = supplier.supplierid
+    active_poids = [po.poid for po in po_handler.get_purchase_orders_for_supplier(supplier_id)]
+
+    data_layer = {
+        "supplier_db.get_supplier_by_email": lambda: get_supplier_by_email(supplier_email(1)),
+        "po_handler.get_purchase_orders_for_supplier": lambda: po_handler.get_purchase_orders_for_supplier(supplier_id),
+        "po_handler.get_archived_purchase_orders": lambda: po_handler.get_archived_purchase_orders(supplier_id),
+        "po_handler.get_archived_purchase_orders_page": lambda: po_handler.get_archived_purchase_orders_page(supplier_id),
+        "po_handler.get_purchase_order_items": lambda: po_handler.get_purchase_order_items(active_poids[0]),
+        "po_handler.get_items_for_purchase_orders": lambda: po_handler.get_items_for_purchase_orders(active_poids),
+        "po_handler.load_purchase_order_pages": lambda: po_handler.load_purchase_order_pages(supplier_id),
+        "po_handler.get_supplier_po_kpis": lambda: po_handler.get_supplier_po_kpis(supplier_id),
+    }
+
+    results = {}
+    for name, func in data_layer.items():
+        results[f"{name}[cold]"] = measure(func, rounds, before=clear_caches)
+        results[f"{name}[warm]"] = measure(func, rounds)
+
+    pages = {
+        "page.track_po": page_render(_render_po_view, supplier, ACTIVE_VIEW),
+        "page.archived_po": page_render(_render_po_view, supplier, ARCHIVED_VIEW),
+        "page.supplier_dashboard": page_render(_render_dashboard, supplier),
+    }
+    for name, func in pages.items():
+        results[f"{name}[cold]"] = measure(func, rounds, before=clear_caches)
+        results[f"{name}[warm]"] = measure(func, rounds)
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Returns (name, baseline_ms, current_ms) for benchmarks slower than baseline × (1 + threshold)."""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous and current["median_ms"] > previous["median_ms"] * (1 + threshold):
+            regressions.append((name, previous["median_ms"], current["median_ms"]))
+    return regressions
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=REPO_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dsn", default=os.environ.get("BENCH_DSN"), required="BENCH_DSN" not in os.environ)
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small")
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--no-seed", action="store_true", help="Reuse data from a previous run")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--baseline", help="Earlier results JSON to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed slowdown, e.g. 0.2 = 20%%")
+    args = parser.parse_args()
+    output = os.path.abspath(args.output)
+    baseline_path = os.path.abspath(args.baseline) if args.baseline else None
+
+    if not args.no_seed:
+        seed(args.dsn, args.scale)
+    configure_secrets(args.dsn)
+
+    results = run_benchmarks(args.rounds)
+    report = {
+        "meta": {
+            "scale": args.scale,
+            "scale_config": SCALES[args.scale],
+            "rounds": args.rounds,
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        },
+        "results": results,
+    }
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    for name, stats in results.items():
+        print(f"{name:<58} median {stats['median_ms']:9.2f} ms   p95 {stats['p95_ms']:9.2f} ms")
+    print(f"Results written to {output}")
+
+    if baseline_path:
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+        if baseline["meta"]["scale"] != args.scale:
+            print(f"Warning: baseline scale {baseline['meta']['scale']!r} differs from {args.scale!r}")
+        regressions = compare(results, baseline["results"], args.threshold)
+        for name, before, after in regressions:
+            print(f"REGRESSION {name}: {before:.2f} ms -> {after:.2f} ms")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions beyond {args.threshold:.0%}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+-- Minimal schema the supplier app's queries expect (benchmark/dev databases only).
+DROP TABLE IF EXISTS AppliedWrites, ItemPictureVariant, PurchaseOrderItems, PurchaseOrders, Item, supplier, SupplierPOStats, schema_migrations CASCADE;
+
+CREATE TABLE supplier (
+    supplierid serial PRIMARY KEY,
+    suppliername text,
+    suppliertype text,
+    country text,
+    city text,
+    address text,
+    postalcode text,
+    contactname text,
+    contactphone text,
+    contactemail text,
+    paymentterms text,
+    bankdetails text
+);
+
+CREATE TABLE Item (
+    ItemID serial PRIMARY KEY,
+    ItemNameEnglish text NOT NULL,
+    ItemPicture bytea
+);
+
+CREATE TABLE PurchaseOrders (
+    POID serial PRIMARY KEY,
+    SupplierID integer NOT NULL REFERENCES supplier (supplierid),
+    OrderDate date NOT NULL,
+    ExpectedDelivery date,
+    Status text NOT NULL,
+    SupProposedDeliver date,
+    ProposedStatus text,
+    SupplierNote text
+);
+
+CREATE TABLE PurchaseOrderItems (
+    POID integer NOT NULL REFERENCES PurchaseOrders (POID),
+    ItemID integer NOT NULL REFERENCES Item (ItemID),
+    OrderedQuantity integer NOT NULL,
+    EstimatedPrice numeric(12, 2),
+    SupProposedQuantity integer,
+    SupProposedPrice numeric(12, 2),
+    PRIMARY KEY (POID, ItemID)
+);
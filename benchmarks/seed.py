@@ -0,0 +1,137 @@
+"""
+Seeds a local PostgreSQL with synthetic supplier / PO data at a given scale.
+
+    python -m benchmarks.seed --dsn postgresql://localhost/amas_bench --scale small
+"""
+import argparse
+import io
+import os
+
+import psycopg2
+from psycopg2.extras import execute_values
+from PIL import Image
+
+from migrate import migrate
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+
+# suppliers × POs per supplier × lines per PO, with `items` distinct pictured items
+SCALES = {
+    "tiny":   {"suppliers": 2,   "pos_per_supplier": 10,  "lines_per_po": 5,   "items": 50,   "picture_px": 200},
+    "small":  {"suppliers": 10,  "pos_per_supplier": 50,  "lines_per_po": 10,  "items": 200,  "picture_px": 400},
+    "medium": {"suppliers": 50,  "pos_per_supplier": 200, "lines_per_po": 20,  "items": 1000, "picture_px": 800},
+    "large":  {"suppliers": 200, "pos_per_supplier": 500, "lines_per_po": 40,  "items": 5000, "picture_px": 1200},
+    # One supplier with 1M order lines (export throughput)
+    "export": {"suppliers": 1,   "pos_per_supplier": 25000, "lines_per_po": 40, "items": 1000, "picture_px": 100},
+}
+
+STATUSES = ("Pending", "Accepted", "Shipping", "Declined", "Delivered", "Completed")
+
+
+def supplier_email(n):
+    """Contact email of the n-th (1-based) synthetic supplier."""
+    return f"supplier{n}@bench.example"
+
+
+def make_picture(index, px):
+    """A noisy JPEG so pictures don't compress to nothing."""
+    img = Image.effect_noise((px, px * 3 // 4), 64).convert("RGB")
+    img.paste((index * 37 % 256, index * 91 % 256, index * 53 % 256), (0, 0, px // 4, px // 4))
+    buffer = io.BytesIO()
+    img.save(buffer, format="JPEG", quality=85)
+    return buffer.getvalue()
+
+
+def run_sql_file(cur, path):
+    with open(path) as f:
+        cur.execute(f.read())
+
+
+def seed(dsn, scale="small"):
+    """Recreates the schema and fills it with deterministic data for `scale`."""
+    config = SCALES[scale]
+    if config["lines_per_po"] > config["items"]:
+        raise ValueError("lines_per_po must not exceed items (one line per item per PO)")
+
+    conn = psycopg2.connect(dsn)
+    try:
+        with conn, conn.cursor() as cur:
+            run_sql_file(cur, os.path.join(BENCH_DIR, "schema.sql"))
+
+            execute_values(
+                cur,
+                "INSERT INTO supplier (suppliername, contactemail, country, city) VALUES %s",
+                [(f"Supplier {n}", supplier_email(n), "Iraq", "Erbil") for n in range(1, config["suppliers"] + 1)],
+            )
+
+            pictures = [make_picture(i, config["picture_px"]) for i in range(16)]
+            execute_values(
+                cur,
+                "INSERT INTO Item (ItemNameEnglish, ItemPicture) VALUES %s",
+                [(f"Item {i}", psycopg2.Binary(pictures[i % len(pictures)]) if i % 10 else None)
+                 for i in range(1, config["items"] + 1)],
+                page_size=100,
+            )
+
+            # Orders and lines are generated server-side; setseed keeps them deterministic
+            cur.execute("SELECT setseed(0.42)")
+            cur.execute(
+                """
+                INSERT INTO PurchaseOrders (SupplierID, OrderDate, ExpectedDelivery, Status, SupplierNote)
+                SELECT
+                    s.supplierid,
+                    current_date - (random() * 730)::int,
+                    current_date - (random() * 700)::int + 30,
+                    (%s::text[])[1 + floor(random() * %s)::int],
+                    NULL
+                FROM supplier s, generate_series(1, %s)
+                """,
+                (list(STATUSES), len(STATUSES), config["pos_per_supplier"]),
+            )
+            cur.execute(
+                """
+                INSERT INTO PurchaseOrderItems (POID, ItemID, OrderedQuantity, EstimatedPrice,
+                                                SupProposedQuantity, SupProposedPrice)
+                SELECT
+                    po.POID,
+                    1 + (po.POID * 7919 + line) %% %s,
+                    1 + (random() * 100)::int,
+                    round((random() * 500)::numeric, 2),
+                    CASE WHEN random() < 0.3 THEN 1 + (random() * 100)::int END,
+                    CASE WHEN random() < 0.3 THEN round((random() * 500)::numeric, 2) END
+                FROM PurchaseOrders po, generate_series(1, %s) AS line
+                """,
+                (config["items"], config["lines_per_po"]),
+            )
+
+        # Project migrations: dashboard summary table (backfilled from the rows above) + indexes
+        migrate(dsn, log=lambda message: None)
+
+        with conn, conn.cursor() as cur:
+            # Goes through the summary triggers, like a real delivery would
+            cur.execute(
+                """
+                UPDATE PurchaseOrders
+                SET DeliveredAt = OrderDate + (random() * 60)::int
+                WHERE Status IN ('Delivered', 'Completed')
+                """
+            )
+        with conn.cursor() as cur:
+            cur.execute("ANALYZE")
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--dsn", default=os.environ.get("BENCH_DSN"), required="BENCH_DSN" not in os.environ)
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small")
+    args = parser.parse_args()
+    seed(args.dsn, args.scale)
+    print(f"Seeded {args.scale}: {SCALES[args.scale]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Concurrency check for version-checked PO writes: many threads act on the same
+Pending order at once (half accept, half decline), all based on the version they
+read. Exactly one write must win, the rest must come back as conflicts, and each
+write must cost one round trip.
+
+    python -m benchmarks.stress_po_transitions --dsn postgresql://localhost/amas_bench
+"""
+import argparse
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.run import configure_secrets
+from benchmarks.seed import seed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dsn", default=os.environ.get("BENCH_DSN"), required="BENCH_DSN" not in os.environ)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--no-seed", action="store_true")
+    args = parser.parse_args()
+
+    if not args.no_seed:
+        seed(args.dsn, "tiny")
+    configure_secrets(args.dsn)
+
+    from db_handler import run_query
+    from query_metrics import get_query_metrics, reset_query_metrics
+    from purchase_order.po_handler import update_purchase_order_status
+
+    order = run_query("SELECT POID, RowVersion FROM PurchaseOrders WHERE Status = 'Pending' ORDER BY POID LIMIT 1")[0]
+    poid, version = order["poid"], order["rowversion"]
+
+    def act(n):
+        status = "Accepted" if n % 2 else "Declined"
+        return update_purchase_order_status(poid, status, expected_version=version)
+
+    reset_query_metrics()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        results = list(pool.map(act, range(args.threads)))
+    writes = get_query_metrics().get("purchase_order.po_handler:update_purchase_order_status", {}).get("count", 0)
+
+    winners = [r for r in results if r["updated"]]
+    conflicts = [r for r in results if r["conflict"]]
+    final = run_query("SELECT Status, RowVersion FROM PurchaseOrders WHERE POID = %s", (poid,))[0]
+    # A loser is refused by the version check, or by the state machine once the winner committed
+    late = update_purchase_order_status(poid, "Shipping" if final["status"] == "Declined" else "Delivered")
+
+    print(f"{args.threads} concurrent writes on PO {poid}: {len(winners)} applied, {len(conflicts)} conflict(s) "
+          f"({sorted({r['conflict'] for r in conflicts})}), {writes} round trip(s); final status {final['status']}")
+    print(f"illegal transition afterwards: conflict={late['conflict']}")
+    if (len(winners) != 1 or len(conflicts) != args.threads - 1 or writes != args.threads
+            or final["rowversion"] != version + 1 or late["conflict"] != "transition"):
+        print("FAILED")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
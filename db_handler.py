@@ -1,73 +1,545 @@
+import itertools
+import logging
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
 import streamlit as st
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from psycopg2.extras import NamedTupleCursor, RealDictCursor
+from query_cache import get_query_cache
+from query_metrics import find_call_site, record_query, result_size
+
+logger = logging.getLogger(__name__)
+
+@st.cache_resource
+def get_db_config():
+    """
+    Database settings from [neon] in secrets, resolved on first use rather than at
+    import, so screens that never touch the database (e.g. login) don't pay for it.
+
+    Keys: dsn, plus optional pool sizing / health-check settings (pool_min_size,
+    pool_max_size, pool_ping_after), slow_query_ms (queries slower than this are
+    logged with their EXPLAIN plan), stream_itersize (rows fetched per round
+    trip by stream_query's server-side cursors) and read-replica routing:
+    replica_dsns (a list, or comma-separated), replica_retry_after (seconds a
+    failed replica is skipped) and read_your_writes_seconds (how long after a
+    write reads stay on the primary).
+    """
+    neon = st.secrets["neon"]
+    replica_dsns = neon.get("replica_dsns", [])
+    if isinstance(replica_dsns, str):
+        replica_dsns = [dsn.strip() for dsn in replica_dsns.split(",") if dsn.strip()]
+    return {
+        "dsn": neon["dsn"],
+        "pool_min_size": int(neon.get("pool_min_size", 1)),
+        "pool_max_size": int(neon.get("pool_max_size", 10)),
+        "pool_ping_after": float(neon.get("pool_ping_after", 5.0)),
+        "slow_query_ms": float(neon.get("slow_query_ms", 500)),
+        "stream_itersize": int(neon.get("stream_itersize", 2000)),
+        "replica_dsns": list(replica_dsns),
+        "replica_retry_after": float(neon.get("replica_retry_after", 30.0)),
+        "read_your_writes_seconds": float(neon.get("read_your_writes_seconds", 5.0)),
+    }
+
+# Row types stream_query can yield, by the cursor class producing them
+STREAM_ROW_TYPES = {
+    "dict": RealDictCursor,                  # same rows as run_query
+    "tuple": psycopg2.extensions.cursor,     # plain tuples: smallest and fastest
+    "namedtuple": NamedTupleCursor,          # tuples with attribute access (row.poid)
+}
+
+def _report_error(message):
+    """Shows an error in the session; background threads (no script context) log it instead."""
+    if get_script_run_ctx() is None:
+        logger.error(message)
+    else:
+        st.error(message)
+
+# Errors that mean the connection itself is gone and must not be reused
+CONNECTION_ERRORS = (psycopg2.OperationalError, psycopg2.InterfaceError)
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of psycopg2 connections shared by every session.
+
+    - Keeps between `min_size` and `max_size` connections open.
+    - Callers block (counted as a "wait") when all connections are checked out.
+    - Connections idle for more than `ping_after` seconds are pinged with
+      `SELECT 1` on checkout; dead ones are discarded and replaced.
+    """
+
+    def __init__(self, dsn, min_size=1, max_size=10, ping_after=5.0):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError("Invalid pool size: need 0 <= min_size <= max_size and max_size >= 1")
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.ping_after = ping_after
+        self._idle = deque()  # (conn, last_used) pairs, most recently used on the right
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._stats = {"checkouts": 0, "hits": 0, "waits": 0, "new_connections": 0, "discarded": 0}
+
+        for _ in range(min_size):
+            self._idle.append((self._connect(), time.monotonic()))
+
+    def _count(self, key):
+        with self._lock:
+            self._stats[key] += 1
+
+    def _connect(self):
+        conn = psycopg2.connect(self.dsn, cursor_factory=RealDictCursor)
+        self._count("new_connections")
+        return conn
+
+    def _is_healthy(self, conn, last_used):
+        """Checks a connection taken from the idle list before handing it out."""
+        if conn.closed:
+            return False
+        if time.monotonic() - last_used < self.ping_after:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except CONNECTION_ERRORS:
+            return False
+
+    def _close(self, conn):
+        self._count("discarded")
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def getconn(self):
+        """Checks out a healthy connection, waiting if the pool is exhausted."""
+        if not self._slots.acquire(blocking=False):
+            self._count("waits")
+            self._slots.acquire()
+        self._count("checkouts")
+        try:
+            while True:
+                with self._lock:
+                    entry = self._idle.pop() if self._idle else None
+                if entry is None:
+                    return self._connect()
+                conn, last_used = entry
+                if self._is_healthy(conn, last_used):
+                    self._count("hits")
+                    return conn
+                self._close(conn)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def putconn(self, conn, discard=False):
+        """Returns a connection to the pool; broken connections are closed instead."""
+        try:
+            if discard or conn.closed:
+                self._close(conn)
+                return
+            try:
+                # Never hand out a connection with an open transaction
+                if conn.status != psycopg2.extensions.STATUS_READY:
+                    conn.rollback()
+            except CONNECTION_ERRORS:
+                self._close(conn)
+                return
+            with self._lock:
+                self._idle.append((conn, time.monotonic()))
+        finally:
+            self._slots.release()
+
+    def stats(self):
+        """Returns a snapshot of the pool counters plus current idle size."""
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot["idle"] = len(self._idle)
+        snapshot["min_size"] = self.min_size
+        snapshot["max_size"] = self.max_size
+        return snapshot
+
+    def closeall(self):
+        """Closes every idle connection (checked-out ones are closed on return)."""
+        with self._lock:
+            idle, self._idle = list(self._idle), deque()
+        for conn, _ in idle:
+            conn.close()
 
-# Retrieve the Neon DSN from Streamlit secrets
-NEON_DSN = st.secrets["neon"]["dsn"]
+
+@st.cache_resource
+def get_pool():
+    """Process-wide connection pool, shared across sessions and reruns."""
+    config = get_db_config()
+    return ConnectionPool(
+        config["dsn"],
+        min_size=config["pool_min_size"],
+        max_size=config["pool_max_size"],
+        ping_after=config["pool_ping_after"],
+    )
+
+def get_pool_stats():
+    """Returns pool counters (hits, waits, new_connections, ...) for monitoring."""
+    return get_pool().stats()
+
+
+class ReplicaRouter:
+    """
+    Spreads reads round-robin over read-replica pools, failing over to the next
+    replica when one can't be reached. A failed replica is skipped for
+    `retry_after` seconds; when none is available, run_query reads from the primary.
+    """
+
+    def __init__(self, pools, retry_after=30.0):
+        self.pools = pools
+        self.retry_after = retry_after
+        self._turn = itertools.count()
+        self._down_until = [0.0] * len(pools)
+        self._lock = threading.Lock()
+        self._stats = {"reads": [0] * len(pools), "failovers": 0, "primary_fallbacks": 0}
+
+    def candidates(self):
+        """(index, pool) of the replicas to try for one read, in round-robin order."""
+        start = next(self._turn)
+        now = time.monotonic()
+        with self._lock:
+            order = [(start + i) % len(self.pools) for i in range(len(self.pools))]
+            return [(i, self.pools[i]) for i in order if self._down_until[i] <= now]
+
+    def mark_down(self, index, error):
+        logger.warning("Read replica %d unavailable (%s); skipping it for %.0fs", index, error, self.retry_after)
+        with self._lock:
+            self._down_until[index] = time.monotonic() + self.retry_after
+            self._stats["failovers"] += 1
+
+    def count(self, index=None):
+        """Counts a read served by replica `index`, or (None) one that fell back to the primary."""
+        with self._lock:
+            if index is None:
+                self._stats["primary_fallbacks"] += 1
+            else:
+                self._stats["reads"][index] += 1
+
+    def stats(self):
+        """Returns reads per replica, failovers, primary fallbacks and which replicas are down."""
+        now = time.monotonic()
+        with self._lock:
+            snapshot = {key: list(value) if isinstance(value, list) else value for key, value in self._stats.items()}
+            snapshot["down"] = [i for i, until in enumerate(self._down_until) if until > now]
+        return snapshot
+
+
+@st.cache_resource
+def get_replica_router():
+    """Process-wide replica router, or None when no [neon] replica_dsns are configured."""
+    config = get_db_config()
+    if not config["replica_dsns"]:
+        return None
+    # min_size=0: a replica that is down must not keep the app from starting
+    pools = [
+        ConnectionPool(dsn, min_size=0, max_size=config["pool_max_size"], ping_after=config["pool_ping_after"])
+        for dsn in config["replica_dsns"]
+    ]
+    return ReplicaRouter(pools, retry_after=config["replica_retry_after"])
+
+# monotonic() of this process's last write (or change notification, see note_write)
+_last_write = float("-inf")
+
+def note_write():
+    """
+    Keeps replica reads on the primary for read_your_writes_seconds, until the
+    replicas have caught up with a write. Process-wide rather than per session:
+    what a read returns may be cached for every session (query_cache).
+    Called by run_query / run_transaction / transaction after their writes, and by
+    the PO change feed for writes made by other processes. With a shared query
+    cache, writes by other processes are also noticed through its invalidation
+    generation (see _note_shared_writes).
+    """
+    global _last_write
+    _last_write = time.monotonic()
+
+# Shared query cache generation this process last saw (None: not looked yet)
+_seen_generation = None
+
+def _note_shared_writes():
+    """
+    Starts the read-your-writes window when another process invalidated the shared
+    query cache (which every write does) since this process last looked. Otherwise
+    a replica read here could fetch what that process just overwrote and store it
+    where every process reads it. A process that just started can't tell how
+    recent the last write was, so it starts with the window open.
+    """
+    global _seen_generation
+    cache = get_query_cache()
+    if not cache.shared:
+        return
+    generation = cache.generation
+    if generation != _seen_generation:
+        note_write()
+    _seen_generation = generation
+
+# Data-modifying statements (also inside a WITH query)
+_WRITE_STATEMENT = re.compile(r"\b(insert|update|delete|merge)\b", re.IGNORECASE)
+
+def _is_write(query, is_select):
+    return not is_select and _WRITE_STATEMENT.search(query) is not None
+
+def _reads_from_replicas():
+    _note_shared_writes()
+    return time.monotonic() - _last_write >= get_db_config()["read_your_writes_seconds"]
 
 def get_connection():
     """
-    Establish and return a new connection to the Neon PostgreSQL database
-    using the DSN provided in the Streamlit secrets.
+    Check out a connection to the Neon PostgreSQL database from the shared pool.
+    Must be handed back with `release_connection` (or use `pooled_connection`).
     """
     try:
-        conn = psycopg2.connect(NEON_DSN, cursor_factory=RealDictCursor)
-        return conn
+        return get_pool().getconn()
     except Exception as e:
-        st.error(f"🚨 Database Connection Error: {e}")
+        _report_error(f"🚨 Database Connection Error: {e}")
+        raise
+
+def release_connection(conn, discard=False):
+    """Return a connection to the pool, discarding it if it is broken."""
+    get_pool().putconn(conn, discard=discard or conn.closed)
+
+@contextmanager
+def pooled_connection():
+    """Context manager that checks a connection out and always returns it."""
+    conn = get_connection()
+    broken = False
+    try:
+        yield conn
+    except CONNECTION_ERRORS:
+        broken = True
         raise
+    finally:
+        release_connection(conn, discard=broken)
+
+# Slow queries are explained in the background, on their own pooled connection:
+# never inside (or in the latency of) the caller's transaction
+_explainer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="slow-query-explain")
+_explains_pending = threading.BoundedSemaphore(8)  # beyond this many queued, slow queries are logged unexplained
+
+def _explain_and_log(call_site, query, params, elapsed, row_count):
+    try:
+        with pooled_connection() as conn:
+            with conn, conn.cursor(cursor_factory=psycopg2.extensions.cursor) as cur:
+                cur.execute("EXPLAIN " + query, params)
+                plan = "\n".join(row[0] for row in cur.fetchall())
+    except Exception as e:
+        plan = f"(EXPLAIN failed: {e})"
+    finally:
+        _explains_pending.release()
+    _log_slow_query(call_site, query, elapsed, row_count, plan)
+
+def _log_slow_query(call_site, query, elapsed, row_count, plan):
+    logger.warning(
+        "Slow query (%.0f ms, %d rows) at %s:\n%s\nPlan:\n%s",
+        elapsed * 1000, row_count, call_site, query.strip(), plan,
+    )
+
+def _record_execution(cur, call_site, query, params, elapsed, rows):
+    """
+    Records timing/row/byte metrics of a query. A slow one is logged, with its plan
+    if it is a read-only SELECT (explained later, see _explain_and_log).
+    """
+    row_count = len(rows) if rows is not None else max(cur.rowcount, 0)
+    record_query(call_site, query, elapsed, rows=row_count, nbytes=result_size(rows))
+
+    if elapsed * 1000 >= get_db_config()["slow_query_ms"]:
+        is_select = query.lstrip().lower().startswith("select")
+        if is_select and _WRITE_STATEMENT.search(query) is None and _explains_pending.acquire(blocking=False):
+            _explainer.submit(_explain_and_log, call_site, query, params, elapsed, row_count)
+        else:
+            _log_slow_query(call_site, query, elapsed, row_count, "(not explained)")
+
+def _execute(conn, query, params, call_site, row_factory=None):
+    """Executes one statement; returns its rows if it produces a result set, else None."""
+    # A row factory gets plain tuples: no per-row dict is built just to be discarded
+    cursor_factory = psycopg2.extensions.cursor if row_factory is not None else None
+    with conn.cursor(cursor_factory=cursor_factory) as cur:
+        start = time.perf_counter()
+        cur.execute(query, params)
+        rows = cur.fetchall() if cur.description is not None else None
+        elapsed = time.perf_counter() - start
+        _record_execution(cur, call_site, query, params, elapsed, rows)
+    if rows is not None and row_factory is not None:
+        rows = [row_factory(row) for row in rows]
+    return rows
+
+def _run_on_replica(query, params, call_site, row_factory):
+    """
+    Runs a read on the next available replica, failing over to the others.
+    Returns _NO_REPLICA if none could serve it.
+    """
+    router = get_replica_router()
+    for index, pool in router.candidates():
+        broken = False
+        try:
+            conn = pool.getconn()
+        except CONNECTION_ERRORS as e:
+            router.mark_down(index, e)
+            continue
+        try:
+            with conn:
+                rows = _execute(conn, query, params, call_site, row_factory)
+            router.count(index)
+            return rows
+        except CONNECTION_ERRORS as e:
+            broken = True
+            router.mark_down(index, e)
+        finally:
+            pool.putconn(conn, discard=broken)
+    router.count(None)
+    return _NO_REPLICA
+
+_NO_REPLICA = object()
 
-def run_query(query, params=None):
+def run_query(query, params=None, row_factory=None, use_replica=False):
     """
     Executes a SELECT query or a query with RETURNING clause.
     If it's a modification query (INSERT, UPDATE, DELETE), commits the transaction.
-    
+    A SELECT that fails because its pooled connection dropped is retried once
+    on a fresh connection.
+
+    With `use_replica`, a read-only query goes to a read replica ([neon]
+    replica_dsns), unless none is configured or reachable, or this process (or,
+    with a shared query cache, any process) wrote within read_your_writes_seconds
+    (see note_write): then it reads from the primary.
+
     Args:
         query (str): SQL query string.
         params (tuple or list, optional): Query parameters.
+        row_factory (callable, optional): Builds each row from its tuple of column
+            values (e.g. PurchaseOrder.from_row, or tuple) instead of returning dicts.
+        use_replica (bool): Read from a replica when possible (read-only queries only).
 
     Returns:
-        list[dict] or None: Query result as a list of dictionaries, or None for modifications.
+        list[dict] or None: Query result as a list of dictionaries (or of row_factory
+        results), or None for modifications.
     """
-    conn = get_connection()
-    try:
-        with conn:
-            with conn.cursor() as cur:
-                # Ensure params is a tuple, even if single element
-                params = params if params is not None else ()
-                cur.execute(query, params)
-                lower_query = query.strip().lower()
+    # Ensure params is a tuple, even if single element
+    params = params if params is not None else ()
+    call_site = find_call_site()
+    is_select = query.strip().lower().startswith("select")
+    retry_on_drop = is_select
 
-                if lower_query.startswith("select") or " returning " in lower_query:
-                    return cur.fetchall()
-                else:
-                    conn.commit()
-                    return None
-    except Exception as e:
-        st.error(f"🚨 Query Execution Error: {e}")
-        raise
-    finally:
-        conn.close()
+    while True:
+        try:
+            if use_replica and get_replica_router() is not None and _reads_from_replicas():
+                rows = _run_on_replica(query, params, call_site, row_factory)
+                if rows is not _NO_REPLICA:
+                    return rows
+            use_replica = False
+            with pooled_connection() as conn:
+                # `with conn` commits on success and rolls back on error
+                with conn:
+                    rows = _execute(conn, query, params, call_site, row_factory)
+            # A RETURNING write that returned nothing (e.g. ON CONFLICT DO NOTHING)
+            # changed nothing a replica could lag behind on
+            if _is_write(query, is_select) and rows != []:
+                note_write()
+            return rows
+        except CONNECTION_ERRORS as e:
+            if retry_on_drop:
+                retry_on_drop = False
+                continue
+            _report_error(f"🚨 Query Execution Error: {e}")
+            raise
+        except Exception as e:
+            _report_error(f"🚨 Query Execution Error: {e}")
+            raise
 
 def run_transaction(query, params=None):
     """
     Executes a SQL transaction (INSERT, UPDATE, DELETE).
-    
+
     Args:
         query (str): SQL query string.
         params (tuple or list, optional): Query parameters.
     """
-    conn = get_connection()
+    # Ensure params is a tuple
+    params = params if params is not None else ()
+    call_site = find_call_site()
     try:
+        with pooled_connection() as conn:
+            # `with conn` commits on success and rolls back on error
+            with conn:
+                _execute(conn, query, params, call_site)
+        note_write()
+    except Exception as e:
+        _report_error(f"🚨 Transaction Failed: {e}")
+        raise
+
+@contextmanager
+def transaction():
+    """
+    Runs several statements in one transaction on a pooled connection. Yields
+    execute(query, params=None, row_factory=None), which returns rows like
+    run_query; commits when the block ends, rolls back if it raises.
+
+    Errors are raised as is (no st.error), so background threads can use it too.
+    """
+    call_site = find_call_site()
+    with pooled_connection() as conn:
         with conn:
-            with conn.cursor() as cur:
-                # Ensure params is a tuple
-                params = params if params is not None else ()
+            def execute(query, params=None, row_factory=None):
+                return _execute(conn, query, params if params is not None else (), call_site, row_factory)
+            yield execute
+    note_write()
+
+_stream_ids = itertools.count(1)
+
+def stream_query(query, params=None, itersize=None, row_type="dict"):
+    """
+    Executes a SELECT through a named (server-side) cursor and yields its rows,
+    fetching `itersize` rows per round trip, so a large result never sits in memory
+    as a whole.
+
+    Args:
+        query (str): SQL query string.
+        params (tuple or list, optional): Query parameters.
+        itersize (int, optional): Rows per fetch (default: [neon] stream_itersize, 2000).
+        row_type (str): "dict" (like run_query), "tuple" or "namedtuple".
+
+    Returns:
+        generator: The rows. A pooled connection is held until the generator is
+        exhausted or closed, so consume it right away.
+    """
+    if row_type not in STREAM_ROW_TYPES:
+        raise ValueError(f"row_type must be one of {sorted(STREAM_ROW_TYPES)}")
+    params = params if params is not None else ()
+    itersize = itersize or get_db_config()["stream_itersize"]
+    return _stream(query, params, itersize, STREAM_ROW_TYPES[row_type], find_call_site())
+
+def _stream(query, params, itersize, cursor_factory, call_site):
+    try:
+        with pooled_connection() as conn:
+            # `with conn` ends the cursor's transaction; a consumer that stops early
+            # (GeneratorExit) rolls it back
+            with conn, conn.cursor(name=f"stream_{next(_stream_ids)}", cursor_factory=cursor_factory) as cur:
+                cur.itersize = itersize
+                start = time.perf_counter()
                 cur.execute(query, params)
-            conn.commit()
+                rows = nbytes = 0
+                while True:
+                    batch = cur.fetchmany(itersize)
+                    if not batch:
+                        break
+                    rows += len(batch)
+                    nbytes += result_size(batch)
+                    yield from batch
+                # Includes the time the consumer spent between batches
+                record_query(call_site, query, time.perf_counter() - start, rows=rows, nbytes=nbytes)
     except Exception as e:
-        conn.rollback()
-        st.error(f"🚨 Transaction Failed: {e}")
+        _report_error(f"🚨 Query Execution Error: {e}")
         raise
-    finally:
-        conn.close()
@@ -0,0 +1,82 @@
+"""
+Serves the PO exports the app writes to disk (purchase_order/po_export.py), streaming
+each file in chunks so a large export is never held in memory.
+
+    python export_server.py [--host 0.0.0.0] [--port 8503] [--export-dir /tmp/amas_exports]
+
+    GET /exports/<token>.<ext>
+
+Run it on the app's host with --export-dir set to the app's [exports] dir, and point
+the app at it with [exports] base_url = "http://<host>:8503" in secrets. The token is
+the export's random file name (po_export.export_file_name), so only the session that
+made an export knows its URL; files are deleted by the app after [exports] ttl.
+"""
+import argparse
+import os
+import re
+import shutil
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+from purchase_order.po_export import DEFAULT_EXPORT_DIR, EXPORT_FORMATS
+
+# File names come from po_export.export_file_name (secrets.token_urlsafe(24))
+EXPORT_PATH = re.compile(r"^/exports/([\w-]{32})\.(\w+)$")
+
+# extension -> MIME type
+EXPORT_MIME_TYPES = {extension: mime for _, extension, mime in EXPORT_FORMATS.values()}
+
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+class ExportRequestHandler(BaseHTTPRequestHandler):
+    server_version = "AMASExports/1.0"
+    export_dir = DEFAULT_EXPORT_DIR  # set by make_server
+
+    def do_GET(self):
+        match = EXPORT_PATH.match(urlsplit(self.path).path)
+        if not match or match.group(2) not in EXPORT_MIME_TYPES:
+            self.send_error(HTTPStatus.NOT_FOUND)
+            return
+        token, extension = match.groups()
+        try:
+            f = open(os.path.join(self.export_dir, f"{token}.{extension}"), "rb")
+        except FileNotFoundError:
+            self.send_error(HTTPStatus.NOT_FOUND)
+            return
+        with f:
+            self.send_response(HTTPStatus.OK)
+            self.send_header("Content-Type", EXPORT_MIME_TYPES[extension])
+            self.send_header("Content-Length", str(os.fstat(f.fileno()).st_size))
+            self.send_header("Content-Disposition", f'attachment; filename="purchase_orders.{extension}"')
+            self.send_header("Cache-Control", "private, no-store")
+            self.end_headers()
+            shutil.copyfileobj(f, self.wfile, COPY_CHUNK_SIZE)
+
+
+def make_server(export_dir=DEFAULT_EXPORT_DIR, host="0.0.0.0", port=8503):
+    """Builds the HTTP server (call serve_forever() on it)."""
+    handler = type("Handler", (ExportRequestHandler,), {"export_dir": export_dir})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8503)
+    parser.add_argument("--export-dir", default=DEFAULT_EXPORT_DIR, help="The app's [exports] dir")
+    args = parser.parse_args()
+
+    server = make_server(args.export_dir, args.host, args.port)
+    print(f"Serving PO exports from {args.export_dir} on http://{args.host}:{args.port}/exports/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
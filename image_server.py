@@ -0,0 +1,311 @@
+"""
+Serves pre-rendered item picture variants over HTTP so pages reference pictures
+by URL (cacheable by the browser) instead of inlining them as data URIs.
+
+    python image_server.py [--host 0.0.0.0] [--port 8502]   # serve
+    python image_server.py --backfill                        # render variants of existing pictures
+
+    GET /items/<ItemID>/<variant>.<ext>?v=<md5 of Item.ItemPicture>&s=<signature>
+
+Point the app at the server with [images] base_url = "http://<host>:8502" in secrets.
+Picture URLs are signed (thumbnails.sign_picture) with [images] secret, which the
+server reads from --secret, else $IMAGE_URL_SECRET, else .streamlit/secrets.toml;
+requests without a valid signature get 403, so ItemIDs can't be enumerated.
+The DSN comes from --dsn, else $DATABASE_URL, else [neon] dsn in .streamlit/secrets.toml.
+
+Variants live in ItemPictureVariant (migrations/0004_item_picture_variants.sql).
+A variant that is missing or was rendered from an older picture is rendered on
+request and stored, so the backfill only saves first-request latency.
+"""
+import argparse
+import hmac
+import os
+import re
+import threading
+import tomllib
+from collections import OrderedDict
+from contextlib import contextmanager
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import psycopg2
+from psycopg2.extras import execute_values
+from psycopg2.pool import ThreadedConnectionPool
+
+from migrate import REPO_DIR, resolve_dsn
+from purchase_order.thumbnails import FILE_EXTENSIONS, IMAGE_VARIANTS, render_variant, sign_picture
+
+IMAGE_PATH = re.compile(r"^/items/(\d+)/(\w+)\.(\w+)$")
+
+# Versioned URLs (?v=<hash>) never change content; unversioned ones are revalidated via ETag
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+VARIANT_QUERY = """
+SELECT SourceHash, ContentType, Data
+FROM ItemPictureVariant
+WHERE ItemID = %s AND Variant = %s;
+"""
+
+PICTURE_QUERY = """
+SELECT md5(ItemPicture) AS SourceHash, ItemPicture
+FROM Item
+WHERE ItemID = %s AND ItemPicture IS NOT NULL;
+"""
+
+UPSERT_VARIANTS_QUERY = """
+INSERT INTO ItemPictureVariant (ItemID, Variant, SourceHash, ContentType, Data)
+VALUES %s
+ON CONFLICT (ItemID, Variant) DO UPDATE SET
+    SourceHash = EXCLUDED.SourceHash,
+    ContentType = EXCLUDED.ContentType,
+    Data = EXCLUDED.Data,
+    CreatedAt = now();
+"""
+
+# Pictures without an up-to-date variant
+STALE_PICTURES_QUERY = """
+SELECT i.ItemID, md5(i.ItemPicture) AS SourceHash, i.ItemPicture
+FROM Item i
+LEFT JOIN ItemPictureVariant v ON v.ItemID = i.ItemID AND v.Variant = %s
+WHERE i.ItemPicture IS NOT NULL
+  AND v.SourceHash IS DISTINCT FROM md5(i.ItemPicture)
+ORDER BY i.ItemID;
+"""
+
+
+def resolve_secret(secret=None):
+    """The URL signing key: `secret`, else $IMAGE_URL_SECRET, else [images] secret in secrets.toml."""
+    if secret:
+        return secret
+    if os.environ.get("IMAGE_URL_SECRET"):
+        return os.environ["IMAGE_URL_SECRET"]
+    secrets_path = os.path.join(REPO_DIR, ".streamlit", "secrets.toml")
+    try:
+        with open(secrets_path, "rb") as f:
+            return tomllib.load(f).get("images", {}).get("secret")
+    except FileNotFoundError:
+        return None
+
+
+def etag(source_hash, variant):
+    return f'"{source_hash}-{variant}"'
+
+
+class VariantStore:
+    """
+    Reads picture variants from the database, rendering missing or stale ones.
+
+    Pictures that fail to decode are remembered (up to `max_undecodable`, least
+    recently requested dropped first), so they aren't fetched and decoded again
+    on every request; a forgotten one is just retried once.
+    """
+
+    def __init__(self, dsn, max_connections=8, max_undecodable=4096):
+        self._pool = ThreadedConnectionPool(1, max_connections, dsn)
+        self.max_undecodable = max_undecodable
+        # (ItemID, variant, SourceHash) of pictures that failed to decode, oldest first
+        self._undecodable = OrderedDict()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _connection(self):
+        conn = self._pool.getconn()
+        try:
+            with conn:
+                yield conn
+        finally:
+            self._pool.putconn(conn, close=bool(conn.closed))
+
+    def _is_undecodable(self, key):
+        with self._lock:
+            if key not in self._undecodable:
+                return False
+            self._undecodable.move_to_end(key)
+            return True
+
+    def _mark_undecodable(self, key):
+        with self._lock:
+            self._undecodable[key] = True
+            self._undecodable.move_to_end(key)
+            while len(self._undecodable) > self.max_undecodable:
+                self._undecodable.popitem(last=False)
+
+    def get(self, itemid, variant, source_hash=None):
+        """
+        Returns (source_hash, content_type, data) of the item's variant, or None if the
+        item has no picture. With `source_hash`, a variant rendered from any other
+        picture version is re-rendered from the current picture.
+        """
+        with self._connection() as conn, conn.cursor() as cur:
+            cur.execute(VARIANT_QUERY, (itemid, variant))
+            row = cur.fetchone()
+            if row is not None and (source_hash is None or row[0] == source_hash):
+                return row[0], row[1], bytes(row[2])
+            if self._is_undecodable((itemid, variant, source_hash)):
+                return None  # without fetching the picture again
+
+            cur.execute(PICTURE_QUERY, (itemid,))
+            picture = cur.fetchone()
+            if picture is None:
+                return None
+            current_hash, image_bytes = picture[0], bytes(picture[1])
+            if row is not None and row[0] == current_hash:
+                # Requested an outdated version: serve the current one
+                return row[0], row[1], bytes(row[2])
+            if self._is_undecodable((itemid, variant, current_hash)):
+                return None
+            try:
+                content_type, data = render_variant(image_bytes, variant)
+            except Exception:
+                # Undecodable picture: shown as "No Image" like before, without retrying
+                self._mark_undecodable((itemid, variant, current_hash))
+                return None
+            execute_values(cur, UPSERT_VARIANTS_QUERY,
+                           [(itemid, variant, current_hash, content_type, psycopg2.Binary(data))])
+            return current_hash, content_type, data
+
+    def close(self):
+        self._pool.closeall()
+
+
+class ImageRequestHandler(BaseHTTPRequestHandler):
+    server_version = "AMASImages/1.0"
+    store = None  # VariantStore, set by make_server
+    secret = None  # URL signing key, set by make_server
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        match = IMAGE_PATH.match(url.path)
+        if not match or match.group(2) not in IMAGE_VARIANTS:
+            self.send_error(HTTPStatus.NOT_FOUND)
+            return
+        itemid, variant, extension = int(match.group(1)), match.group(2), match.group(3)
+        if extension != FILE_EXTENSIONS[IMAGE_VARIANTS[variant]["format"]]:
+            self.send_error(HTTPStatus.NOT_FOUND)
+            return
+        query = parse_qs(url.query)
+        version = query.get("v", [None])[0]
+        signature = query.get("s", [""])[0]
+        if not version or not hmac.compare_digest(signature, sign_picture(self.secret, itemid, variant, version)):
+            self.send_error(HTTPStatus.FORBIDDEN)
+            return
+
+        # The content of a versioned URL never changes: answer revalidations without the DB
+        if version and self.headers.get("If-None-Match") == etag(version, variant):
+            self._send_not_modified(etag(version, variant), IMMUTABLE_CACHE_CONTROL)
+            return
+
+        try:
+            found = self.store.get(itemid, variant, version)
+        except psycopg2.Error:
+            self.send_error(HTTPStatus.SERVICE_UNAVAILABLE)
+            return
+        if found is None:
+            self.send_error(HTTPStatus.NOT_FOUND)
+            return
+
+        source_hash, content_type, data = found
+        tag = etag(source_hash, variant)
+        cache_control = IMMUTABLE_CACHE_CONTROL if version == source_hash else REVALIDATE_CACHE_CONTROL
+        if self.headers.get("If-None-Match") == tag:
+            self._send_not_modified(tag, cache_control)
+            return
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("ETag", tag)
+        self.send_header("Cache-Control", cache_control)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_not_modified(self, tag, cache_control):
+        self.send_response(HTTPStatus.NOT_MODIFIED)
+        self.send_header("ETag", tag)
+        self.send_header("Cache-Control", cache_control)
+        self.end_headers()
+
+
+def make_server(dsn, secret, host="0.0.0.0", port=8502):
+    """Builds the HTTP server (call serve_forever() on it); `secret` is the URL signing key."""
+    if not secret:
+        raise ValueError("The image server needs a URL signing key ([images] secret)")
+    handler = type("Handler", (ImageRequestHandler,),
+                   {"store": VariantStore(dsn), "secret": secret})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def backfill(dsn, variants=None, batch_size=100, log=print):
+    """
+    Renders every variant that is missing or stale, streaming the pictures with a
+    server-side cursor and writing them in batches.
+
+    Returns:
+        int: Number of variants written.
+    """
+    written = 0
+    read_conn = psycopg2.connect(dsn)
+    write_conn = psycopg2.connect(dsn)
+    try:
+        for variant in variants or IMAGE_VARIANTS:
+            with read_conn, read_conn.cursor(name=f"backfill_{variant}") as cur:
+                cur.itersize = batch_size
+                cur.execute(STALE_PICTURES_QUERY, (variant,))
+                batch = []
+                for itemid, source_hash, picture in cur:
+                    try:
+                        content_type, data = render_variant(bytes(picture), variant)
+                    except Exception as e:
+                        log(f"Skipping item {itemid}: {e}")
+                        continue
+                    batch.append((itemid, variant, source_hash, content_type, psycopg2.Binary(data)))
+                    if len(batch) >= batch_size:
+                        written += _write_variants(write_conn, batch)
+                        log(f"{variant}: {written} written ...")
+                        batch = []
+                written += _write_variants(write_conn, batch)
+    finally:
+        read_conn.close()
+        write_conn.close()
+    return written
+
+
+def _write_variants(conn, rows):
+    if not rows:
+        return 0
+    with conn, conn.cursor() as cur:
+        execute_values(cur, UPSERT_VARIANTS_QUERY, rows)
+    return len(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dsn")
+    parser.add_argument("--secret", help="URL signing key (default: $IMAGE_URL_SECRET or [images] secret)")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8502)
+    parser.add_argument("--backfill", action="store_true", help="Render variants of existing pictures and exit")
+    args = parser.parse_args()
+    dsn = resolve_dsn(args.dsn)
+
+    if args.backfill:
+        print(f"Wrote {backfill(dsn)} picture variant(s).")
+        return
+
+    secret = resolve_secret(args.secret)
+    if not secret:
+        parser.error("no URL signing key: pass --secret, set $IMAGE_URL_SECRET or [images] secret")
+    server = make_server(dsn, secret, args.host, args.port)
+    print(f"Serving item pictures on http://{args.host}:{args.port}/items/<ItemID>/<variant>")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.RequestHandlerClass.store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,286 @@
+"""
+Applies the versioned SQL migrations in migrations/ and checks index usage.
+
+    python migrate.py                   # apply pending migrations
+    python migrate.py --status          # list applied / pending migrations
+    python migrate.py --check-indexes   # EXPLAIN each po_handler read query
+
+The DSN comes from --dsn, else $DATABASE_URL, else [neon] dsn in
+.streamlit/secrets.toml.
+
+Migration files are named NNNN_description.sql and run in order, each in its own
+transaction. A file starting with "-- migrate:no-transaction" (needed for
+CREATE INDEX CONCURRENTLY) runs statement by statement in autocommit mode.
+"""
+import argparse
+import hashlib
+import os
+import re
+import sys
+import tomllib
+
+import psycopg2
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+MIGRATIONS_DIR = os.path.join(REPO_DIR, "migrations")
+NO_TRANSACTION_MARKER = "-- migrate:no-transaction"
+MIGRATION_FILE = re.compile(r"^(\d{4})_(\w+)\.sql$")
+
+# Arbitrary key for pg_advisory_lock so concurrent app instances don't migrate at once
+MIGRATION_LOCK_KEY = 7_420_001
+
+# Tables whose scans must use an index in the --check-indexes report
+INDEXED_TABLES = {"purchaseorders", "purchaseorderitems", "supplier", "supplierpostats"}
+
+# A failed CREATE INDEX CONCURRENTLY leaves an INVALID index behind, which
+# IF NOT EXISTS would then skip: such leftovers are dropped before the build
+CONCURRENT_INDEX = re.compile(r"\bCREATE\s+(?:UNIQUE\s+)?INDEX\s+CONCURRENTLY\s+IF\s+NOT\s+EXISTS\s+(\w+)",
+                              re.IGNORECASE)
+
+INVALID_INDEXES_QUERY = """
+SELECT c.relname, t.relname
+FROM pg_index i
+JOIN pg_class c ON c.oid = i.indexrelid
+JOIN pg_class t ON t.oid = i.indrelid
+WHERE NOT i.indisvalid
+  AND c.relnamespace = current_schema()::regnamespace
+ORDER BY c.relname;
+"""
+
+
+class Migration:
+    def __init__(self, version, name, path):
+        self.version = version
+        self.name = name
+        self.path = path
+        with open(path) as f:
+            self.sql = f.read()
+        self.checksum = hashlib.sha256(self.sql.encode()).hexdigest()
+
+    @property
+    def transactional(self):
+        return not self.sql.lstrip().startswith(NO_TRANSACTION_MARKER)
+
+    def statements(self):
+        """Splits the file into statements (only used for no-transaction migrations)."""
+        statements = []
+        for chunk in re.split(r";\s*$", self.sql, flags=re.MULTILINE):
+            code = "\n".join(line for line in chunk.splitlines() if not line.strip().startswith("--"))
+            if code.strip():
+                statements.append(chunk.strip())
+        return statements
+
+
+def discover_migrations(directory=MIGRATIONS_DIR):
+    """Returns the migration files in version order."""
+    migrations = []
+    for filename in sorted(os.listdir(directory)):
+        match = MIGRATION_FILE.match(filename)
+        if match:
+            migrations.append(Migration(int(match.group(1)), match.group(2), os.path.join(directory, filename)))
+    versions = [m.version for m in migrations]
+    if len(versions) != len(set(versions)):
+        raise ValueError("Duplicate migration version numbers in migrations/")
+    return migrations
+
+
+def resolve_dsn(dsn=None):
+    if dsn:
+        return dsn
+    if os.environ.get("DATABASE_URL"):
+        return os.environ["DATABASE_URL"]
+    secrets_path = os.path.join(REPO_DIR, ".streamlit", "secrets.toml")
+    with open(secrets_path, "rb") as f:
+        return tomllib.load(f)["neon"]["dsn"]
+
+
+def _ensure_migrations_table(conn):
+    with conn, conn.cursor() as cur:
+        cur.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version integer PRIMARY KEY,
+            name text NOT NULL,
+            checksum text NOT NULL,
+            applied_at timestamptz NOT NULL DEFAULT now()
+        );
+        """)
+
+
+def applied_migrations(conn):
+    """Returns {version: checksum} of migrations already applied."""
+    _ensure_migrations_table(conn)
+    with conn, conn.cursor() as cur:
+        cur.execute("SELECT version, checksum FROM schema_migrations")
+        return dict(cur.fetchall())
+
+
+def _drop_invalid_index(cur, statement, log=print):
+    """Drops the INVALID leftover of an earlier failed build of the index `statement` creates."""
+    match = CONCURRENT_INDEX.search(statement)
+    if match is None:
+        return
+    name = match.group(1).lower()
+    cur.execute(INVALID_INDEXES_QUERY)
+    if any(index == name for index, _ in cur.fetchall()):
+        log(f"Dropping invalid index {name} left by a failed build")
+        cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+
+
+def _apply(conn, migration, log=print):
+    record = ("INSERT INTO schema_migrations (version, name, checksum) VALUES (%s, %s, %s)",
+              (migration.version, migration.name, migration.checksum))
+    if migration.transactional:
+        with conn, conn.cursor() as cur:
+            cur.execute(migration.sql)
+            cur.execute(*record)
+        return
+
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cur:
+            for statement in migration.statements():
+                _drop_invalid_index(cur, statement, log)
+                cur.execute(statement)
+            cur.execute(*record)
+    finally:
+        conn.autocommit = False
+
+
+def migrate(dsn, migrations=None, log=print):
+    """
+    Applies every pending migration, in order.
+
+    Returns:
+        list[Migration]: The migrations applied by this call.
+    """
+    migrations = discover_migrations() if migrations is None else migrations
+    conn = psycopg2.connect(dsn)
+    try:
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_KEY,))
+        conn.autocommit = False
+        try:
+            done = applied_migrations(conn)
+            applied = []
+            for migration in migrations:
+                if migration.version in done:
+                    if done[migration.version] != migration.checksum:
+                        log(f"Warning: {migration.path} changed after it was applied")
+                    continue
+                log(f"Applying {os.path.basename(migration.path)} ...")
+                _apply(conn, migration, log)
+                applied.append(migration)
+            return applied
+        finally:
+            conn.autocommit = True
+            with conn.cursor() as cur:
+                cur.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_KEY,))
+    finally:
+        conn.close()
+
+
+def _plan_nodes(plan):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from _plan_nodes(child)
+
+
+def index_check_queries(cur):
+    """(name, query, params) for each po_handler / supplier_db read, with sample parameters."""
+    sys.path.insert(0, REPO_DIR)
+    from purchase_order import po_handler
+    from supplier_db import SUPPLIER_BY_EMAIL_QUERY
+
+    cur.execute("SELECT SupplierID, POID FROM PurchaseOrders ORDER BY POID LIMIT 1")
+    row = cur.fetchone()
+    if row is None:
+        raise RuntimeError("PurchaseOrders is empty: seed some data before --check-indexes")
+    supplier_id, poid = row
+    cur.execute("SELECT contactemail FROM supplier WHERE supplierid = %s", (supplier_id,))
+    email = cur.fetchone()[0]
+    archived_query, archived_params = po_handler._archived_page_query(supplier_id, 20)
+
+    return [
+        ("get_supplier_by_email", SUPPLIER_BY_EMAIL_QUERY, (email,)),
+        ("get_purchase_orders_for_supplier", po_handler.ACTIVE_PO_QUERY, (supplier_id,)),
+        ("get_archived_purchase_orders", po_handler.ARCHIVED_PO_QUERY, (supplier_id,)),
+        ("get_archived_purchase_orders_page", archived_query, archived_params),
+        ("get_purchase_order_items", po_handler.PO_ITEMS_QUERY, (poid,)),
+        ("get_items_for_purchase_orders", po_handler.PO_ITEMS_BULK_QUERY, ([poid],)),
+        ("get_purchase_orders_with_items", po_handler.PO_WITH_ITEMS_QUERY,
+         (supplier_id, list(po_handler.ACTIVE_PO_STATUSES))),
+        ("get_purchase_orders_by_id", po_handler.PO_WITH_ITEMS_BY_ID_QUERY,
+         ([poid], supplier_id, list(po_handler.ACTIVE_PO_STATUSES))),
+        ("load_purchase_order_pages (items)", po_handler.SUPPLIER_PO_ITEMS_QUERY,
+         (supplier_id, list(po_handler.ACTIVE_PO_STATUSES))),
+        ("get_supplier_po_kpis", po_handler.SUPPLIER_PO_STATS_QUERY, (supplier_id,)),
+    ]
+
+
+def check_indexes(dsn, log=print):
+    """
+    EXPLAINs each read query and reports any sequential scan on the PO / supplier
+    tables. Seq scans are disabled for the check, so a remaining Seq Scan means no
+    usable index exists (not just that the table is small). INVALID indexes (left
+    by a failed concurrent build; the planner ignores them) are reported too.
+
+    Returns:
+        list[tuple]: (query name, table) for every scan that doesn't use an index,
+        and ("invalid index <name>", table) for every invalid index.
+    """
+    failures = []
+    conn = psycopg2.connect(dsn)
+    try:
+        with conn.cursor() as cur:
+            cur.execute(INVALID_INDEXES_QUERY)
+            for index, table in cur.fetchall():
+                failures.append((f"invalid index {index}", table))
+                log(f"FAIL invalid index {index} on {table}: drop and rebuild it "
+                    "(migrate.py does both while its migration is pending)")
+            cur.execute("SET enable_seqscan = off")
+            for name, query, params in index_check_queries(cur):
+                cur.execute("EXPLAIN (FORMAT JSON) " + query, params)
+                plan = cur.fetchone()[0][0]["Plan"]
+                seq_scans = sorted({
+                    node["Relation Name"].lower()
+                    for node in _plan_nodes(plan)
+                    if node["Node Type"] == "Seq Scan"
+                    and node.get("Relation Name", "").lower() in INDEXED_TABLES
+                })
+                for table in seq_scans:
+                    failures.append((name, table))
+                log(f"{'FAIL' if seq_scans else 'ok  '} {name}" + (f" (seq scan on {', '.join(seq_scans)})" if seq_scans else ""))
+        conn.rollback()
+    finally:
+        conn.close()
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dsn")
+    parser.add_argument("--status", action="store_true", help="List applied and pending migrations")
+    parser.add_argument("--check-indexes", action="store_true", help="Verify each read query uses an index")
+    args = parser.parse_args()
+    dsn = resolve_dsn(args.dsn)
+
+    if args.status:
+        conn = psycopg2.connect(dsn)
+        try:
+            done = applied_migrations(conn)
+        finally:
+            conn.close()
+        for migration in discover_migrations():
+            state = "applied" if migration.version in done else "pending"
+            print(f"{migration.version:04d} {migration.name:<40} {state}")
+    elif args.check_indexes:
+        if check_indexes(dsn):
+            sys.exit(1)
+    else:
+        applied = migrate(dsn)
+        print(f"Applied {len(applied)} migration(s).")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+-- Supplier dashboard KPIs, kept up to date incrementally by triggers so the
+-- dashboard reads one row per supplier regardless of order history length.
+-- Safe to re-run.
+
+-- When an order became Delivered (needed for on-time rate and lead time).
+-- Orders delivered before this migration keep NULL: nothing records when they
+-- were delivered (ExpectedDelivery would make every one of them on time), so the
+-- on-time rate and lead time only cover orders delivered from now on, and the
+-- dashboard says how many orders they are based on.
+ALTER TABLE PurchaseOrders ADD COLUMN IF NOT EXISTS DeliveredAt timestamptz;
+
+CREATE TABLE IF NOT EXISTS SupplierPOStats (
+    SupplierID integer PRIMARY KEY,
+    PendingCount integer NOT NULL DEFAULT 0,
+    AcceptedCount integer NOT NULL DEFAULT 0,
+    ShippingCount integer NOT NULL DEFAULT 0,
+    DeclinedCount integer NOT NULL DEFAULT 0,
+    DeliveredCount integer NOT NULL DEFAULT 0,
+    CompletedCount integer NOT NULL DEFAULT 0,
+    -- Delivered/Completed orders with an ExpectedDelivery, and those delivered by then
+    DueDeliveredCount integer NOT NULL DEFAULT 0,
+    OnTimeCount integer NOT NULL DEFAULT 0,
+    -- Sum / count of (DeliveredAt - OrderDate) in days
+    LeadTimeDaysTotal numeric NOT NULL DEFAULT 0,
+    LeadTimeCount integer NOT NULL DEFAULT 0,
+    -- Sum over PurchaseOrderItems of quantity * price (proposed values fall back to ordered/estimated)
+    EstimatedValue numeric NOT NULL DEFAULT 0,
+    ProposedValue numeric NOT NULL DEFAULT 0,
+    UpdatedAt timestamptz NOT NULL DEFAULT now()
+);
+
+-- Stamp DeliveredAt when an order's status changes to Delivered
+CREATE OR REPLACE FUNCTION po_stamp_delivered() RETURNS trigger AS $$
+BEGIN
+    IF NEW.Status = 'Delivered' AND OLD.Status IS DISTINCT FROM 'Delivered' THEN
+        NEW.DeliveredAt := now();
+    END IF;
+    RETURN NEW;
+END $$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS po_stamp_delivered ON PurchaseOrders;
+CREATE TRIGGER po_stamp_delivered
+    BEFORE UPDATE OF Status ON PurchaseOrders
+    FOR EACH ROW EXECUTE FUNCTION po_stamp_delivered();
+
+-- Add (sign = 1) or remove (sign = -1) one order's contribution to its supplier's row
+CREATE OR REPLACE FUNCTION supplier_po_stats_apply_order(po PurchaseOrders, sign integer) RETURNS void AS $$
+DECLARE
+    delivered boolean := po.Status IN ('Delivered', 'Completed') AND po.DeliveredAt IS NOT NULL;
+    due boolean := delivered AND po.ExpectedDelivery IS NOT NULL;
+BEGIN
+    INSERT INTO SupplierPOStats AS s (
+        SupplierID, PendingCount, AcceptedCount, ShippingCount, DeclinedCount,
+        DeliveredCount, CompletedCount, DueDeliveredCount, OnTimeCount,
+        LeadTimeDaysTotal, LeadTimeCount
+    ) VALUES (
+        po.SupplierID,
+        sign * (po.Status = 'Pending')::int,
+        sign * (po.Status = 'Accepted')::int,
+        sign * (po.Status = 'Shipping')::int,
+        sign * (po.Status = 'Declined')::int,
+        sign * (po.Status = 'Delivered')::int,
+        sign * (po.Status = 'Completed')::int,
+        sign * due::int,
+        sign * (due AND po.DeliveredAt::date <= po.ExpectedDelivery::date)::int,
+        CASE WHEN delivered
+             THEN sign * EXTRACT(EPOCH FROM po.DeliveredAt - po.OrderDate::timestamptz) / 86400
+             ELSE 0 END,
+        sign * delivered::int
+    )
+    ON CONFLICT (SupplierID) DO UPDATE SET
+        PendingCount = s.PendingCount + EXCLUDED.PendingCount,
+        AcceptedCount = s.AcceptedCount + EXCLUDED.AcceptedCount,
+        ShippingCount = s.ShippingCount + EXCLUDED.ShippingCount,
+        DeclinedCount = s.DeclinedCount + EXCLUDED.DeclinedCount,
+        DeliveredCount = s.DeliveredCount + EXCLUDED.DeliveredCount,
+        CompletedCount = s.CompletedCount + EXCLUDED.CompletedCount,
+        DueDeliveredCount = s.DueDeliveredCount + EXCLUDED.DueDeliveredCount,
+        OnTimeCount = s.OnTimeCount + EXCLUDED.OnTimeCount,
+        LeadTimeDaysTotal = s.LeadTimeDaysTotal + EXCLUDED.LeadTimeDaysTotal,
+        LeadTimeCount = s.LeadTimeCount + EXCLUDED.LeadTimeCount,
+        UpdatedAt = now();
+END $$ LANGUAGE plpgsql;
+
+-- Add or remove one item line's value contribution to its order's supplier
+CREATE OR REPLACE FUNCTION supplier_po_stats_apply_item(poi PurchaseOrderItems, sign integer) RETURNS void AS $$
+BEGIN
+    INSERT INTO SupplierPOStats AS s (SupplierID, EstimatedValue, ProposedValue)
+    SELECT
+        po.SupplierID,
+        sign * COALESCE(poi.OrderedQuantity, 0) * COALESCE(poi.EstimatedPrice, 0),
+        sign * COALESCE(poi.SupProposedQuantity, poi.OrderedQuantity, 0)
+             * COALESCE(poi.SupProposedPrice, poi.EstimatedPrice, 0)
+    FROM PurchaseOrders po
+    WHERE po.POID = poi.POID
+    ON CONFLICT (SupplierID) DO UPDATE SET
+        EstimatedValue = s.EstimatedValue + EXCLUDED.EstimatedValue,
+        ProposedValue = s.ProposedValue + EXCLUDED.ProposedValue,
+        UpdatedAt = now();
+END $$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION supplier_po_stats_order_trigger() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'UPDATE'
+       AND (OLD.SupplierID, OLD.Status, OLD.OrderDate, OLD.ExpectedDelivery, OLD.DeliveredAt)
+           IS NOT DISTINCT FROM
+           (NEW.SupplierID, NEW.Status, NEW.OrderDate, NEW.ExpectedDelivery, NEW.DeliveredAt) THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM supplier_po_stats_apply_order(OLD, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM supplier_po_stats_apply_order(NEW, 1);
+    END IF;
+    RETURN NULL;
+END $$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS supplier_po_stats_order ON PurchaseOrders;
+CREATE TRIGGER supplier_po_stats_order
+    AFTER INSERT OR UPDATE OR DELETE ON PurchaseOrders
+    FOR EACH ROW EXECUTE FUNCTION supplier_po_stats_order_trigger();
+
+CREATE OR REPLACE FUNCTION supplier_po_stats_item_trigger() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM supplier_po_stats_apply_item(OLD, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM supplier_po_stats_apply_item(NEW, 1);
+    END IF;
+    RETURN NULL;
+END $$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS supplier_po_stats_item ON PurchaseOrderItems;
+CREATE TRIGGER supplier_po_stats_item
+    AFTER INSERT OR UPDATE OR DELETE ON PurchaseOrderItems
+    FOR EACH ROW EXECUTE FUNCTION supplier_po_stats_item_trigger();
+
+-- Full recompute of one supplier's row (initial backfill / repair)
+CREATE OR REPLACE FUNCTION refresh_supplier_po_stats(p_supplier_id integer) RETURNS void AS $$
+BEGIN
+    DELETE FROM SupplierPOStats WHERE SupplierID = p_supplier_id;
+    PERFORM supplier_po_stats_apply_order(po, 1)
+    FROM PurchaseOrders po
+    WHERE po.SupplierID = p_supplier_id;
+    PERFORM supplier_po_stats_apply_item(poi, 1)
+    FROM PurchaseOrderItems poi
+    JOIN PurchaseOrders po ON po.POID = poi.POID
+    WHERE po.SupplierID = p_supplier_id;
+END $$ LANGUAGE plpgsql;
+
+-- Backfill every supplier that already has orders
+SELECT refresh_supplier_po_stats(SupplierID)
+FROM (SELECT DISTINCT SupplierID FROM PurchaseOrders) suppliers;
@@ -0,0 +1,28 @@
+-- migrate:no-transaction
+-- Indexes for the supplier app's hot queries. Built CONCURRENTLY so the
+-- migration doesn't block the buyer app's writes; each statement runs on its own.
+
+-- Active POs: WHERE SupplierID = ? AND Status IN ('Pending','Accepted','Shipping') ORDER BY OrderDate DESC
+CREATE INDEX CONCURRENTLY IF NOT EXISTS purchaseorders_active_supplier_date_idx
+    ON PurchaseOrders (SupplierID, OrderDate DESC, POID DESC)
+    WHERE Status IN ('Pending', 'Accepted', 'Shipping');
+
+-- Archived POs, keyset-paginated on (OrderDate, POID) DESC
+CREATE INDEX CONCURRENTLY IF NOT EXISTS purchaseorders_archived_supplier_date_idx
+    ON PurchaseOrders (SupplierID, OrderDate DESC, POID DESC)
+    WHERE Status IN ('Declined', 'Delivered', 'Completed');
+
+-- Any other per-supplier status filter (arbitrary status lists, KPI aggregation)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS purchaseorders_supplier_status_idx
+    ON PurchaseOrders (SupplierID, Status);
+
+-- Line items by order (joins on POID) and by item
+CREATE INDEX CONCURRENTLY IF NOT EXISTS purchaseorderitems_poid_idx
+    ON PurchaseOrderItems (POID);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS purchaseorderitems_itemid_idx
+    ON PurchaseOrderItems (ItemID);
+
+-- Supplier lookup by login email on every rerun; also prevents duplicate suppliers.
+-- Fails if duplicates already exist: merge them first.
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS supplier_contactemail_key
+    ON supplier (contactemail);
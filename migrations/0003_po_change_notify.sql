@@ -0,0 +1,46 @@
+-- Change feed for the supplier app: every change to an order or its lines sends
+-- NOTIFY po_changes with {"poid": ..., "supplierid": ...}. Listeners refetch just
+-- that order instead of reloading the supplier's whole PO list.
+-- Postgres folds identical payloads sent in one transaction, so a multi-line
+-- update notifies once per order. Safe to re-run.
+
+CREATE OR REPLACE FUNCTION po_notify(p_poid integer, p_supplier_id integer) RETURNS void AS $$
+BEGIN
+    IF p_poid IS NOT NULL AND p_supplier_id IS NOT NULL THEN
+        PERFORM pg_notify('po_changes', json_build_object('poid', p_poid, 'supplierid', p_supplier_id)::text);
+    END IF;
+END $$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION po_notify_order_trigger() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM po_notify(OLD.POID, OLD.SupplierID);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        -- Also covers an order moved to another supplier
+        PERFORM po_notify(NEW.POID, NEW.SupplierID);
+    END IF;
+    RETURN NULL;
+END $$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS po_notify_order ON PurchaseOrders;
+CREATE TRIGGER po_notify_order
+    AFTER INSERT OR UPDATE OR DELETE ON PurchaseOrders
+    FOR EACH ROW EXECUTE FUNCTION po_notify_order_trigger();
+
+CREATE OR REPLACE FUNCTION po_notify_item_trigger() RETURNS trigger AS $$
+BEGIN
+    -- When lines are deleted by cascade the order row is already gone (and has notified)
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM po_notify(OLD.POID, (SELECT SupplierID FROM PurchaseOrders WHERE POID = OLD.POID));
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM po_notify(NEW.POID, (SELECT SupplierID FROM PurchaseOrders WHERE POID = NEW.POID));
+    END IF;
+    RETURN NULL;
+END $$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS po_notify_item ON PurchaseOrderItems;
+CREATE TRIGGER po_notify_item
+    AFTER INSERT OR UPDATE OR DELETE ON PurchaseOrderItems
+    FOR EACH ROW EXECUTE FUNCTION po_notify_item_trigger();
@@ -0,0 +1,15 @@
+-- Pre-rendered item picture variants (thumbnails), served by image_server.py so
+-- pages reference pictures by URL instead of inlining them as data URIs.
+-- Filled by `python image_server.py --backfill` and on demand by the server.
+-- Safe to re-run.
+
+CREATE TABLE IF NOT EXISTS ItemPictureVariant (
+    ItemID integer NOT NULL REFERENCES Item (ItemID) ON DELETE CASCADE,
+    Variant text NOT NULL,
+    -- md5(Item.ItemPicture) the variant was rendered from; a new picture makes it stale
+    SourceHash text NOT NULL,
+    ContentType text NOT NULL,
+    Data bytea NOT NULL,
+    CreatedAt timestamptz NOT NULL DEFAULT now(),
+    PRIMARY KEY (ItemID, Variant)
+);
@@ -0,0 +1,17 @@
+-- Row version for optimistic concurrency: every update of an order (from any app)
+-- bumps RowVersion, so a write can require the version it was based on
+-- (compare-and-set) instead of silently overwriting a concurrent change.
+-- Safe to re-run.
+
+ALTER TABLE PurchaseOrders ADD COLUMN IF NOT EXISTS RowVersion integer NOT NULL DEFAULT 1;
+
+CREATE OR REPLACE FUNCTION po_bump_row_version() RETURNS trigger AS $$
+BEGIN
+    NEW.RowVersion := OLD.RowVersion + 1;
+    RETURN NEW;
+END $$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS po_bump_row_version ON PurchaseOrders;
+CREATE TRIGGER po_bump_row_version
+    BEFORE UPDATE ON PurchaseOrders
+    FOR EACH ROW EXECUTE FUNCTION po_bump_row_version();
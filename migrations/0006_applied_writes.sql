@@ -0,0 +1,14 @@
+-- Idempotency keys of writes applied by the write-behind queue
+-- (purchase_order/po_write_queue.py). A key is claimed in the same transaction as
+-- its write, so a write replayed after a crash or a lost commit acknowledgement is
+-- recognised and not applied twice; Result holds what the first application returned.
+-- Safe to re-run.
+
+CREATE TABLE IF NOT EXISTS AppliedWrites (
+    IdempotencyKey text PRIMARY KEY,
+    Operation text NOT NULL,
+    Result jsonb,
+    AppliedAt timestamptz NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS appliedwrites_appliedat_idx ON AppliedWrites (AppliedAt);
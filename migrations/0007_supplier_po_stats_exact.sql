@@ -0,0 +1,66 @@
+-- Keeps SupplierPOStats' order values exact where 0001's triggers let them drift:
+-- - Lines deleted by a cascading order delete were never subtracted: their trigger
+--   runs after the order row is gone, so it can't tell whose value they were.
+--   The order's lines are now subtracted when the order is deleted.
+-- - An order moved to another supplier (SupplierID changed) left its lines' value
+--   with the old supplier. It now moves with the order.
+-- Rows that drifted before this migration are rebuilt at the end. Should a row
+-- ever drift again (e.g. triggers disabled during a bulk load), rebuild it with
+-- SELECT refresh_supplier_po_stats(<SupplierID>). Safe to re-run.
+
+-- Add (sign = 1) or remove (sign = -1) the value of an order's lines, as they are now
+CREATE OR REPLACE FUNCTION supplier_po_stats_apply_order_items(p_poid integer, p_supplier_id integer, sign integer)
+RETURNS void AS $$
+BEGIN
+    INSERT INTO SupplierPOStats AS s (SupplierID, EstimatedValue, ProposedValue)
+    SELECT
+        p_supplier_id,
+        sign * COALESCE(sum(COALESCE(poi.OrderedQuantity, 0) * COALESCE(poi.EstimatedPrice, 0)), 0),
+        sign * COALESCE(sum(COALESCE(poi.SupProposedQuantity, poi.OrderedQuantity, 0)
+                            * COALESCE(poi.SupProposedPrice, poi.EstimatedPrice, 0)), 0)
+    FROM PurchaseOrderItems poi
+    WHERE poi.POID = p_poid
+    ON CONFLICT (SupplierID) DO UPDATE SET
+        EstimatedValue = s.EstimatedValue + EXCLUDED.EstimatedValue,
+        ProposedValue = s.ProposedValue + EXCLUDED.ProposedValue,
+        UpdatedAt = now();
+END $$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION supplier_po_stats_order_trigger() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'UPDATE' AND OLD.SupplierID IS DISTINCT FROM NEW.SupplierID THEN
+        PERFORM supplier_po_stats_apply_order_items(OLD.POID, OLD.SupplierID, -1);
+        PERFORM supplier_po_stats_apply_order_items(NEW.POID, NEW.SupplierID, 1);
+    END IF;
+    IF TG_OP = 'UPDATE'
+       AND (OLD.SupplierID, OLD.Status, OLD.OrderDate, OLD.ExpectedDelivery, OLD.DeliveredAt)
+           IS NOT DISTINCT FROM
+           (NEW.SupplierID, NEW.Status, NEW.OrderDate, NEW.ExpectedDelivery, NEW.DeliveredAt) THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM supplier_po_stats_apply_order(OLD, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM supplier_po_stats_apply_order(NEW, 1);
+    END IF;
+    RETURN NULL;
+END $$ LANGUAGE plpgsql;
+
+-- Before the delete, while the lines are still there: lines deleted along with
+-- the order then find no order in supplier_po_stats_apply_item and count nothing,
+-- and lines deleted on their own beforehand have already been subtracted
+CREATE OR REPLACE FUNCTION supplier_po_stats_order_delete_trigger() RETURNS trigger AS $$
+BEGIN
+    PERFORM supplier_po_stats_apply_order_items(OLD.POID, OLD.SupplierID, -1);
+    RETURN OLD;
+END $$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS supplier_po_stats_order_delete ON PurchaseOrders;
+CREATE TRIGGER supplier_po_stats_order_delete
+    BEFORE DELETE ON PurchaseOrders
+    FOR EACH ROW EXECUTE FUNCTION supplier_po_stats_order_delete_trigger();
+
+-- Rebuild every row, including those of suppliers that have no orders left
+SELECT refresh_supplier_po_stats(SupplierID)
+FROM (SELECT SupplierID FROM SupplierPOStats UNION SELECT SupplierID FROM PurchaseOrders) suppliers;
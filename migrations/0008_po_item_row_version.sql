@@ -0,0 +1,41 @@
+-- An order's RowVersion (0005) also covers its lines: inserting, updating or
+-- deleting lines bumps the order's RowVersion once per statement, however many
+-- of its lines changed, so a write based on an order's lines can't silently
+-- overwrite a concurrent change to them either.
+-- The bump is an update of the order, so po_bump_row_version does the counting.
+-- Lines deleted along with their order find no order left to bump.
+-- Safe to re-run.
+
+CREATE OR REPLACE FUNCTION po_bump_row_version_for_items() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        UPDATE PurchaseOrders SET RowVersion = RowVersion
+        WHERE POID IN (SELECT POID FROM new_items);
+    ELSIF TG_OP = 'UPDATE' THEN
+        UPDATE PurchaseOrders SET RowVersion = RowVersion
+        WHERE POID IN (SELECT POID FROM new_items UNION SELECT POID FROM old_items);
+    ELSE
+        UPDATE PurchaseOrders SET RowVersion = RowVersion
+        WHERE POID IN (SELECT POID FROM old_items);
+    END IF;
+    RETURN NULL;
+END $$ LANGUAGE plpgsql;
+
+-- Transition tables allow one event per trigger
+DROP TRIGGER IF EXISTS po_bump_row_version_items_insert ON PurchaseOrderItems;
+CREATE TRIGGER po_bump_row_version_items_insert
+    AFTER INSERT ON PurchaseOrderItems
+    REFERENCING NEW TABLE AS new_items
+    FOR EACH STATEMENT EXECUTE FUNCTION po_bump_row_version_for_items();
+
+DROP TRIGGER IF EXISTS po_bump_row_version_items_update ON PurchaseOrderItems;
+CREATE TRIGGER po_bump_row_version_items_update
+    AFTER UPDATE ON PurchaseOrderItems
+    REFERENCING OLD TABLE AS old_items NEW TABLE AS new_items
+    FOR EACH STATEMENT EXECUTE FUNCTION po_bump_row_version_for_items();
+
+DROP TRIGGER IF EXISTS po_bump_row_version_items_delete ON PurchaseOrderItems;
+CREATE TRIGGER po_bump_row_version_items_delete
+    AFTER DELETE ON PurchaseOrderItems
+    REFERENCING OLD TABLE AS old_items
+    FOR EACH STATEMENT EXECUTE FUNCTION po_bump_row_version_for_items();
@@ -0,0 +1,70 @@
+"""
+Row models for suppliers, purchase orders and their lines.
+
+Each model is a slotted dataclass built straight from a tuple cursor row
+(`Model.from_row`, passed to run_query as its row_factory), so queries must
+select the model's columns in field order. Field names are the lowercased
+column names, as the RealDictCursor rows had them.
+
+Values are stored as the driver returns them: date columns as datetime.date and
+numeric columns as decimal.Decimal. Models held by the query cache or a PO
+snapshot are shared between sessions and must not be mutated.
+"""
+from dataclasses import dataclass
+from datetime import date
+from decimal import Decimal
+from typing import Optional
+
+
+@dataclass(slots=True)
+class Supplier:
+    supplierid: int
+    suppliername: Optional[str]
+    suppliertype: Optional[str]
+    country: Optional[str]
+    city: Optional[str]
+    address: Optional[str]
+    postalcode: Optional[str]
+    contactname: Optional[str]
+    contactphone: Optional[str]
+    contactemail: Optional[str]
+    paymentterms: Optional[str]
+    bankdetails: Optional[str]
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(*row)
+
+
+@dataclass(slots=True)
+class PurchaseOrderItem:
+    itemid: int
+    itemnameenglish: str
+    picturehash: Optional[str]        # md5 of Item.ItemPicture, None without a picture
+    orderedquantity: int
+    estimatedprice: Optional[Decimal]
+    supproposedquantity: Optional[int]
+    supproposedprice: Optional[Decimal]
+    itempicture: Optional[str] = None  # thumbnail URL / data URI, set by po_handler
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(*row)
+
+
+@dataclass(slots=True)
+class PurchaseOrder:
+    poid: int
+    orderdate: date
+    expecteddelivery: Optional[date]
+    status: str
+    supproposeddeliver: Optional[date]
+    proposedstatus: Optional[str]
+    suppliernote: Optional[str]
+    rowversion: int
+    items: tuple = ()  # PurchaseOrderItem lines, when loaded together with the order
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(*row)
+
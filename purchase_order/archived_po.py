@@ -1,47 +1,111 @@
 import streamlit as st
-import io
-from PIL import Image
-from purchase_order.po_handler import get_archived_purchase_orders, get_purchase_order_items
+from purchase_order.po_handler import (
+    ARCHIVED_PAGE_SIZE,
+    ARCHIVED_PO_STATUSES,
+    get_archived_purchase_orders_page,
+    get_items_for_purchase_orders
+)
+from purchase_order.po_export import show_export_controls
 
-def show_archived_po_page(supplier):
-    """Displays archived (Declined, Delivered, Completed) purchase orders."""
+def show_archived_po_page(supplier, data=None):
+    """Displays archived (Declined, Delivered, Completed) purchase orders, one page at a time.
+       `data` is the optional result of load_purchase_order_pages (used for the unfiltered first page)."""
     st.subheader("📂 Archived Purchase Orders")
 
-    archived_orders = get_archived_purchase_orders(supplier["supplierid"])
+    # Filters (applied in SQL)
+    col_status, col_dates = st.columns(2)
+    statuses = col_status.multiselect(
+        "Status", list(ARCHIVED_PO_STATUSES), default=list(ARCHIVED_PO_STATUSES), key="archived_status_filter"
+    )
+    date_range = col_dates.date_input("Order Date range", value=(), key="archived_date_filter")
+    date_from = date_range[0] if len(date_range) > 0 else None
+    date_to = date_range[1] if len(date_range) > 1 else None
+
+    # Cursor stack for keyset pagination: cursors[i] is the `after` value of page i.
+    # Reset to the first page whenever the filters change.
+    filters = (supplier.supplierid, tuple(statuses), date_from, date_to)
+    if st.session_state.get("archived_po_filters") != filters:
+        st.session_state["archived_po_filters"] = filters
+        st.session_state["archived_po_cursors"] = [None]
+    cursors = st.session_state["archived_po_cursors"]
+
+    # Export of all filtered pages, with line items
+    show_export_controls(supplier.supplierid, "archived_export",
+                         statuses=statuses, date_from=date_from, date_to=date_to)
+
+    is_default_view = cursors == [None] and set(statuses) == set(ARCHIVED_PO_STATUSES) and not date_range
+    if data is not None and is_default_view:
+        archived_orders, next_cursor = data["archived"]
+    else:
+        # All statuses selected is passed as no filter, so the unfiltered first page
+        # shares its cache entry with main_po's prefetch
+        all_statuses = set(statuses) == set(ARCHIVED_PO_STATUSES)
+        archived_orders, next_cursor = get_archived_purchase_orders_page(
+            supplier.supplierid,
+            page_size=ARCHIVED_PAGE_SIZE,
+            after=cursors[-1],
+            statuses=None if all_statuses else statuses,
+            date_from=date_from,
+            date_to=date_to,
+        )
     if not archived_orders:
         st.info("No archived purchase orders.")
         return
 
+    # Only load items for POs whose items the supplier chose to show (cached per
+    # order, so showing one more fetches just its items)
+    open_poids = [
+        po.poid for po in archived_orders
+        if st.session_state.get(f"archived_items_{po.poid}", False)
+    ]
+    items_by_po = get_items_for_purchase_orders(open_poids)
+
     for po in archived_orders:
-        with st.expander(f"PO ID: {po['poid']} | Status: {po['status']}"):
-            st.write(f"**Order Date:** {po['orderdate']}")
-            st.write(f"**Expected Delivery:** {po['expecteddelivery'] or 'Not Set'}")
-            st.write(f"**Status:** {po['status']}")
+        with st.expander(f"PO ID: {po.poid} | Status: {po.status}"):
+            st.write(f"**Order Date:** {po.orderdate}")
+            st.write(f"**Expected Delivery:** {po.expecteddelivery or 'Not Set'}")
+            st.write(f"**Status:** {po.status}")
 
             # Show the reason for declining if status=Declined
-            if po["status"] == "Declined":
+            if po.status == "Declined":
                 # Display the supplier's note
-                if "suppliernote" in po and po["suppliernote"]:
-                    st.warning(f"**Decline Reason:** {po['suppliernote']}")
+                if po.suppliernote:
+                    st.warning(f"**Decline Reason:** {po.suppliernote}")
 
-            # Show ordered items
-            items = get_purchase_order_items(po["poid"])
+            # Show ordered items (fetched only once the toggle is on)
+            if not st.toggle("Show ordered items", key=f"archived_items_{po.poid}"):
+                continue
+            items = items_by_po.get(po.poid)
+            if items is None:
+                # Not prefetched above: fetch just this PO's items
+                items = get_items_for_purchase_orders([po.poid])[po.poid]
             if items:
                 st.subheader("Ordered Items")
                 for item in items:
                     col1, col2 = st.columns([1, 3])
-                    
+
                     with col1:
-                        if item["itempicture"]:
-                            try:
-                                image = Image.open(io.BytesIO(item["itempicture"]))
-                                st.image(image, width=100, caption=item["itemnameenglish"])
-                            except Exception:
-                                st.warning("Error displaying image.")
+                        if item.itempicture:
+                            # itempicture is a thumbnail URL or data URI
+                            st.image(item.itempicture, width=100, caption=item.itemnameenglish)
                         else:
                             st.write("No Image")
 
                     with col2:
-                        st.write(f"**{item['itemnameenglish']}**")
-                        st.write(f"**Ordered Quantity:** {item['orderedquantity']}")
-                        st.write(f"**Estimated Price:** {item['estimatedprice'] or 'N/A'}")
+                        st.write(f"**{item.itemnameenglish}**")
+                        st.write(f"**Ordered Quantity:** {item.orderedquantity}")
+                        st.write(f"**Estimated Price:** {item.estimatedprice or 'N/A'}")
+            else:
+                st.write("No items on this order.")
+
+    # Page navigation
+    col_prev, col_page, col_next = st.columns([1, 2, 1])
+    with col_prev:
+        if len(cursors) > 1 and st.button("⬅️ Previous", key="archived_prev"):
+            cursors.pop()
+            st.rerun()
+    col_page.write(f"Page {len(cursors)}")
+    with col_next:
+        if next_cursor is not None and st.button("Next ➡️", key="archived_next"):
+            cursors.append(next_cursor)
+            st.rerun()
@@ -1,16 +1,97 @@
+import importlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
 import streamlit as st
-from purchase_order.track_po import show_purchase_orders_page
-from purchase_order.archived_po import show_archived_po_page
+from purchase_order.po_feed import po_feed_listening
+from purchase_order.po_handler import (
+    ARCHIVED_PAGE_SIZE,
+    ARCHIVED_PO_STATUSES,
+    get_archived_purchase_orders_page,
+    get_items_for_purchase_orders,
+    get_purchase_orders_for_supplier
+)
+
+logger = logging.getLogger(__name__)
+
+TRACK_VIEW = "📦 Track PO"
+ARCHIVED_VIEW = "📂 Archived PO"
+
+# View -> (module, page function); a view's module is imported the first time it is shown
+PO_VIEWS = {
+    TRACK_VIEW: ("purchase_order.track_po", "show_purchase_orders_page"),       # 🔥 Active orders
+    ARCHIVED_VIEW: ("purchase_order.archived_po", "show_archived_po_page"),     # 🔥 Archived orders
+}
+
+# Warm the query cache with the hidden view's first screen, on a background thread
+# the rerun doesn't wait for, so switching views is served from memory. Off by
+# default: it costs the hidden view's queries whenever their cache entries expire.
+PREFETCH_OTHER_VIEW = False
+
+_prefetcher = ThreadPoolExecutor(max_workers=2, thread_name_prefix="po-prefetch")
+_prefetch_lock = threading.Lock()
+_prefetching = set()  # (view, supplier_id) pairs queued or running
+
+def _prefetch_track(supplier_id):
+    """Same calls as Track PO without the change feed: active orders, then their items."""
+    purchase_orders = get_purchase_orders_for_supplier(supplier_id)
+    get_items_for_purchase_orders([po.poid for po in purchase_orders or []])
+
+def _prefetch_archived(supplier_id):
+    """Same call as Archived PO's unfiltered first page."""
+    get_archived_purchase_orders_page(supplier_id, page_size=ARCHIVED_PAGE_SIZE)
+
+def _run_prefetch(view, supplier_id):
+    try:
+        if view == TRACK_VIEW:
+            _prefetch_track(supplier_id)
+        else:
+            _prefetch_archived(supplier_id)
+    except Exception as e:
+        logger.warning("Prefetching %s for supplier %s failed: %s", view, supplier_id, e)
+    finally:
+        with _prefetch_lock:
+            _prefetching.discard((view, supplier_id))
+
+def _archived_filters_set():
+    """True if Archived PO shows something other than its unfiltered first page."""
+    statuses = st.session_state.get("archived_status_filter")
+    return (
+        (statuses is not None and set(statuses) != set(ARCHIVED_PO_STATUSES))
+        or bool(st.session_state.get("archived_date_filter"))
+        or st.session_state.get("archived_po_cursors", [None]) != [None]
+    )
+
+def prefetch_view(view, supplier_id):
+    """
+    Loads `view`'s first screen into the query cache in the background, unless its
+    data would not be used: Track PO reading the change feed's snapshot, or Archived
+    PO showing filtered results. Returns the Future, or None if nothing was queued.
+    """
+    if view == TRACK_VIEW and po_feed_listening():
+        return None
+    if view == ARCHIVED_VIEW and _archived_filters_set():
+        return None
+    with _prefetch_lock:
+        if (view, supplier_id) in _prefetching:
+            return None
+        _prefetching.add((view, supplier_id))
+    return _prefetcher.submit(_run_prefetch, view, supplier_id)
 
 def show_main_po_page(supplier):
-    """Main page to switch between Track PO and Archived PO."""
+    """Main page to switch between Track PO and Archived PO.
+       Only the selected view is rendered (and queries the DB) on each rerun."""
     st.title("Purchase Orders Management")
 
-    # Create tabs
-    tab1, tab2 = st.tabs(["📦 Track PO", "📂 Archived PO"])
+    # Selected view lives in st.session_state["po_view"]
+    view = st.radio(
+        "View", list(PO_VIEWS), key="po_view", horizontal=True, label_visibility="collapsed"
+    )
 
-    with tab1:
-        show_purchase_orders_page(supplier)  # 🔥 Active orders
+    module_name, page_name = PO_VIEWS[view]
+    show_view = getattr(importlib.import_module(module_name), page_name)
+    show_view(supplier)
 
-    with tab2:
-        show_archived_po_page(supplier)  # 🔥 Archived orders
+    if PREFETCH_OTHER_VIEW:
+        prefetch_view(next(other for other in PO_VIEWS if other != view), supplier.supplierid)
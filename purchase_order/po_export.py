@@ -0,0 +1,337 @@
+"""
+Exports a supplier's purchase orders with their line items as CSV, XLSX or Parquet.
+
+Rows come from one joined, server-side-cursor query (iter_purchase_order_lines) and
+are written in chunks, so memory stays bounded however long the history is.
+Pictures are not exported.
+
+    python -m purchase_order.po_export --supplier-id 7 --format xlsx --output orders.xlsx \\
+        [--status Delivered --status Completed] [--from 2024-01-01] [--to 2024-12-31]
+
+The CLI reads the DSN from .streamlit/secrets.toml like the app: run it from the app directory.
+"""
+import argparse
+import csv
+import io
+import itertools
+import os
+import secrets
+import tempfile
+import time
+from datetime import date
+
+import streamlit as st
+from db_handler import run_query
+from purchase_order.po_handler import (
+    ACTIVE_PO_STATUSES,
+    ARCHIVED_PO_STATUSES,
+    PO_LINE_COLUMNS,
+    iter_purchase_order_lines
+)
+
+# Rows written per chunk (and per Parquet row group)
+EXPORT_CHUNK_SIZE = 10_000
+
+# Excel's row limit per sheet (including the header row)
+XLSX_MAX_ROWS = 1_048_576
+
+# Where the app writes exports for download; export_server.py serves them from here
+# with --export-dir (default: this directory)
+DEFAULT_EXPORT_DIR = os.path.join(tempfile.gettempdir(), "amas_exports")
+
+# Exports downloaded through Streamlit (no [exports] base_url) are held in the
+# server's memory while offered, so only small ones are; larger ones need
+# export_server.py, which streams them from disk
+MAX_INLINE_EXPORT_BYTES = 5 * 1024 * 1024
+
+# Precision and scale of the numeric columns of the export, for Parquet's decimal type
+NUMERIC_COLUMNS_QUERY = """
+SELECT lower(column_name), numeric_precision, numeric_scale
+FROM information_schema.columns
+WHERE table_schema = ANY(current_schemas(false))
+  AND lower(table_name) = 'purchaseorderitems'
+  AND lower(column_name) IN ('estimatedprice', 'supproposedprice')
+  AND data_type = 'numeric';
+"""
+
+# Widest decimal pyarrow's decimal128 holds
+PARQUET_MAX_DECIMAL_PRECISION = 38
+
+# Column headers of the exported file, in PO_LINE_COLUMNS order
+EXPORT_HEADERS = (
+    "POID", "Order Date", "Expected Delivery", "Status", "Proposed Delivery",
+    "Proposed Status", "Supplier Note", "ItemID", "Item Name", "Ordered Qty",
+    "Est. Price", "Proposed Qty", "Proposed Price",
+)
+
+
+def _chunks(rows, size):
+    rows = iter(rows)
+    while True:
+        chunk = list(itertools.islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def write_csv(rows, out, chunk_size=EXPORT_CHUNK_SIZE):
+    """Writes rows (tuples in PO_LINE_COLUMNS order) as UTF-8 CSV to the binary file `out`."""
+    text = io.TextIOWrapper(out, encoding="utf-8", newline="")
+    try:
+        writer = csv.writer(text)
+        writer.writerow(EXPORT_HEADERS)
+        count = 0
+        for chunk in _chunks(rows, chunk_size):
+            writer.writerows(chunk)
+            count += len(chunk)
+        text.flush()
+        return count
+    finally:
+        # Leave `out` open for the caller
+        text.detach()
+
+
+def write_xlsx(rows, out, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Writes rows as an Excel workbook (openpyxl write-only mode, which streams to a
+    temporary file). Continues on a new sheet when one reaches Excel's row limit.
+    """
+    try:
+        from openpyxl import Workbook
+    except ImportError:
+        raise RuntimeError("XLSX export needs openpyxl: pip install openpyxl")
+
+    workbook = Workbook(write_only=True)
+    sheet, sheet_rows, count = None, XLSX_MAX_ROWS, 0
+    for chunk in _chunks(rows, chunk_size):
+        for row in chunk:
+            if sheet_rows >= XLSX_MAX_ROWS:
+                sheet = workbook.create_sheet(f"Orders {len(workbook.worksheets) + 1}")
+                sheet.append(EXPORT_HEADERS)
+                sheet_rows = 1
+            sheet.append(row)
+            sheet_rows += 1
+        count += len(chunk)
+    if sheet is None:
+        workbook.create_sheet("Orders 1").append(EXPORT_HEADERS)
+    workbook.save(out)
+    return count
+
+
+def _price_type(numeric):
+    """
+    Arrow type of a price column: the column's own numeric(precision, scale), so every
+    stored value fits exactly; float64 for an unconstrained numeric (any scale) or one
+    wider than decimal128, and for a column that isn't numeric at all.
+    """
+    import pyarrow as pa
+    precision, scale = numeric if numeric else (None, None)
+    if precision is None or scale is None or precision > PARQUET_MAX_DECIMAL_PRECISION:
+        return pa.float64()
+    return pa.decimal128(precision, scale)
+
+
+def _parquet_schema(numeric_columns=None):
+    """`numeric_columns` maps price columns to their (precision, scale), see get_numeric_columns."""
+    import pyarrow as pa
+    numeric_columns = numeric_columns or {}
+    types = {
+        "poid": pa.int64(),
+        "orderdate": pa.date32(),
+        "expecteddelivery": pa.date32(),
+        "status": pa.string(),
+        "supproposeddeliver": pa.date32(),
+        "proposedstatus": pa.string(),
+        "suppliernote": pa.string(),
+        "itemid": pa.int64(),
+        "itemnameenglish": pa.string(),
+        "orderedquantity": pa.int64(),
+        "estimatedprice": _price_type(numeric_columns.get("estimatedprice")),
+        "supproposedquantity": pa.int64(),
+        "supproposedprice": _price_type(numeric_columns.get("supproposedprice")),
+    }
+    return pa.schema([(column, types[column]) for column in PO_LINE_COLUMNS])
+
+
+def _arrow_array(values, arrow_type):
+    import pyarrow as pa
+    if pa.types.is_floating(arrow_type):
+        # Decimal prices of an unconstrained numeric column
+        values = [None if value is None else float(value) for value in values]
+    return pa.array(values, type=arrow_type)
+
+
+def get_numeric_columns():
+    """{column: (precision, scale)} of the export's numeric price columns in the database."""
+    return {column: (precision, scale) for column, precision, scale in
+            run_query(NUMERIC_COLUMNS_QUERY, row_factory=tuple) or []}
+
+
+def write_parquet(rows, out, chunk_size=EXPORT_CHUNK_SIZE, numeric_columns=None):
+    """
+    Writes rows as Parquet (pyarrow), one row group per chunk. Prices are decimals of
+    their columns' precision and scale (`numeric_columns`, default: read from the
+    database), so no value is rounded or rejected.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet export needs pyarrow: pip install pyarrow")
+
+    schema = _parquet_schema(get_numeric_columns() if numeric_columns is None else numeric_columns)
+    count = 0
+    with pq.ParquetWriter(out, schema, compression="zstd") as writer:
+        for chunk in _chunks(rows, chunk_size):
+            columns = list(zip(*chunk))
+            writer.write_table(pa.Table.from_arrays(
+                [_arrow_array(values, field.type) for values, field in zip(columns, schema)], schema=schema
+            ))
+            count += len(chunk)
+    return count
+
+
+# format -> (writer, file extension, MIME type)
+EXPORT_FORMATS = {
+    "csv": (write_csv, "csv", "text/csv"),
+    "xlsx": (write_xlsx, "xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "parquet": (write_parquet, "parquet", "application/vnd.apache.parquet"),
+}
+
+
+def export_purchase_orders(supplier_id, fmt, out, statuses=None, date_from=None, date_to=None,
+                           chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Streams a supplier's order lines into `out` in the given format.
+
+    Args:
+        supplier_id (int): Supplier whose orders to export.
+        fmt (str): "csv", "xlsx" or "parquet".
+        out: Binary file object to write to.
+        statuses (list[str], optional): Statuses to include (default: all).
+        date_from (date, optional): Only orders placed on or after this date.
+        date_to (date, optional): Only orders placed on or before this date.
+
+    Returns:
+        int: Number of lines written.
+    """
+    writer = EXPORT_FORMATS[fmt][0]
+    rows = iter_purchase_order_lines(supplier_id, statuses=statuses, date_from=date_from,
+                                     date_to=date_to, row_type="tuple", itersize=chunk_size)
+    return writer(rows, out, chunk_size)
+
+
+def get_export_settings():
+    """
+    Settings under [exports] in secrets: dir (where export files are written),
+    base_url (public URL of export_server.py, which then streams them from disk),
+    max_inline_bytes (largest export offered through Streamlit without base_url)
+    and ttl (seconds before an export file is deleted).
+    """
+    config = st.secrets.get("exports", {})
+    return {
+        "dir": config.get("dir", DEFAULT_EXPORT_DIR),
+        "base_url": config.get("base_url") or None,
+        "max_inline_bytes": int(config.get("max_inline_bytes", MAX_INLINE_EXPORT_BYTES)),
+        "ttl": float(config.get("ttl", 3600)),
+    }
+
+
+def export_file_name(fmt):
+    """Unguessable name of a new export file: it doubles as the download URL's access token."""
+    return f"{secrets.token_urlsafe(24)}.{EXPORT_FORMATS[fmt][1]}"
+
+
+def export_url(base_url, path):
+    return f"{base_url.rstrip('/')}/exports/{os.path.basename(path)}"
+
+
+def remove_old_exports(export_dir, ttl):
+    """Deletes export files older than `ttl` seconds."""
+    cutoff = time.time() - ttl
+    for entry in os.scandir(export_dir):
+        try:
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+        except OSError:
+            pass
+
+
+def _drop_export(key):
+    export = st.session_state.pop(f"{key}_file", None)
+    if export:
+        try:
+            os.remove(export[1])
+        except OSError:
+            pass
+
+
+def show_export_controls(supplier_id, key, statuses=None, date_from=None, date_to=None):
+    """
+    Format picker + export button for a PO page. The file is generated only when
+    asked, written to disk, and only its path is kept (until the filters change).
+    With [exports] base_url it is downloaded from export_server.py, which streams it;
+    otherwise Streamlit offers it (up to max_inline_bytes) and it is deleted once
+    downloaded.
+    """
+    settings = get_export_settings()
+    col_format, col_button, col_download = st.columns([1, 1, 1])
+    fmt = col_format.selectbox("Export format", list(EXPORT_FORMATS), key=f"{key}_format",
+                               label_visibility="collapsed")
+    request = (supplier_id, fmt, None if statuses is None else tuple(statuses), date_from, date_to)
+
+    if col_button.button("⬇️ Export orders", key=f"{key}_prepare"):
+        _drop_export(key)
+        os.makedirs(settings["dir"], exist_ok=True)
+        remove_old_exports(settings["dir"], settings["ttl"])
+        path = os.path.join(settings["dir"], export_file_name(fmt))
+        completed = False
+        try:
+            with open(path, "wb") as out:
+                export_purchase_orders(supplier_id, fmt, out, statuses, date_from, date_to)
+            completed = True
+        except Exception as e:
+            st.error(f"🚨 Export failed: {e}")
+            return
+        finally:
+            if not completed:
+                os.remove(path)  # partial file
+        st.session_state[f"{key}_file"] = (request, path, os.path.getsize(path))
+
+    export = st.session_state.get(f"{key}_file")
+    if not export or export[0] != request:
+        return
+    _, path, size = export
+    if not os.path.exists(path):
+        st.session_state.pop(f"{key}_file", None)  # expired
+        return
+    _, extension, mime = EXPORT_FORMATS[fmt]
+    if settings["base_url"]:
+        col_download.link_button("Download", export_url(settings["base_url"], path))
+    elif size <= settings["max_inline_bytes"]:
+        with open(path, "rb") as f:
+            col_download.download_button("Download", f, file_name=f"purchase_orders.{extension}", mime=mime,
+                                         key=f"{key}_download", on_click=_drop_export, args=(key,))
+    else:
+        col_download.warning(f"The export is {size / 2**20:.0f} MiB, too large to download here: "
+                             "narrow the filters, or set up export_server.py ([exports] base_url).")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--supplier-id", type=int, required=True)
+    parser.add_argument("--format", choices=sorted(EXPORT_FORMATS), default="csv")
+    parser.add_argument("--output", required=True)
+    parser.add_argument("--status", action="append", choices=ACTIVE_PO_STATUSES + ARCHIVED_PO_STATUSES,
+                        help="Repeat to include several statuses (default: all)")
+    parser.add_argument("--from", dest="date_from", type=date.fromisoformat)
+    parser.add_argument("--to", dest="date_to", type=date.fromisoformat)
+    args = parser.parse_args()
+
+    with open(args.output, "wb") as out:
+        count = export_purchase_orders(args.supplier_id, args.format, out, args.status, args.date_from, args.date_to)
+    print(f"Exported {count} line(s) to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,341 @@
+import json
+import logging
+import select
+import threading
+import time
+
+import psycopg2
+import streamlit as st
+from db_handler import note_write
+from query_cache import invalidate, po_tag, supplier_tag
+from purchase_order.po_handler import (
+    ACTIVE_PO_STATUSES,
+    get_purchase_orders_by_id,
+    get_purchase_orders_with_items
+)
+
+logger = logging.getLogger(__name__)
+
+# Channel the triggers of migrations/0003_po_change_notify.sql notify on
+PO_CHANGES_CHANNEL = "po_changes"
+
+# Snapshots of suppliers nobody has looked at for this long are dropped
+SNAPSHOT_IDLE_SECONDS = 15 * 60
+
+# Snapshots are reloaded once this old even if no notification arrived, bounding
+# how stale they get should notifications be lost without the connection dropping
+SNAPSHOT_MAX_AGE_SECONDS = 5 * 60
+
+
+class POSnapshot:
+    """
+    In-memory copy of one supplier's active purchase orders (with their items),
+    kept current by the change feed instead of by reloading.
+
+    `version` increases whenever an order is added, changed or removed;
+    `changed_since(version)` tells which ones. PurchaseOrders are replaced, never
+    mutated, and are shared between sessions: callers must not mutate them.
+    """
+
+    def __init__(self, supplier_id):
+        self.supplier_id = supplier_id
+        self.version = 0
+        self.reloaded_version = 0  # version of the last full reload
+        self.reloaded_at = 0.0     # monotonic() of the last full reload
+        self.last_access = time.monotonic()
+        self.loaded = threading.Event()
+        self._orders = {}    # poid -> PurchaseOrder with its items
+        self._changed = {}   # poid -> version of its last change (or removal)
+        self._lock = threading.Lock()
+        # Serializes reloads/refreshes so a slow fetch can't overwrite a newer one
+        self._refresh_lock = threading.Lock()
+
+    def reload(self):
+        """Replaces the whole snapshot with a fresh read (initial load / after missed notifications)."""
+        with self._refresh_lock:
+            orders = get_purchase_orders_with_items.uncached(self.supplier_id, ACTIVE_PO_STATUSES)
+            with self._lock:
+                self.version += 1
+                self._orders = {po.poid: po for po in orders}
+                self._changed = dict.fromkeys(self._orders, self.version)
+                self.reloaded_version = self.version
+                self.reloaded_at = time.monotonic()
+            self.loaded.set()
+
+    def refresh(self, poids):
+        """
+        Refetches just the given orders: changed ones are replaced, and ones no longer
+        active for this supplier are removed.
+
+        Returns:
+            int: How many of `poids` were fetched, changed or removed.
+        """
+        poids = set(poids)
+        with self._refresh_lock:
+            fresh = {po.poid: po for po in get_purchase_orders_by_id(self.supplier_id, poids, ACTIVE_PO_STATUSES)}
+            with self._lock:
+                self.version += 1
+                for poid in poids:
+                    if poid in fresh:
+                        self._orders[poid] = fresh[poid]
+                    elif self._orders.pop(poid, None) is None:
+                        continue
+                    self._changed[poid] = self.version
+        return len(poids)
+
+    def orders(self):
+        """
+        Returns:
+            tuple[int, list[PurchaseOrder]]: The snapshot version and its orders, newest first
+            (same order as get_purchase_orders_for_supplier).
+        """
+        self.last_access = time.monotonic()
+        with self._lock:
+            orders = sorted(self._orders.values(), key=lambda po: (po.orderdate, po.poid), reverse=True)
+            return self.version, orders
+
+    def get(self, poid):
+        """Returns one order (with its items), or None if it isn't an active order of this supplier."""
+        with self._lock:
+            return self._orders.get(poid)
+
+    def changed_since(self, version):
+        """POIDs added or changed after `version` (removed orders are simply absent)."""
+        with self._lock:
+            return {poid for poid, changed in self._changed.items() if changed > version and poid in self._orders}
+
+    def touched_since(self, version):
+        """
+        POIDs added, changed or removed after `version`, or None if the snapshot was
+        reloaded since (any order may have changed).
+        """
+        with self._lock:
+            if self.reloaded_version > version:
+                return None
+            return {poid for poid, changed in self._changed.items() if changed > version}
+
+
+class POChangeFeed:
+    """
+    Listens on the po_changes channel on a dedicated connection and applies each
+    notification to the snapshot of the order's supplier (one small refetch per
+    changed order). Notifications also invalidate the order's cached queries, so
+    changes made by other processes (e.g. the buyer app) show up without waiting
+    for the query cache TTL.
+
+    If the listening connection drops, every snapshot is reloaded after reconnecting,
+    since notifications sent in between are lost; snapshots older than `max_age`
+    are reloaded as well.
+
+    `dsn` must reach the server directly: behind a transaction-mode pooler (e.g.
+    Neon's pooled endpoint) LISTEN succeeds but no notification is ever delivered.
+    """
+
+    def __init__(self, dsn, channel=PO_CHANGES_CHANNEL, reconnect_delay=5.0, idle_seconds=SNAPSHOT_IDLE_SECONDS,
+                 max_age=SNAPSHOT_MAX_AGE_SECONDS):
+        self.dsn = dsn
+        self.channel = channel
+        self.reconnect_delay = reconnect_delay
+        self.idle_seconds = idle_seconds
+        self.max_age = max_age
+        self._snapshots = {}
+        self._lock = threading.Lock()
+        self._listening = threading.Event()
+        self._stopping = threading.Event()
+        self._stats = {"notifications": 0, "refreshed_orders": 0, "reloads": 0, "reconnects": 0, "errors": 0}
+        self._thread = threading.Thread(target=self._run, name="po-change-feed", daemon=True)
+
+    def start(self, timeout=10.0):
+        """Starts the listener thread; returns True once it is listening."""
+        if not self._thread.is_alive():
+            self._thread.start()
+        deadline = time.monotonic() + timeout
+        # The thread exits early if the notify triggers are missing
+        while self._thread.is_alive() and time.monotonic() < deadline:
+            if self._listening.wait(0.1):
+                return True
+        return self.listening
+
+    def stop(self):
+        self._stopping.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    @property
+    def listening(self):
+        return self._listening.is_set()
+
+    def snapshot(self, supplier_id):
+        """Returns the supplier's snapshot, loading it on first use."""
+        with self._lock:
+            snapshot = self._snapshots.get(supplier_id)
+            created = snapshot is None
+            if created:
+                snapshot = self._snapshots[supplier_id] = POSnapshot(supplier_id)
+        if not snapshot.loaded.is_set():
+            # Registered before loading: notifications arriving meanwhile wait for the
+            # load (refresh lock) and are applied on top of it. A session racing the
+            # first load just loads again.
+            try:
+                snapshot.reload()
+            except Exception:
+                if created:
+                    with self._lock:
+                        self._snapshots.pop(supplier_id, None)
+                raise
+            self._count("reloads")
+        return snapshot
+
+    def _count(self, key, n=1):
+        with self._lock:
+            self._stats[key] += n
+
+    def stats(self):
+        """Returns notification / refresh / reconnect counters and the number of snapshots."""
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot["snapshots"] = len(self._snapshots)
+        snapshot["listening"] = self.listening
+        return snapshot
+
+    def _connect(self):
+        """Opens the listening connection; returns None if the notify triggers aren't installed."""
+        conn = psycopg2.connect(self.dsn)
+        conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        with conn.cursor() as cur:
+            cur.execute("SELECT to_regproc('po_notify') IS NOT NULL")
+            if not cur.fetchone()[0]:
+                conn.close()
+                return None
+            cur.execute(f"LISTEN {self.channel}")
+        return conn
+
+    def _run(self):
+        reconnecting = False
+        while not self._stopping.is_set():
+            try:
+                conn = self._connect()
+            except psycopg2.Error as e:
+                logger.warning("PO change feed: cannot connect (%s), retrying", e)
+                self._stopping.wait(self.reconnect_delay)
+                continue
+            if conn is None:
+                # Snapshots would silently go stale: leave the feed off
+                logger.error("PO change feed disabled: apply migrations/0003_po_change_notify.sql")
+                return
+            try:
+                if reconnecting:
+                    # Notifications sent while disconnected are lost; queued ones apply on top
+                    self._count("reconnects")
+                    self._reload_all()
+                self._listening.set()
+                self._listen(conn)
+            except Exception as e:
+                logger.warning("PO change feed: %s; reconnecting", e)
+            finally:
+                # Pages fall back to regular queries until the snapshots are reloaded
+                self._listening.clear()
+                conn.close()
+            reconnecting = True
+            self._stopping.wait(self.reconnect_delay)
+
+    def _listen(self, conn):
+        while not self._stopping.is_set():
+            if select.select([conn], [], [], 1.0) != ([], [], []):
+                conn.poll()
+                notifies = list(conn.notifies)
+                conn.notifies.clear()
+                if notifies:
+                    self._apply(notifies)
+            self._evict_idle()
+            self._reload_old()
+
+    def _apply(self, notifies):
+        """Groups a batch of notifications by supplier and refreshes the affected snapshots."""
+        changed = {}
+        for notify in notifies:
+            try:
+                payload = json.loads(notify.payload)
+                changed.setdefault(payload["supplierid"], set()).add(payload["poid"])
+            except (ValueError, KeyError, TypeError):
+                logger.warning("PO change feed: ignoring malformed payload %r", notify.payload)
+        self._count("notifications", len(notifies))
+        if not changed:
+            return
+
+        # Reads refilling the invalidated entries must not come from a lagging replica
+        note_write()
+        invalidate(*[supplier_tag(s) for s in changed], *[po_tag(p) for poids in changed.values() for p in poids])
+        for supplier_id, poids in changed.items():
+            with self._lock:
+                snapshot = self._snapshots.get(supplier_id)
+            if snapshot is None:
+                continue
+            try:
+                self._count("refreshed_orders", snapshot.refresh(poids))
+            except Exception as e:
+                # Keep listening; the next reload or change of these orders repairs the snapshot
+                self._count("errors")
+                logger.warning("PO change feed: refreshing supplier %s failed: %s", supplier_id, e)
+
+    def _reload_all(self):
+        with self._lock:
+            snapshots = list(self._snapshots.values())
+        for snapshot in snapshots:
+            snapshot.reload()
+            self._count("reloads")
+
+    def _reload_old(self):
+        cutoff = time.monotonic() - self.max_age
+        with self._lock:
+            snapshots = [snap for snap in self._snapshots.values()
+                         if snap.loaded.is_set() and snap.reloaded_at < cutoff]
+        for snapshot in snapshots:
+            try:
+                snapshot.reload()
+                self._count("reloads")
+            except Exception as e:
+                self._count("errors")
+                logger.warning("PO change feed: reloading supplier %s failed: %s", snapshot.supplier_id, e)
+
+    def _evict_idle(self):
+        cutoff = time.monotonic() - self.idle_seconds
+        with self._lock:
+            for supplier_id in [s for s, snap in self._snapshots.items() if snap.last_access < cutoff]:
+                del self._snapshots[supplier_id]
+
+
+@st.cache_resource
+def get_po_change_feed():
+    """
+    Process-wide change feed, or None unless [feed] dsn is set in secrets: a direct
+    (non-pooled) endpoint, since LISTEN through a transaction-mode pooler never
+    receives anything. Optional settings under [feed]: enabled, reconnect_delay,
+    idle_seconds, max_age.
+    """
+    config = st.secrets.get("feed", {})
+    if not config.get("dsn") or not config.get("enabled", True):
+        return None
+    feed = POChangeFeed(
+        config["dsn"],
+        reconnect_delay=float(config.get("reconnect_delay", 5.0)),
+        idle_seconds=float(config.get("idle_seconds", SNAPSHOT_IDLE_SECONDS)),
+        max_age=float(config.get("max_age", SNAPSHOT_MAX_AGE_SECONDS)),
+    )
+    if not feed.start():
+        logger.warning("PO change feed is not listening; pages fall back to regular queries")
+    return feed
+
+
+def po_feed_listening():
+    """Whether the change feed is running, i.e. Track PO reads active orders from snapshots."""
+    feed = get_po_change_feed()
+    return feed is not None and feed.listening
+
+
+def get_po_snapshot(supplier_id):
+    """Returns the supplier's live PO snapshot, or None when the change feed isn't listening."""
+    feed = get_po_change_feed()
+    if feed is None or not feed.listening:
+        return None
+    return feed.snapshot(supplier_id)
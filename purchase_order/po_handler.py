@@ -1,34 +1,141 @@
-import base64
-import io
-from PIL import Image
-from db_handler import run_query, run_transaction
+from datetime import timedelta
+from db_handler import run_query, run_transaction, stream_query
+from async_db_handler import fetch_many
+from query_cache import cached_per_key, cached_query, invalidate, po_tag, supplier_tag
+from models import PurchaseOrder, PurchaseOrderItem
+from purchase_order.thumbnails import (
+    UNDECODABLE,
+    get_image_base_url,
+    get_image_secret,
+    get_thumbnail_cache,
+    picture_url
+)
 
+ACTIVE_PO_STATUSES = ("Pending", "Accepted", "Shipping")
+ARCHIVED_PO_STATUSES = ("Declined", "Delivered", "Completed")
+
+# Archived POs shown per page (keyset pagination)
+ARCHIVED_PAGE_SIZE = 20
+
+# Columns of a PO header and a PO item row, in PurchaseOrder / PurchaseOrderItem field order
+PO_HEADER_FIELDS = (
+    "poid", "orderdate", "expecteddelivery", "status",
+    "supproposeddeliver", "proposedstatus", "suppliernote", "rowversion",
+)
+PO_ITEM_FIELDS = (
+    "itemid", "itemnameenglish", "picturehash", "orderedquantity",
+    "estimatedprice", "supproposedquantity", "supproposedprice",
+)
+
+ACTIVE_PO_QUERY = """
+SELECT
+    POID,
+    OrderDate,
+    ExpectedDelivery,
+    Status,
+    SupProposedDeliver,
+    ProposedStatus,
+    SupplierNote,
+    RowVersion
+FROM PurchaseOrders
+WHERE SupplierID = %s
+  AND Status IN ('Pending', 'Accepted', 'Shipping')
+ORDER BY OrderDate DESC;
+"""
+
+# Items of all of a supplier's orders in the given statuses (no POID list needed up front)
+SUPPLIER_PO_ITEMS_QUERY = """
+SELECT
+    poi.POID,
+    i.ItemID,
+    i.ItemNameEnglish,
+    md5(i.ItemPicture) AS PictureHash,
+    poi.OrderedQuantity,
+    poi.EstimatedPrice,
+    poi.SupProposedQuantity,
+    poi.SupProposedPrice
+FROM PurchaseOrders po
+JOIN PurchaseOrderItems poi ON poi.POID = po.POID
+JOIN Item i ON poi.ItemID = i.ItemID
+WHERE po.SupplierID = %s
+  AND po.Status = ANY(%s)
+ORDER BY poi.POID;
+"""
+
+def _po_list_tags(result, supplier_id, *args, **kwargs):
+    """Cache tags of a PO listing: its supplier plus every POID it contains."""
+    orders = result[0] if isinstance(result, tuple) else result
+    return [supplier_tag(supplier_id)] + [po_tag(po.poid) for po in orders or []]
+
+@cached_query(_po_list_tags)
 def get_purchase_orders_for_supplier(supplier_id):
     """
     Retrieves active purchase orders (Pending, Accepted, Shipping)
     from PurchaseOrders for this supplier.
     """
-    query = """
-    SELECT 
-        POID,
-        OrderDate,
-        ExpectedDelivery,
-        Status,
-        SupProposedDeliver,
-        ProposedStatus,
-        SupplierNote
-    FROM PurchaseOrders
-    WHERE SupplierID = %s
-      AND Status IN ('Pending', 'Accepted', 'Shipping')
-    ORDER BY OrderDate DESC;
-    """
-    return run_query(query, (supplier_id,))
+    return run_query(ACTIVE_PO_QUERY, (supplier_id,), row_factory=PurchaseOrder.from_row, use_replica=True)
 
+ARCHIVED_PO_QUERY = """
+SELECT
+    POID,
+    OrderDate,
+    ExpectedDelivery,
+    Status,
+    SupProposedDeliver,
+    ProposedStatus,
+    SupplierNote,
+    RowVersion
+FROM PurchaseOrders
+WHERE SupplierID = %s
+  AND Status IN ('Declined', 'Delivered', 'Completed')
+ORDER BY OrderDate DESC;
+"""
+
+@cached_query(_po_list_tags)
 def get_archived_purchase_orders(supplier_id):
     """
     Retrieves archived (Declined, Delivered, Completed) purchase orders for this supplier.
     """
-    query = """
+    return run_query(ARCHIVED_PO_QUERY, (supplier_id,), row_factory=PurchaseOrder.from_row, use_replica=True)
+
+@cached_query(_po_list_tags)
+def get_archived_purchase_orders_page(supplier_id, page_size=20, after=None,
+                                     statuses=None, date_from=None, date_to=None):
+    """
+    Retrieves one page of archived purchase orders using keyset pagination
+    on (OrderDate, POID), newest first.
+
+    Args:
+        supplier_id (int): Supplier whose orders to list.
+        page_size (int): Maximum number of orders per page.
+        after (tuple, optional): (OrderDate, POID) of the last order of the previous page.
+        statuses (list[str], optional): Subset of ARCHIVED_PO_STATUSES to include (default: all).
+        date_from (date, optional): Only orders placed on or after this date.
+        date_to (date, optional): Only orders placed on or before this date.
+
+    Returns:
+        tuple[list[PurchaseOrder], tuple or None]: The page's orders, and the cursor to pass as
+        `after` for the next page (None if this is the last page).
+    """
+    query, params = _archived_page_query(supplier_id, page_size, after, statuses, date_from, date_to)
+    if query is None:
+        return [], None
+    return _split_page(run_query(query, params, row_factory=PurchaseOrder.from_row, use_replica=True) or [],
+                       page_size)
+
+def _archived_page_query(supplier_id, page_size=20, after=None,
+                         statuses=None, date_from=None, date_to=None):
+    """Builds the keyset-paginated archived PO query; returns (None, None) if no status matches."""
+    filters = _po_filters(supplier_id, statuses, ARCHIVED_PO_STATUSES, date_from, date_to)
+    if filters is None:
+        return None, None
+
+    conditions, params = filters
+    if after is not None:
+        conditions.append("(OrderDate, POID) < (%s, %s)")
+        params.extend(after)
+
+    query = f"""
     SELECT
         POID,
         OrderDate,
@@ -36,110 +143,609 @@ def get_archived_purchase_orders(supplier_id):
         Status,
         SupProposedDeliver,
         ProposedStatus,
-        SupplierNote
+        SupplierNote,
+        RowVersion
     FROM PurchaseOrders
-    WHERE SupplierID = %s
-      AND Status IN ('Declined', 'Delivered', 'Completed')
-    ORDER BY OrderDate DESC;
+    WHERE {" AND ".join(conditions)}
+    ORDER BY OrderDate DESC, POID DESC
+    LIMIT %s;
+    """
+    # Fetch one extra row to know whether another page exists
+    params.append(page_size + 1)
+    return query, tuple(params)
+
+def _po_filters(supplier_id, statuses, allowed_statuses, date_from=None, date_to=None, alias=""):
+    """
+    WHERE conditions (and their params) selecting a supplier's orders by status and
+    order date; `alias` prefixes the PurchaseOrders columns (e.g. "po.").
+    `statuses` None means all of `allowed_statuses`; returns None if none of
+    `statuses` is in `allowed_statuses` (so an empty selection matches nothing).
     """
-    return run_query(query, (supplier_id,))
+    if statuses is None:
+        statuses = allowed_statuses
+    statuses = [s for s in statuses if s in allowed_statuses]
+    if not statuses:
+        return None
+
+    conditions = [f"{alias}SupplierID = %s", f"{alias}Status = ANY(%s)"]
+    params = [supplier_id, statuses]
+    if date_from is not None:
+        conditions.append(f"{alias}OrderDate >= %s")
+        params.append(date_from)
+    if date_to is not None:
+        # Exclusive upper bound so the whole last day is included for timestamps too
+        conditions.append(f"{alias}OrderDate < %s")
+        params.append(date_to + timedelta(days=1))
+    return conditions, params
+
+def _split_page(rows, page_size):
+    """Splits page_size + 1 fetched rows into (page, next_cursor)."""
+    page = rows[:page_size]
+    next_cursor = (page[-1].orderdate, page[-1].poid) if len(rows) > page_size else None
+    return page, next_cursor
 
-def update_purchase_order_status(poid, status, expected_delivery=None, supplier_note=None):
+# Legal supplier-side status transitions: target status -> statuses it may be set from
+PO_STATUS_TRANSITIONS = {
+    "Accepted": ("Pending",),
+    "Declined": ("Pending",),
+    "Shipping": ("Accepted",),
+    "Delivered": ("Shipping",),
+}
+
+# Why a version-checked write didn't apply (the "conflict" of a write result)
+CONFLICT_VERSION = "version"        # the order changed since it was read
+CONFLICT_TRANSITION = "transition"  # the order's current status doesn't allow this change
+CONFLICT_MISSING = "missing"        # the order no longer exists
+
+def _write_result(rows, allowed_from):
+    """
+    Turns the rows of a compare-and-set statement into a write result. Callers
+    drop the order's cached data with invalidate_po once the write is committed
+    (on conflicts too: what the caller saw is stale).
+
+    The statements return the updated row with updated = true, or else the order's
+    current row with updated = false, so telling a conflict apart costs no extra query.
+
+    Returns:
+        dict: updated (bool), conflict (None or a CONFLICT_* value), and the order's
+        status and rowversion after the call.
+    """
+    if not rows:
+        return {"updated": False, "conflict": CONFLICT_MISSING, "status": None, "rowversion": None}
+    row = rows[0]
+    conflict = None
+    if not row["updated"]:
+        conflict = CONFLICT_TRANSITION if row["status"] not in allowed_from else CONFLICT_VERSION
+    return {"updated": row["updated"], "conflict": conflict, "status": row["status"], "rowversion": row["rowversion"]}
+
+def update_purchase_order_status(poid, status, expected_delivery=None, supplier_note=None, expected_version=None):
     """
     Updates main PO status and (optionally) ExpectedDelivery and SupplierNote (if e.g. declining).
     Does NOT set ProposedStatus or SupProposedDeliver. Use update_po_order_proposal for that.
+
+    The change is applied in one statement only if it is a legal transition
+    (PO_STATUS_TRANSITIONS) from the order's current status and, when
+    `expected_version` is given, only if the order's RowVersion still equals it.
+
+    Returns:
+        dict: The write result (see _write_result).
     """
+    query, params, to_result = _status_write(poid, status, expected_delivery, supplier_note, expected_version)
+    rows = run_query(query, params)
+    invalidate_po(poid, rows)
+    return to_result(rows)
+
+def _status_write(poid, status, expected_delivery=None, supplier_note=None, expected_version=None):
+    """Statement of update_purchase_order_status: (query, params, to_result(rows) -> write result)."""
+    if status not in PO_STATUS_TRANSITIONS:
+        raise ValueError(f"Suppliers can't set status {status!r}")
+    allowed_from = PO_STATUS_TRANSITIONS[status]
     query = """
-    UPDATE PurchaseOrders
-    SET
-        Status = %s,
-        ExpectedDelivery = COALESCE(%s, ExpectedDelivery),
-        SupplierNote = COALESCE(%s, SupplierNote)
-    WHERE POID = %s;
+    WITH updated AS (
+        UPDATE PurchaseOrders
+        SET
+            Status = %s,
+            ExpectedDelivery = COALESCE(%s, ExpectedDelivery),
+            SupplierNote = COALESCE(%s, SupplierNote)
+        WHERE POID = %s
+          AND Status = ANY(%s)
+          AND RowVersion = COALESCE(%s, RowVersion)
+        RETURNING SupplierID, Status, RowVersion
+    )
+    SELECT true AS updated, SupplierID, Status, RowVersion FROM updated
+    UNION ALL
+    SELECT false, SupplierID, Status, RowVersion FROM PurchaseOrders
+    WHERE POID = %s AND NOT EXISTS (SELECT 1 FROM updated);
     """
-    run_transaction(query, (status, expected_delivery, supplier_note, poid))
+    params = (status, expected_delivery, supplier_note, poid, list(allowed_from), expected_version, poid)
+    return query, params, lambda rows: _write_result(rows, allowed_from)
 
-def update_po_order_proposal(poid, proposed_deliver=None, proposed_status=None, supplier_note=None):
+def update_po_order_proposal(poid, proposed_deliver=None, proposed_status=None, supplier_note=None,
+                             expected_version=None):
     """
     Lets the supplier propose an overall new Delivery Date (SupProposedDeliver)
     and set ProposedStatus to e.g. 'Proposed', plus optionally a note.
+    Only active orders accept proposals; `expected_version` works as in
+    update_purchase_order_status.
+
+    Returns:
+        dict: The write result (see _write_result).
     """
+    query, params, to_result = _order_proposal_write(poid, proposed_deliver, proposed_status, supplier_note,
+                                                        expected_version)
+    rows = run_query(query, params)
+    invalidate_po(poid, rows)
+    return to_result(rows)
+
+def _order_proposal_write(poid, proposed_deliver=None, proposed_status=None, supplier_note=None,
+                          expected_version=None):
+    """Statement of update_po_order_proposal: (query, params, to_result(rows) -> write result)."""
     query = """
-    UPDATE PurchaseOrders
-    SET
-        SupProposedDeliver = COALESCE(%s, SupProposedDeliver),
-        ProposedStatus = COALESCE(%s, ProposedStatus),
-        SupplierNote = COALESCE(%s, SupplierNote)
-    WHERE POID = %s;
+    WITH updated AS (
+        UPDATE PurchaseOrders
+        SET
+            SupProposedDeliver = COALESCE(%s, SupProposedDeliver),
+            ProposedStatus = COALESCE(%s, ProposedStatus),
+            SupplierNote = COALESCE(%s, SupplierNote)
+        WHERE POID = %s
+          AND Status = ANY(%s)
+          AND RowVersion = COALESCE(%s, RowVersion)
+        RETURNING SupplierID, Status, RowVersion
+    )
+    SELECT true AS updated, SupplierID, Status, RowVersion FROM updated
+    UNION ALL
+    SELECT false, SupplierID, Status, RowVersion FROM PurchaseOrders
+    WHERE POID = %s AND NOT EXISTS (SELECT 1 FROM updated);
     """
-    run_transaction(query, (proposed_deliver, proposed_status, supplier_note, poid))
+    params = (proposed_deliver, proposed_status, supplier_note, poid,
+              list(ACTIVE_PO_STATUSES), expected_version, poid)
+    return query, params, lambda rows: _write_result(rows, ACTIVE_PO_STATUSES)
+
+def update_po_proposals(poid, item_proposals, proposed_deliver=None, proposed_status=None, supplier_note=None,
+                        expected_version=None):
+    """
+    Saves item-level proposals for any number of lines together with the
+    order-level proposal (same fields as update_po_order_proposal), atomically
+    in a single statement. Nothing is written unless the order is active and,
+    when `expected_version` is given, still at that RowVersion.
+
+    Args:
+        poid (int): Purchase order to update.
+        item_proposals (list[tuple]): (itemid, sup_qty, sup_price) per changed line.
+        expected_version (int, optional): RowVersion the proposal was based on.
+
+    Returns:
+        dict: The write result (see _write_result) plus changed_items, the number
+        of item lines whose proposal actually changed.
+    """
+    query, params, to_result = _proposals_write(poid, item_proposals, proposed_deliver, proposed_status,
+                                                supplier_note, expected_version)
+    rows = run_query(query, params)
+    invalidate_po(poid, rows)
+    return to_result(rows)
+
+def _proposals_write(poid, item_proposals, proposed_deliver=None, proposed_status=None, supplier_note=None,
+                     expected_version=None):
+    """Statement of update_po_proposals: (query, params, to_result(rows) -> write result)."""
+    item_proposals = list(item_proposals)
+    item_ids = [p[0] for p in item_proposals]
+    quantities = [p[1] for p in item_proposals]
+    prices = [p[2] for p in item_proposals]
+
+    # `target` locks the order row and re-checks status/version against its latest
+    # committed state, so the line and order updates apply together or not at all
+    query = """
+    WITH target AS (
+        SELECT POID
+        FROM PurchaseOrders
+        WHERE POID = %s
+          AND Status = ANY(%s)
+          AND RowVersion = COALESCE(%s, RowVersion)
+        FOR UPDATE
+    ),
+    proposals (ItemID, SupProposedQuantity, SupProposedPrice) AS (
+        SELECT * FROM unnest(%s::int[], %s::int[], %s::numeric[])
+    ),
+    updated_items AS (
+        UPDATE PurchaseOrderItems poi
+        SET
+            SupProposedQuantity = p.SupProposedQuantity,
+            SupProposedPrice = p.SupProposedPrice
+        FROM proposals p, target t
+        WHERE poi.POID = t.POID
+          AND poi.ItemID = p.ItemID
+          AND (poi.SupProposedQuantity IS DISTINCT FROM p.SupProposedQuantity
+               OR poi.SupProposedPrice IS DISTINCT FROM p.SupProposedPrice)
+        RETURNING poi.ItemID
+    ),
+    updated_po AS (
+        UPDATE PurchaseOrders po
+        SET
+            SupProposedDeliver = COALESCE(%s, SupProposedDeliver),
+            ProposedStatus = COALESCE(%s, ProposedStatus),
+            SupplierNote = COALESCE(%s, SupplierNote)
+        FROM target t
+        WHERE po.POID = t.POID
+        -- Changed lines bump the order's RowVersion once more when the statement
+        -- ends (migrations/0008_po_item_row_version.sql): return the final one
+        RETURNING po.SupplierID, po.Status,
+                  po.RowVersion + (EXISTS (SELECT 1 FROM updated_items))::int AS RowVersion
+    )
+    SELECT true AS updated, (SELECT count(*) FROM updated_items) AS changed_items, SupplierID, Status, RowVersion
+    FROM updated_po
+    UNION ALL
+    SELECT false, 0, SupplierID, Status, RowVersion FROM PurchaseOrders
+    WHERE POID = %s AND NOT EXISTS (SELECT 1 FROM updated_po);
+    """
+    params = (
+        poid, list(ACTIVE_PO_STATUSES), expected_version,
+        item_ids, quantities, prices,
+        proposed_deliver, proposed_status, supplier_note,
+        poid,
+    )
+
+    def to_result(rows):
+        result = _write_result(rows, ACTIVE_PO_STATUSES)
+        result["changed_items"] = rows[0]["changed_items"] if rows else 0
+        return result
+    return query, params, to_result
 
+# Writes the write-behind queue (purchase_order/po_write_queue.py) can apply: name ->
+# statement builder taking the public function's arguments. A builder's to_result
+# doesn't touch the cache, so the queue can store results before its commit.
+PO_WRITES = {
+    "update_purchase_order_status": _status_write,
+    "update_po_order_proposal": _order_proposal_write,
+    "update_po_proposals": _proposals_write,
+}
+
+def invalidate_po(poid, returned_rows):
+    """Drops cached data of a PO and of its supplier's PO listings after a write."""
+    tags = [po_tag(poid)] + [supplier_tag(row["supplierid"]) for row in returned_rows or []]
+    invalidate(*tags)
+
+PO_ITEMS_QUERY = """
+SELECT
+    i.ItemID,
+    i.ItemNameEnglish,
+    md5(i.ItemPicture) AS PictureHash,
+    poi.OrderedQuantity,
+    poi.EstimatedPrice,
+    poi.SupProposedQuantity,
+    poi.SupProposedPrice
+FROM PurchaseOrderItems poi
+JOIN Item i ON poi.ItemID = i.ItemID
+WHERE poi.POID = %s;
+"""
+
+@cached_query(lambda result, poid: [po_tag(poid)])
 def get_purchase_order_items(poid):
     """
     Retrieves items from PurchaseOrderItems, including:
-    - ItemNameEnglish, ItemPicture (auto-detect format)
+    - ItemNameEnglish, ItemPicture (as a thumbnail URL or cached data URI)
     - OrderedQuantity, EstimatedPrice
     - SupProposedQuantity, SupProposedPrice
     """
-    query = """
+    results = run_query(PO_ITEMS_QUERY, (poid,), row_factory=PurchaseOrderItem.from_row, use_replica=True)
+    if not results:
+        return []
+
+    return _attach_thumbnails(results)
+
+ITEM_PICTURES_QUERY = """
+SELECT ItemID, md5(ItemPicture) AS PictureHash, ItemPicture
+FROM Item
+WHERE ItemID = ANY(%s)
+  AND ItemPicture IS NOT NULL;
+"""
+
+def _attach_thumbnails(items):
+    """
+    Sets item.itempicture to a thumbnail (or None) for each item.
+
+    With an image server configured it is the thumbnail's URL, built from ItemID +
+    PictureHash without touching the pictures. Otherwise it is a data URI: items are
+    matched to the thumbnail cache by ItemID + PictureHash, and only pictures
+    missing from the cache are fetched, in one query (one that can't be decoded is
+    cached as such and not fetched again).
+    """
+    base_url = get_image_base_url()
+    if base_url:
+        secret = get_image_secret()
+        for item in items:
+            item.itempicture = (picture_url(base_url, item.itemid, item.picturehash, secret)
+                                if item.picturehash else None)
+        return items
+
+    cache = get_thumbnail_cache()
+    missing = set()
+    for item in items:
+        item.itempicture = None
+        if item.picturehash:
+            thumbnail = cache.get(item.itemid, item.picturehash)
+            if thumbnail is None:
+                missing.add(item.itemid)
+            elif thumbnail != UNDECODABLE:
+                item.itempicture = thumbnail
+
+    if missing:
+        generated = {}
+        for row in run_query(ITEM_PICTURES_QUERY, (list(missing),)) or []:
+            generated[row["itemid"]] = cache.put(row["itemid"], row["picturehash"], bytes(row["itempicture"]))
+        for item in items:
+            if item.itempicture is None and item.itemid in generated:
+                item.itempicture = generated[item.itemid]
+
+    return items
+
+PO_ITEMS_BULK_QUERY = """
+SELECT
+    poi.POID,
+    i.ItemID,
+    i.ItemNameEnglish,
+    md5(i.ItemPicture) AS PictureHash,
+    poi.OrderedQuantity,
+    poi.EstimatedPrice,
+    poi.SupProposedQuantity,
+    poi.SupProposedPrice
+FROM PurchaseOrderItems poi
+JOIN Item i ON poi.ItemID = i.ItemID
+WHERE poi.POID = ANY(%s)
+ORDER BY poi.POID;
+"""
+
+@cached_per_key(lambda items, poid: [po_tag(poid)])
+def get_items_for_purchase_orders(poids):
+    """
+    Retrieves the items of several purchase orders in a single query. Cached per
+    order: only orders whose items aren't cached yet are queried.
+
+    Args:
+        poids (list[int]): POIDs to fetch items for.
+
+    Returns:
+        dict[int, list[PurchaseOrderItem]]: Items grouped by POID (every requested POID
+        is present, with an empty list if it has no items).
+    """
+    poids = list(poids)
+    items_by_po = {poid: [] for poid in poids}
+    if not poids:
+        return items_by_po
+
+    return _group_items(run_query(PO_ITEMS_BULK_QUERY, (poids,), row_factory=_po_item_row) or [], items_by_po)
+
+def _po_item_row(row):
+    """Row factory of item queries whose first column is the POID: (poid, item)."""
+    return row[0], PurchaseOrderItem.from_row(row[1:])
+
+def _group_items(rows, items_by_po=None):
+    """Groups (poid, item) rows by POID and attaches thumbnails."""
+    items_by_po = {} if items_by_po is None else items_by_po
+    for poid, item in rows:
+        items_by_po.setdefault(poid, []).append(item)
+    _attach_thumbnails([item for _, item in rows])
+    return items_by_po
+
+PO_WITH_ITEMS_QUERY = """
+SELECT
+    po.POID,
+    po.OrderDate,
+    po.ExpectedDelivery,
+    po.Status,
+    po.SupProposedDeliver,
+    po.ProposedStatus,
+    po.SupplierNote,
+    po.RowVersion,
+    i.ItemID,
+    i.ItemNameEnglish,
+    md5(i.ItemPicture) AS PictureHash,
+    poi.OrderedQuantity,
+    poi.EstimatedPrice,
+    poi.SupProposedQuantity,
+    poi.SupProposedPrice
+FROM PurchaseOrders po
+LEFT JOIN PurchaseOrderItems poi ON poi.POID = po.POID
+LEFT JOIN Item i ON poi.ItemID = i.ItemID
+WHERE po.SupplierID = %s
+  AND po.Status = ANY(%s)
+ORDER BY po.OrderDate DESC, po.POID;
+"""
+
+@cached_query(_po_list_tags)
+def get_purchase_orders_with_items(supplier_id, statuses):
+    """
+    Retrieves this supplier's purchase orders in `statuses` together with their items,
+    using one joined query.
+
+    Returns:
+        list[PurchaseOrder]: The orders (newest first), with their items.
+    """
+    rows = run_query(PO_WITH_ITEMS_QUERY, (supplier_id, list(statuses)), row_factory=tuple) or []
+    return _group_orders(rows)
+
+PO_WITH_ITEMS_BY_ID_QUERY = """
+SELECT
+    po.POID,
+    po.OrderDate,
+    po.ExpectedDelivery,
+    po.Status,
+    po.SupProposedDeliver,
+    po.ProposedStatus,
+    po.SupplierNote,
+    po.RowVersion,
+    i.ItemID,
+    i.ItemNameEnglish,
+    md5(i.ItemPicture) AS PictureHash,
+    poi.OrderedQuantity,
+    poi.EstimatedPrice,
+    poi.SupProposedQuantity,
+    poi.SupProposedPrice
+FROM PurchaseOrders po
+LEFT JOIN PurchaseOrderItems poi ON poi.POID = po.POID
+LEFT JOIN Item i ON poi.ItemID = i.ItemID
+WHERE po.POID = ANY(%s)
+  AND po.SupplierID = %s
+  AND po.Status = ANY(%s)
+ORDER BY po.OrderDate DESC, po.POID;
+"""
+
+def get_purchase_orders_by_id(supplier_id, poids, statuses):
+    """
+    Retrieves the given purchase orders with their items, like
+    get_purchase_orders_with_items. Not cached: used to refresh just the orders
+    reported by the change feed (purchase_order/po_feed.py).
+
+    Returns:
+        list[PurchaseOrder]: The orders that still belong to this supplier and are in
+        `statuses` (others are simply missing), with their items.
+    """
+    poids = list(poids)
+    if not poids:
+        return []
+    rows = run_query(PO_WITH_ITEMS_BY_ID_QUERY, (poids, supplier_id, list(statuses)), row_factory=tuple) or []
+    return _group_orders(rows)
+
+def _group_orders(rows):
+    """Folds joined PO + item row tuples into PurchaseOrders with their items; attaches thumbnails."""
+    split = len(PO_HEADER_FIELDS)
+    orders = {}    # poid -> (order, its item list)
+    items = []
+    for row in rows:
+        entry = orders.get(row[0])
+        if entry is None:
+            entry = orders[row[0]] = (PurchaseOrder.from_row(row[:split]), [])
+        if row[split] is not None:
+            item = PurchaseOrderItem.from_row(row[split:])
+            entry[1].append(item)
+            items.append(item)
+    _attach_thumbnails(items)
+    for po, po_items in orders.values():
+        po.items = tuple(po_items)
+    return [po for po, _ in orders.values()]
+
+# Columns of iter_purchase_order_lines rows, in order
+PO_LINE_COLUMNS = (
+    "poid", "orderdate", "expecteddelivery", "status", "supproposeddeliver",
+    "proposedstatus", "suppliernote", "itemid", "itemnameenglish", "orderedquantity",
+    "estimatedprice", "supproposedquantity", "supproposedprice",
+)
+
+def iter_purchase_order_lines(supplier_id, statuses=None, date_from=None, date_to=None,
+                              row_type="tuple", itersize=None):
+    """
+    Streams a supplier's order lines (PO header + item columns, one row per line,
+    newest order first) from a single joined query via a server-side cursor.
+    Pictures are left out. Orders without lines yield one row with empty item columns.
+
+    Args:
+        supplier_id (int): Supplier whose orders to read.
+        statuses (list[str], optional): Statuses to include (default: all, active and archived).
+        date_from (date, optional): Only orders placed on or after this date.
+        date_to (date, optional): Only orders placed on or before this date.
+        row_type (str): "tuple", "namedtuple" or "dict" (see db_handler.stream_query).
+        itersize (int, optional): Rows fetched per round trip.
+
+    Returns:
+        generator: Rows with the PO_LINE_COLUMNS columns.
+    """
+    filters = _po_filters(supplier_id, statuses, ACTIVE_PO_STATUSES + ARCHIVED_PO_STATUSES,
+                          date_from, date_to, alias="po.")
+    if filters is None:
+        return iter(())
+    conditions, params = filters
+    query = f"""
     SELECT
+        po.POID,
+        po.OrderDate,
+        po.ExpectedDelivery,
+        po.Status,
+        po.SupProposedDeliver,
+        po.ProposedStatus,
+        po.SupplierNote,
         i.ItemID,
         i.ItemNameEnglish,
-        encode(i.ItemPicture, 'base64') AS ItemPicture,
         poi.OrderedQuantity,
         poi.EstimatedPrice,
         poi.SupProposedQuantity,
         poi.SupProposedPrice
-    FROM PurchaseOrderItems poi
-    JOIN Item i ON poi.ItemID = i.ItemID
-    WHERE poi.POID = %s;
+    FROM PurchaseOrders po
+    LEFT JOIN PurchaseOrderItems poi ON poi.POID = po.POID
+    LEFT JOIN Item i ON poi.ItemID = i.ItemID
+    WHERE {" AND ".join(conditions)}
+    ORDER BY po.OrderDate DESC, po.POID DESC, i.ItemID;
     """
-    results = run_query(query, (poid,))
-    if not results:
-        return []
-
-    # Convert each item’s base64 → data URI for display
-    for item in results:
-        if item["itempicture"]:
-            try:
-                raw_b64 = item["itempicture"]
-                image_bytes = base64.b64decode(raw_b64)
+    return stream_query(query, tuple(params), itersize=itersize, row_type=row_type)
 
-                # Detect image format
-                img = Image.open(io.BytesIO(image_bytes))
-                image_format = img.format or "PNG"
+def _po_pages_tags(result, supplier_id, *args, **kwargs):
+    orders = result["active"] + result["archived"][0]
+    return [supplier_tag(supplier_id)] + [po_tag(po.poid) for po in orders]
 
-                buffer = io.BytesIO()
-                img.save(buffer, format=image_format)
-                reencoded_b64 = base64.b64encode(buffer.getvalue()).decode()
+@cached_query(_po_pages_tags)
+def load_purchase_order_pages(supplier_id, archived_page_size=ARCHIVED_PAGE_SIZE):
+    """
+    Loads what both PO pages show on first render — active POs, their items, and the
+    first (unfiltered) page of archived POs — issuing the three queries concurrently.
 
-                if image_format.lower() in ["jpeg", "jpg"]:
-                    mime_type = "jpeg"
-                elif image_format.lower() == "png":
-                    mime_type = "png"
-                else:
-                    mime_type = "png"
+    Returns:
+        dict: {"active": list[PurchaseOrder], "items_by_po": dict[int, list[PurchaseOrderItem]],
+               "archived": (list[PurchaseOrder], next_cursor)}
+    """
+    archived_query, archived_params = _archived_page_query(supplier_id, archived_page_size)
+    active, items, archived = fetch_many([
+        (ACTIVE_PO_QUERY, (supplier_id,), PurchaseOrder.from_row),
+        (SUPPLIER_PO_ITEMS_QUERY, (supplier_id, list(ACTIVE_PO_STATUSES)), _po_item_row),
+        (archived_query, archived_params, PurchaseOrder.from_row),
+    ])
+    items_by_po = {po.poid: [] for po in active}
+    # An order can change status between the concurrent queries: keep only listed POs' items
+    _group_items([(poid, item) for poid, item in items if poid in items_by_po], items_by_po)
+    return {
+        "active": active,
+        "items_by_po": items_by_po,
+        "archived": _split_page(archived, archived_page_size),
+    }
 
-                item["itempicture"] = f"data:image/{mime_type};base64,{reencoded_b64}"
-            except Exception:
-                item["itempicture"] = None
-        else:
-            item["itempicture"] = None
+# Trigger-maintained summary row (migrations/0001_supplier_po_stats.sql, made exact by 0007)
+SUPPLIER_PO_STATS_QUERY = "SELECT * FROM SupplierPOStats WHERE SupplierID = %s;"
 
-    return results
+def _ratio(numerator, denominator):
+    return float(numerator) / float(denominator) if denominator else None
 
-def update_po_item_proposal(poid, itemid, sup_qty, sup_price):
+@cached_query(lambda result, supplier_id: [supplier_tag(supplier_id)])
+def get_supplier_po_kpis(supplier_id):
     """
-    Saves proposed changes for this item:
-      - SupProposedQuantity
-      - SupProposedPrice
+    Returns dashboard KPIs for a supplier, read from its SupplierPOStats row
+    (constant time), which triggers keep up to date. Like the rest of the app it
+    needs every migration applied (python migrate.py); a row can be rebuilt from
+    the supplier's orders with SELECT refresh_supplier_po_stats(<SupplierID>).
+
+    DeliveredAt is only stamped from migration 0001 on, so on-time rate and lead
+    time cover the delivered orders with a delivery time: `measured_deliveries`
+    of `delivered_orders`.
+
+    Returns:
+        dict: open_by_status, on_time_rate, acceptance_rate, decline_rate,
+        avg_lead_time_days, measured_deliveries, delivered_orders, estimated_value,
+        proposed_value (rates are None when there is nothing to measure yet).
     """
-    query = """
-    UPDATE PurchaseOrderItems
-    SET
-      SupProposedQuantity = %s,
-      SupProposedPrice = %s
-    WHERE POID = %s
-      AND ItemID = %s;
-    """
-    run_transaction(query, (sup_qty, sup_price, poid, itemid))
+    rows = run_query(SUPPLIER_PO_STATS_QUERY, (supplier_id,))
+    stats = rows[0] if rows else {}
+    count = lambda key: stats.get(key) or 0
+
+    accepted = sum(count(k) for k in ("acceptedcount", "shippingcount", "deliveredcount", "completedcount"))
+    responded = accepted + count("declinedcount")
+    return {
+        "open_by_status": {
+            "Pending": count("pendingcount"),
+            "Accepted": count("acceptedcount"),
+            "Shipping": count("shippingcount"),
+        },
+        "on_time_rate": _ratio(count("ontimecount"), count("duedeliveredcount")),
+        "acceptance_rate": _ratio(accepted, responded),
+        "decline_rate": _ratio(count("declinedcount"), responded),
+        "avg_lead_time_days": _ratio(count("leadtimedaystotal"), count("leadtimecount")),
+        "measured_deliveries": count("leadtimecount"),
+        "delivered_orders": count("deliveredcount") + count("completedcount"),
+        "estimated_value": count("estimatedvalue"),
+        "proposed_value": count("proposedvalue"),
+    }
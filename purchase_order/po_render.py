@@ -0,0 +1,56 @@
+import functools
+from html import escape
+
+# Column headers of the PO items table, in display order
+ITEM_TABLE_COLUMNS = ("ItemID", "Picture", "Item Name", "Ordered Qty", "Est. Price", "SupQty", "SupPrice")
+
+
+def _item_row_key(item):
+    """The values an items-table row is rendered from (hashable)."""
+    return (
+        item.itemid,
+        item.itempicture,
+        item.itemnameenglish,
+        item.orderedquantity,
+        item.estimatedprice,
+        item.supproposedquantity,
+        item.supproposedprice,
+    )
+
+
+def render_items_table(items):
+    """
+    Renders a PO's items as an HTML table (same layout as DataFrame.to_html).
+    Text cells are HTML-escaped; the picture column holds an <img> tag.
+    Output is cached, so unchanged POs are not re-rendered on every rerun.
+    """
+    return _render_rows(tuple(_item_row_key(item) for item in items))
+
+
+@functools.lru_cache(maxsize=256)
+def _render_rows(rows):
+    if not rows:
+        return ""
+    item_ids, pictures, names, qtys, prices, sup_qtys, sup_prices = zip(*rows)
+
+    # Build each column's cells in one pass
+    columns = (
+        [escape(str(v)) for v in item_ids],
+        [f'<img src="{escape(p)}" width="50" />' if p else "No Image" for p in pictures],
+        [escape(str(v)) for v in names],
+        [escape(str(v)) for v in qtys],
+        [escape(str(v)) if v else "N/A" for v in prices],
+        [escape(str(v)) if v else "" for v in sup_qtys],
+        [escape(str(v)) if v else "" for v in sup_prices],
+    )
+
+    header = "".join(f"<th>{name}</th>" for name in ITEM_TABLE_COLUMNS)
+    body = "".join(
+        "<tr><td>" + "</td><td>".join(cells) + "</td></tr>"
+        for cells in zip(*columns)
+    )
+    return (
+        '<table border="1" class="dataframe">'
+        f'<thead><tr style="text-align: right;">{header}</tr></thead>'
+        f"<tbody>{body}</tbody></table>"
+    )
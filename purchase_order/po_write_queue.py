@@ -0,0 +1,326 @@
+import json
+import logging
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import date, datetime
+from decimal import Decimal
+
+import streamlit as st
+from db_handler import CONNECTION_ERRORS, transaction
+from purchase_order.po_handler import PO_WRITES, invalidate_po
+
+logger = logging.getLogger(__name__)
+
+# States of a journaled write
+QUEUED = "queued"    # waiting to be applied (or retried)
+APPLIED = "applied"  # committed; its result may still be a conflict
+FAILED = "failed"    # rejected by the database, or given up on after max_attempts
+
+DEFAULT_JOURNAL_PATH = "po_write_queue.sqlite3"
+
+JOURNAL_SCHEMA = """
+CREATE TABLE IF NOT EXISTS writes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    key TEXT NOT NULL UNIQUE,
+    operation TEXT NOT NULL,
+    args TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    result TEXT,
+    queued_at REAL NOT NULL,
+    done_at REAL
+);
+CREATE INDEX IF NOT EXISTS writes_state_idx ON writes (state, id);
+"""
+
+# Claims a write's idempotency key (migrations/0006_applied_writes.sql) in the
+# write's own transaction: no row back means an earlier attempt already committed it
+CLAIM_KEY_QUERY = """
+INSERT INTO AppliedWrites (IdempotencyKey, Operation)
+VALUES (%s, %s)
+ON CONFLICT (IdempotencyKey) DO NOTHING
+RETURNING 1;
+"""
+STORE_ROWS_QUERY = "UPDATE AppliedWrites SET Result = %s::jsonb WHERE IdempotencyKey = %s;"
+STORED_ROWS_QUERY = "SELECT Result FROM AppliedWrites WHERE IdempotencyKey = %s;"
+PRUNE_KEYS_QUERY = "DELETE FROM AppliedWrites WHERE AppliedAt < now() - %s * interval '1 day';"
+
+# How often (seconds) an idle worker prunes finished writes
+PRUNE_EVERY = 3600
+
+
+def _encode_arg(value):
+    """JSON default for write arguments: dates and decimals survive the journal as such."""
+    if isinstance(value, datetime):
+        return {"__datetime__": value.isoformat()}
+    if isinstance(value, date):
+        return {"__date__": value.isoformat()}
+    if isinstance(value, Decimal):
+        return {"__decimal__": str(value)}
+    raise TypeError(f"Can't journal a {type(value).__name__} argument")
+
+def _decode_arg(obj):
+    if "__datetime__" in obj:
+        return datetime.fromisoformat(obj["__datetime__"])
+    if "__date__" in obj:
+        return date.fromisoformat(obj["__date__"])
+    if "__decimal__" in obj:
+        return Decimal(obj["__decimal__"])
+    return obj
+
+
+class POWriteQueue:
+    """
+    Write-behind queue for the po_handler writes in PO_WRITES.
+
+    enqueue() appends a write to a SQLite journal (durable across restarts) and
+    returns at once; a worker thread applies queued writes in order, up to
+    `batch_size` per transaction, and records each one's outcome for status().
+
+    - Idempotency: each write carries a key that is claimed in AppliedWrites in the
+      same transaction as the write, so a batch replayed after a crash or a lost
+      commit acknowledgement reuses the stored rows instead of writing twice. Keys
+      (and finished journal rows) are pruned after `retention_days`, which must
+      outlast the longest outage a queued write may wait through.
+    - Retries: connection errors leave the batch queued and back off exponentially
+      (base_delay doubling up to max_delay, with jitter); a write still failing after
+      `max_attempts` tries is marked failed. Any other error fails just that write
+      (its savepoint is rolled back) and the rest of the batch goes on.
+
+    Writes keep their expected_version checks, so one applied late against a changed
+    order comes back as a conflict rather than overwriting it. Several processes may
+    share a journal: the keys keep them from applying a write twice.
+    """
+
+    def __init__(self, path=DEFAULT_JOURNAL_PATH, batch_size=20, max_attempts=20, base_delay=0.5,
+                 max_delay=60.0, poll_interval=1.0, retention_days=7):
+        self.path = path
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.poll_interval = poll_interval
+        self.retention_days = retention_days
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=FULL")  # an acknowledged enqueue survives a crash
+        self._db.executescript(JOURNAL_SCHEMA)
+        self._db_lock = threading.Lock()
+        self._failures = 0      # consecutive failed batches, drives the backoff
+        self._next_prune = 0.0
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._stats = {"applied": 0, "replayed": 0, "conflicts": 0, "failed": 0, "batches": 0, "retries": 0}
+        self._stats_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="po-write-queue", daemon=True)
+
+    def start(self):
+        if not self._thread.is_alive():
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    def enqueue(self, operation, kwargs, key=None):
+        """
+        Journals a write for the worker.
+
+        Args:
+            operation (str): A PO_WRITES name, e.g. "update_purchase_order_status".
+            kwargs (dict): The arguments of that po_handler function.
+            key (str, optional): Idempotency key; a write whose key is already
+                journaled isn't queued again. A new one is generated by default.
+
+        Returns:
+            str: The write's key, for status().
+        """
+        if operation not in PO_WRITES:
+            raise ValueError(f"Unknown PO write {operation!r}")
+        key = key or uuid.uuid4().hex
+        args = json.dumps(kwargs, default=_encode_arg)
+        with self._db_lock:
+            self._db.execute(
+                "INSERT OR IGNORE INTO writes (key, operation, args, queued_at) VALUES (?, ?, ?, ?)",
+                (key, operation, args, time.time()),
+            )
+        self._wakeup.set()
+        return key
+
+    def status(self, key):
+        """
+        Returns:
+            dict or None: state (QUEUED / APPLIED / FAILED), attempts, last_error and,
+            once applied, the write result the po_handler function would have
+            returned; None for an unknown (or pruned) key.
+        """
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT state, attempts, last_error, result FROM writes WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        state, attempts, last_error, result = row
+        return {"state": state, "attempts": attempts, "last_error": last_error,
+                "result": json.loads(result) if result else None}
+
+    def pending(self):
+        """Number of writes still queued."""
+        with self._db_lock:
+            return self._db.execute("SELECT count(*) FROM writes WHERE state = ?", (QUEUED,)).fetchone()[0]
+
+    def drain(self, timeout=None):
+        """Waits until nothing is queued; returns False if `timeout` (seconds) passed first."""
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        while self.pending():
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+    def _count(self, key, n=1):
+        with self._stats_lock:
+            self._stats[key] += n
+
+    def stats(self):
+        """Returns applied / replayed / conflict / failure / retry counters and the queue length."""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["pending"] = self.pending()
+        return stats
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wakeup.clear()
+            batch = self._next_batch()
+            if not batch:
+                self._prune_if_due()
+                self._wakeup.wait(self.poll_interval)
+                continue
+            try:
+                outcomes = self._apply(batch)
+            except Exception as e:
+                # Nothing of the batch was committed (or its keys say so on replay)
+                self._retry_later(batch, e)
+                continue
+            self._failures = 0
+            self._count("batches")
+            self._finish(outcomes)
+
+    def _next_batch(self):
+        with self._db_lock:
+            rows = self._db.execute(
+                "SELECT id, key, operation, args FROM writes WHERE state = ? ORDER BY id LIMIT ?",
+                (QUEUED, self.batch_size),
+            ).fetchall()
+        return [(id_, key, operation, json.loads(args, object_hook=_decode_arg))
+                for id_, key, operation, args in rows]
+
+    def _apply(self, batch):
+        """
+        Applies a batch in one transaction, each write under its own savepoint.
+
+        Returns:
+            list[tuple]: (journal id, poid, state, rows, write result or error) per write.
+        """
+        outcomes = []
+        with transaction() as execute:
+            for id_, key, operation, kwargs in batch:
+                execute("SAVEPOINT queued_write")
+                try:
+                    query, params, to_result = PO_WRITES[operation](**kwargs)
+                    if execute(CLAIM_KEY_QUERY, (key, operation)):
+                        rows = execute(query, params)
+                        execute(STORE_ROWS_QUERY, (json.dumps(rows), key))
+                    else:
+                        rows = execute(STORED_ROWS_QUERY, (key,))[0]["result"]
+                        self._count("replayed")
+                    execute("RELEASE SAVEPOINT queued_write")
+                    outcomes.append((id_, kwargs["poid"], APPLIED, rows, to_result(rows)))
+                except CONNECTION_ERRORS:
+                    raise
+                except Exception as e:
+                    execute("ROLLBACK TO SAVEPOINT queued_write")
+                    logger.warning("PO write queue: %s %s failed: %s", operation, key, e)
+                    outcomes.append((id_, kwargs.get("poid"), FAILED, None, str(e)))
+        return outcomes
+
+    def _finish(self, outcomes):
+        """Records a committed batch in the journal and drops the written orders' cached data."""
+        now = time.time()
+        with self._db_lock:
+            for id_, poid, state, rows, outcome in outcomes:
+                if state == APPLIED:
+                    self._db.execute("UPDATE writes SET state = ?, result = ?, done_at = ? WHERE id = ?",
+                                     (APPLIED, json.dumps(outcome), now, id_))
+                else:
+                    self._db.execute("UPDATE writes SET state = ?, last_error = ?, done_at = ? WHERE id = ?",
+                                     (FAILED, outcome, now, id_))
+        for _, poid, state, rows, outcome in outcomes:
+            if state == APPLIED:
+                invalidate_po(poid, rows)
+                self._count("conflicts" if outcome["conflict"] else "applied")
+            else:
+                self._count("failed")
+
+    def _retry_later(self, batch, error):
+        """Counts a failed attempt for the batch, fails writes out of attempts, then backs off."""
+        self._failures += 1
+        self._count("retries")
+        ids = [id_ for id_, *_ in batch]
+        marks = ",".join("?" * len(ids))
+        with self._db_lock:
+            self._db.execute(f"UPDATE writes SET attempts = attempts + 1, last_error = ? WHERE id IN ({marks})",
+                             (str(error), *ids))
+            gave_up = self._db.execute(
+                f"UPDATE writes SET state = ?, done_at = ? WHERE id IN ({marks}) AND attempts >= ?",
+                (FAILED, time.time(), *ids, self.max_attempts),
+            ).rowcount
+        self._count("failed", gave_up)
+        # Jitter keeps processes that lost the same database from retrying in lockstep
+        delay = min(self.max_delay, self.base_delay * 2 ** min(self._failures - 1, 30))
+        delay *= random.uniform(0.5, 1.0)
+        logger.warning("PO write queue: batch of %d failed (%s); retrying in %.1fs", len(batch), error, delay)
+        self._stopping.wait(delay)
+
+    def _prune_if_due(self):
+        if time.monotonic() < self._next_prune:
+            return
+        self._next_prune = time.monotonic() + PRUNE_EVERY
+        with self._db_lock:
+            self._db.execute("DELETE FROM writes WHERE state != ? AND done_at < ?",
+                             (QUEUED, time.time() - self.retention_days * 86400))
+        try:
+            with transaction() as execute:
+                execute(PRUNE_KEYS_QUERY, (self.retention_days,))
+        except Exception as e:
+            logger.warning("PO write queue: pruning AppliedWrites failed: %s", e)
+
+
+@st.cache_resource
+def get_po_write_queue():
+    """
+    Process-wide write-behind queue, or None unless enabled ([write_queue] enabled =
+    true in secrets). Optional settings under [write_queue]: path (the SQLite
+    journal), batch_size, max_attempts, base_delay, max_delay, poll_interval,
+    retention_days.
+    """
+    config = st.secrets.get("write_queue", {})
+    if not config.get("enabled", False):
+        return None
+    return POWriteQueue(
+        config.get("path", DEFAULT_JOURNAL_PATH),
+        batch_size=int(config.get("batch_size", 20)),
+        max_attempts=int(config.get("max_attempts", 20)),
+        base_delay=float(config.get("base_delay", 0.5)),
+        max_delay=float(config.get("max_delay", 60.0)),
+        poll_interval=float(config.get("poll_interval", 1.0)),
+        retention_days=float(config.get("retention_days", 7)),
+    ).start()
@@ -0,0 +1,256 @@
+import base64
+import hashlib
+import hmac
+import io
+import os
+import threading
+from collections import OrderedDict
+
+import streamlit as st
+from query_cache import get_query_cache
+
+# Largest size an item picture is displayed at (track page uses 50px, archived 100px)
+THUMBNAIL_SIZE = (100, 100)
+THUMBNAIL_FORMAT = "JPEG"  # or "WEBP"
+THUMBNAIL_QUALITY = 80
+
+MIME_TYPES = {"JPEG": "jpeg", "WEBP": "webp", "PNG": "png"}
+FILE_EXTENSIONS = {"JPEG": "jpg", "WEBP": "webp", "PNG": "png"}
+
+# Cached in place of a thumbnail for a picture that can't be decoded, so it isn't
+# fetched and decoded again on every render (a new picture gets a new hash)
+UNDECODABLE = ""
+
+# Pre-rendered variants stored in ItemPictureVariant and served by image_server.py
+IMAGE_VARIANTS = {
+    "thumb": {"size": THUMBNAIL_SIZE, "format": THUMBNAIL_FORMAT},
+}
+
+
+def make_thumbnail(image_bytes, size=THUMBNAIL_SIZE, image_format=THUMBNAIL_FORMAT, quality=THUMBNAIL_QUALITY):
+    """
+    Shrinks an image (any format PIL can read) to fit within `size`.
+
+    Returns:
+        bytes: The encoded thumbnail in `image_format`.
+    """
+    from PIL import Image  # only needed when a thumbnail is actually rendered
+
+    img = Image.open(io.BytesIO(image_bytes))
+    # Let the JPEG decoder downscale while decoding (much cheaper than a full decode)
+    img.draft("RGB", size)
+    img.thumbnail(size)
+
+    if image_format == "JPEG" and img.mode != "RGB":
+        # JPEG has no alpha channel: flatten transparent pictures onto white
+        rgba = img.convert("RGBA")
+        img = Image.new("RGB", rgba.size, (255, 255, 255))
+        img.paste(rgba, mask=rgba.split()[-1])
+
+    buffer = io.BytesIO()
+    img.save(buffer, format=image_format, quality=quality)
+    return buffer.getvalue()
+
+
+def render_variant(image_bytes, variant):
+    """
+    Renders one of IMAGE_VARIANTS from a full-size picture.
+
+    Returns:
+        tuple[str, bytes]: The variant's content type and encoded bytes.
+    """
+    spec = IMAGE_VARIANTS[variant]
+    data = make_thumbnail(image_bytes, spec["size"], spec["format"])
+    return f"image/{MIME_TYPES[spec['format']]}", data
+
+
+def sign_picture(secret, itemid, variant, picture_hash):
+    """Signature of a picture URL: HMAC-SHA256 of ItemID, variant and picture hash under `secret`."""
+    message = f"{itemid}/{variant}/{picture_hash}".encode()
+    return hmac.new(secret.encode(), message, hashlib.sha256).hexdigest()[:32]
+
+
+def picture_url(base_url, itemid, picture_hash, secret, variant="thumb"):
+    """
+    URL of an item picture variant on the image server. The picture hash is part
+    of the URL, so a new picture gets a new URL and browsers may cache forever.
+    The URL is signed with `secret` (see sign_picture): the server serves no
+    other, so pictures can't be fetched by enumerating ItemIDs.
+    """
+    extension = FILE_EXTENSIONS[IMAGE_VARIANTS[variant]["format"]]
+    signature = sign_picture(secret, itemid, variant, picture_hash)
+    return f"{base_url.rstrip('/')}/items/{itemid}/{variant}.{extension}?v={picture_hash}&s={signature}"
+
+
+def get_image_base_url():
+    """
+    Public URL of image_server.py ([images] base_url in secrets), or None if
+    pictures should be inlined as thumbnail data URIs instead.
+    """
+    return st.secrets.get("images", {}).get("base_url") or None
+
+
+def get_image_secret():
+    """Key signing picture URLs ([images] secret), shared with image_server.py."""
+    secret = st.secrets.get("images", {}).get("secret")
+    if not secret:
+        raise ValueError("[images] base_url needs [images] secret, the image server's URL signing key")
+    return secret
+
+
+def to_data_uri(thumbnail_bytes, image_format=THUMBNAIL_FORMAT):
+    """Wraps encoded thumbnail bytes in a data URI usable in <img src> / st.image."""
+    encoded = base64.b64encode(thumbnail_bytes).decode()
+    return f"data:image/{MIME_TYPES[image_format]};base64,{encoded}"
+
+
+class ThumbnailCache:
+    """
+    Bounded LRU cache of item thumbnails keyed by (ItemID, content hash).
+
+    Entries are stored as ready-to-render data URIs. When `disk_dir` is set,
+    thumbnails are also written there and survive process restarts. When `shared`
+    (a query cache shared between processes, e.g. SQLiteQueryCache) is set, they
+    are kept there too, so each picture is thumbnailed once per host.
+    A new picture for an item gets a new hash, so stale thumbnails are never served.
+    Pictures that can't be decoded are remembered as UNDECODABLE (in memory and in
+    `shared`, not on disk).
+    """
+
+    def __init__(self, max_entries=1024, max_bytes=32 * 1024 * 1024, disk_dir=None,
+                 size=THUMBNAIL_SIZE, image_format=THUMBNAIL_FORMAT, shared=None, shared_ttl=86400.0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.size = tuple(size)
+        self.image_format = image_format
+        self.shared = shared
+        self.shared_ttl = shared_ttl
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "shared_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def _shared_key(self, itemid, content_hash):
+        return ("thumbnail", itemid, content_hash, self.size, self.image_format)
+
+    def _disk_path(self, itemid, content_hash):
+        return os.path.join(self.disk_dir, f"{itemid}_{content_hash}.{FILE_EXTENSIONS[self.image_format]}")
+
+    def _remember(self, key, data_uri):
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= len(self._entries.pop(key))
+            self._entries[key] = data_uri
+            self._bytes += len(data_uri)
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+                self._stats["evictions"] += 1
+
+    def get(self, itemid, content_hash):
+        """
+        Returns the cached data URI, UNDECODABLE if the picture is known not to
+        decode, or None if this picture has no thumbnail yet.
+        """
+        key = (itemid, content_hash)
+        with self._lock:
+            data_uri = self._entries.get(key)
+            if data_uri is not None:
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                return data_uri
+
+        if self.shared is not None:
+            found, data_uri = self.shared.get(self._shared_key(itemid, content_hash))
+            if found:
+                self._remember(key, data_uri)
+                with self._lock:
+                    self._stats["shared_hits"] += 1
+                return data_uri
+
+        if self.disk_dir:
+            try:
+                with open(self._disk_path(itemid, content_hash), "rb") as f:
+                    data_uri = to_data_uri(f.read(), self.image_format)
+            except OSError:
+                data_uri = None
+            if data_uri is not None:
+                self._remember(key, data_uri)
+                with self._lock:
+                    self._stats["disk_hits"] += 1
+                return data_uri
+
+        with self._lock:
+            self._stats["misses"] += 1
+        return None
+
+    def put(self, itemid, content_hash, image_bytes):
+        """
+        Generates and caches the thumbnail of a full-size picture.
+
+        Returns:
+            str or None: The thumbnail data URI, or None if the picture can't be decoded
+            (then cached as UNDECODABLE).
+        """
+        try:
+            thumbnail = make_thumbnail(image_bytes, self.size, self.image_format)
+        except Exception:
+            if self.shared is not None:
+                self.shared.set(self._shared_key(itemid, content_hash), UNDECODABLE, ttl=self.shared_ttl)
+            self._remember((itemid, content_hash), UNDECODABLE)
+            return None
+
+        if self.disk_dir:
+            path = self._disk_path(itemid, content_hash)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            try:
+                with open(tmp_path, "wb") as f:
+                    f.write(thumbnail)
+                os.replace(tmp_path, path)
+            except OSError:
+                pass
+
+        data_uri = to_data_uri(thumbnail, self.image_format)
+        if self.shared is not None:
+            self.shared.set(self._shared_key(itemid, content_hash), data_uri, ttl=self.shared_ttl)
+        self._remember((itemid, content_hash), data_uri)
+        return data_uri
+
+    def clear(self):
+        """Drops every in-memory thumbnail (the disk tier is kept)."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """Returns hit/miss/eviction counters and current memory usage."""
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot["entries"] = len(self._entries)
+            snapshot["bytes"] = self._bytes
+        return snapshot
+
+
+@st.cache_resource
+def get_thumbnail_cache():
+    """
+    Process-wide thumbnail cache, backed by the query cache when that is shared
+    between processes. Optional settings under [thumbnails] in secrets:
+    max_entries, max_bytes, disk_dir, size, format, shared_ttl (seconds).
+    """
+    config = st.secrets.get("thumbnails", {})
+    size = int(config.get("size", THUMBNAIL_SIZE[0]))
+    query_cache = get_query_cache()
+    return ThumbnailCache(
+        max_entries=int(config.get("max_entries", 1024)),
+        max_bytes=int(config.get("max_bytes", 32 * 1024 * 1024)),
+        disk_dir=config.get("disk_dir") or None,
+        size=(size, size),
+        image_format=config.get("format", THUMBNAIL_FORMAT).upper(),
+        shared=query_cache if query_cache.shared else None,
+        shared_ttl=float(config.get("shared_ttl", 86400)),
+    )
@@ -1,170 +1,380 @@
 import streamlit as st
-import io
-from PIL import Image
 import pandas as pd
+from streamlit.errors import StreamlitAPIException
 from purchase_order.po_handler import (
+    ACTIVE_PO_STATUSES,
+    CONFLICT_MISSING,
+    CONFLICT_VERSION,
+    get_purchase_orders_by_id,
     get_purchase_orders_for_supplier,
-    get_purchase_order_items,
+    get_items_for_purchase_orders,
     update_purchase_order_status,
-    update_po_order_proposal,
-    update_po_item_proposal
+    update_po_proposals
 )
+from purchase_order.po_render import render_items_table
+from purchase_order.po_feed import get_po_snapshot
+from purchase_order.po_write_queue import FAILED, QUEUED, get_po_write_queue
+from purchase_order.po_export import show_export_controls
 
-def show_purchase_orders_page(supplier):
+# How often an open Track PO page checks the change feed's snapshot for updates
+SNAPSHOT_POLL_SECONDS = 5
+
+# How often a page with queued writes (write-behind mode) checks whether they finished
+WRITE_QUEUE_POLL_SECONDS = 2
+
+# The writes the page makes, by their PO_WRITES name
+WRITE_FUNCTIONS = {
+    "update_purchase_order_status": update_purchase_order_status,
+    "update_po_proposals": update_po_proposals,
+}
+
+# Render each PO as a fragment: its actions rerun (and refetch) only that card
+# instead of the whole app. False restores full-app reruns after every action.
+PO_CARD_FRAGMENTS = True
+
+_NOT_RELOADED = object()
+
+def _cell_value(value, cast):
+    """Converts a data_editor cell (NaN when empty) to a DB value."""
+    return None if pd.isna(value) else cast(value)
+
+def _changed_item_proposals(items, edited_df):
+    """Returns (itemid, sup_qty, sup_price) for every line edited in the proposal grid."""
+    if edited_df is None:
+        return []
+    changes = []
+    for item, (_, row) in zip(items, edited_df.iterrows()):
+        new_qty = _cell_value(row["SupQty"], int)
+        new_price = _cell_value(row["SupPrice"], float)
+        old_qty = _cell_value(item.supproposedquantity, int)
+        old_price = _cell_value(item.supproposedprice, float)
+        if (new_qty, new_price) != (old_qty, old_price):
+            changes.append((item.itemid, new_qty, new_price))
+    return changes
+
+@st.fragment(run_every=SNAPSHOT_POLL_SECONDS)
+def _watch_snapshot(snapshot, rendered_version):
+    """Reruns the page once the change feed has changed an order the page doesn't show as is."""
+    touched = snapshot.touched_since(rendered_version)
+    if touched is None:
+        st.rerun()
+    # Orders this session just wrote are already up to date in their cards
+    reloads = st.session_state["po_card_reloads"]
+    if any(reloads.get(poid, _NOT_RELOADED) != snapshot.get(poid) for poid in touched):
+        st.rerun()
+
+def _queued_write_done(queue, key):
+    status = queue.status(key)
+    return status is None or status["state"] != QUEUED
+
+@st.fragment(run_every=WRITE_QUEUE_POLL_SECONDS)
+def _watch_write_queue(queue, snapshot):
+    """Reruns the page once one of this session's queued writes has finished, showing the order as written."""
+    done = [poid for poid, writes in st.session_state["po_queued_writes"].items()
+            if any(_queued_write_done(queue, key) for key in writes)]
+    if done:
+        if snapshot is not None:
+            snapshot.refresh(done)
+        st.rerun()
+
+def _reload_po(supplier_id, poid, snapshot):
+    """
+    Refetches one order (header and lines, one query) after this session wrote it.
+    Returns None if it is no longer an active order.
+    """
+    if snapshot is not None:
+        # Applies the write to the snapshot now, so no page waits for the feed
+        snapshot.refresh([poid])
+        return snapshot.get(poid)
+    orders = get_purchase_orders_by_id(supplier_id, [poid], ACTIVE_PO_STATUSES)
+    return orders[0] if orders else None
+
+def _conflict_message(poid, result):
+    if result["conflict"] == CONFLICT_MISSING:
+        return f"PO {poid} no longer exists."
+    if result["conflict"] == CONFLICT_VERSION:
+        return (f"PO {poid} was changed by someone else (now '{result['status']}') before your change "
+                "was saved. Nothing was changed: review the order and try again.")
+    return f"PO {poid} is now '{result['status']}', so this action no longer applies. Nothing was changed."
+
+def _rerun_card():
+    """Reruns just the current PO card, or the whole app when cards aren't fragments."""
+    if PO_CARD_FRAGMENTS:
+        try:
+            st.rerun(scope="fragment")
+        except StreamlitAPIException:
+            pass  # Not a fragment rerun (e.g. the click was handled by a full rerun)
+    st.rerun()
+
+def _apply_write_result(result, supplier_id, snapshot, poid, kind, message):
+    """
+    Reruns the order's card after a write, showing `message` (a st.<kind> call)
+    if it was applied, or why not. Conflicts refetch the order too: what the
+    supplier saw is stale.
+    """
+    if PO_CARD_FRAGMENTS:
+        st.session_state["po_card_reloads"][poid] = _reload_po(supplier_id, poid, snapshot)
+    elif snapshot is not None:
+        snapshot.refresh([poid])
+    if result["conflict"]:
+        kind, message = "warning", f"⚠️ {_conflict_message(poid, result)}"
+    st.session_state["po_card_messages"][poid] = (kind, message)
+    _rerun_card()
+
+def _submit_write(supplier_id, snapshot, operation, kind, message, **kwargs):
+    """
+    Applies one of WRITE_FUNCTIONS (with `kwargs`, which include the order's poid) and
+    reruns the order's card (see _apply_write_result), or, in write-behind mode
+    ([write_queue] in secrets), queues it and reruns the page so it watches the queue.
+    `message` is formatted with the write result.
+    """
+    poid = kwargs["poid"]
+    queue = get_po_write_queue()
+    if queue is not None:
+        key = queue.enqueue(operation, kwargs)
+        st.session_state["po_queued_writes"].setdefault(poid, {})[key] = (kind, message)
+        st.rerun()
+    result = WRITE_FUNCTIONS[operation](**kwargs)
+    _apply_write_result(result, supplier_id, snapshot, poid, kind, message.format(**result))
+
+def _show_queued_writes(poid):
+    """
+    Shows the state of this session's queued writes to an order; finished ones are
+    reported once, like a write made directly. Returns True while any is still queued.
+    """
+    writes = st.session_state["po_queued_writes"].get(poid)
+    if not writes:
+        return False
+    queue = get_po_write_queue()
+    if queue is None:
+        return False
+    pending = False
+    for key, (kind, message) in list(writes.items()):
+        status = queue.status(key)
+        if status is not None and status["state"] == QUEUED:
+            pending = True
+            retrying = ""
+            if status["attempts"]:
+                retrying = f" Retrying (attempt {status['attempts'] + 1}): {status['last_error']}"
+            st.info(f"⏳ Saving your change to PO {poid}...{retrying}")
+            continue
+        del writes[key]
+        if status is None:
+            continue  # Pruned from the journal
+        if status["state"] == FAILED:
+            st.error(f"🚨 Your change to PO {poid} could not be saved: {status['last_error']}")
+        elif status["result"]["conflict"]:
+            st.warning(f"⚠️ {_conflict_message(poid, status['result'])}")
+        else:
+            getattr(st, kind)(message.format(**status["result"]))
+    if not writes:
+        del st.session_state["po_queued_writes"][poid]
+    return pending
+
+def _show_po_card(supplier_id, po, items, updated, snapshot):
+    """
+    One active order: details, item table, proposal form and status actions.
+    Run as a fragment (PO_CARD_FRAGMENTS), so it can rerun on its own: after one
+    of its writes it shows the order as refetched by _apply_write_result.
+    """
+    poid = po.poid
+    reloads = st.session_state["po_card_reloads"]
+    if poid in reloads:
+        po, updated = reloads[poid], False
+        items = po.items if po is not None else ()
+
+    message = st.session_state["po_card_messages"].pop(poid, None)
+    if message:
+        getattr(st, message[0])(message[1])
+    # Actions wait for a queued write to the order: they would be based on its old state
+    pending = _show_queued_writes(poid)
+    if po is None:
+        st.info(f"PO {poid} is no longer active: see 📂 Archived PO.")
+        return
+
+    label = f"PO ID: {po.poid} | Status: {po.status}"
+    if updated:
+        label += " | 🔄 Updated"
+    with st.expander(label):
+        # Basic PO info
+        st.write(f"**Order Date:** {po.orderdate}")
+        st.write(f"**Expected Delivery:** {po.expecteddelivery or 'Not Set'}")
+        st.write(f"**Proposed Delivery:** {po.supproposeddeliver or 'None'}")
+        st.write(f"**Proposed Status:** {po.proposedstatus or 'None'}")
+        st.write(f"**Current Status:** {po.status}")
+
+        # Show items in a table + item-level proposals
+        if items:
+            st.subheader("Ordered Items")
+
+            st.markdown(render_items_table(items), unsafe_allow_html=True)
+
+        # Propose changes: all item lines (qty/price) + overall PO (delivery date, note)
+        st.write("---")
+        with st.form(key=f"proposal_form_{po.poid}"):
+            st.write("**Propose Changes** (edit SupQty / SupPrice for any lines, plus delivery date or note)")
+            edited_df = None
+            if items:
+                editor_df = pd.DataFrame([{
+                    "ItemID": item.itemid,
+                    "Item Name": item.itemnameenglish,
+                    "Ordered Qty": item.orderedquantity,
+                    "Est. Price": _cell_value(item.estimatedprice, float),
+                    "SupQty": _cell_value(item.supproposedquantity, int),
+                    "SupPrice": _cell_value(item.supproposedprice, float),
+                } for item in items])
+                edited_df = st.data_editor(
+                    editor_df,
+                    key=f"proposal_grid_{po.poid}",
+                    hide_index=True,
+                    disabled=["ItemID", "Item Name", "Ordered Qty", "Est. Price"],
+                    column_config={
+                        "SupQty": st.column_config.NumberColumn("Proposed Qty", min_value=0, step=1),
+                        "SupPrice": st.column_config.NumberColumn("Proposed Price", min_value=0.0, step=0.1),
+                    },
+                )
+            new_deliv = st.date_input("SupProposedDeliver", key=f"po_delivery_{po.poid}",
+                                      value=po.supproposeddeliver)
+            new_note = st.text_area("Supplier Note", key=f"po_note_{po.poid}",
+                                    value=po.suppliernote or "")
+            submitted = st.form_submit_button("Save PO Proposal", disabled=pending)
+
+        if submitted:
+            # Only fields the supplier changed are sent (None leaves a field as is)
+            item_proposals = _changed_item_proposals(items, edited_df)
+            proposed_deliver = new_deliv if new_deliv and new_deliv != po.supproposeddeliver else None
+            supplier_note = new_note if new_note != (po.suppliernote or "") else None
+            if not item_proposals and proposed_deliver is None and supplier_note is None:
+                st.info("Nothing changed: no proposal saved.")
+            else:
+                _submit_write(
+                    supplier_id, snapshot, "update_po_proposals", "success",
+                    "PO proposal saved ({changed_items} item line(s) changed). Status now 'Proposed'.",
+                    poid=po.poid,
+                    item_proposals=item_proposals,
+                    proposed_deliver=proposed_deliver,
+                    proposed_status="Proposed",  # or "Adjusted" if you prefer
+                    supplier_note=supplier_note,
+                    expected_version=po.rowversion
+                )
+
+        # Supplier Actions at order level
+        st.write("---")
+        if po.status == "Pending":
+            st.subheader("Respond to Order")
+            col1, col2 = st.columns(2)
+
+            with col1:
+                if st.button("Accept Order", key=f"accept_{po.poid}", disabled=pending):
+                    deliver_date = st.date_input(
+                        "Final Delivery Date (If needed)", 
+                        key=f"date_{po.poid}"
+                    )
+                    _submit_write(
+                        supplier_id, snapshot, "update_purchase_order_status", "success", "Order Accepted!",
+                        poid=po.poid,
+                        status="Accepted",
+                        expected_delivery=deliver_date or None,
+                        expected_version=po.rowversion
+                    )
+
+            with col2:
+                # Decline with reason
+                if not st.session_state["decline_po_show_reason"].get(po.poid, False):
+                    if st.button("Decline Order", key=f"decline_{po.poid}", disabled=pending):
+                        st.session_state["decline_po_show_reason"][po.poid] = True
+                        _rerun_card()
+                else:
+                    st.write("**Reason for Declination**")
+                    decline_note = st.text_area("Please provide a reason:", key=f"note_{po.poid}")
+
+                    confirm_col, cancel_col = st.columns(2)
+                    with confirm_col:
+                        if st.button("Confirm Decline", key=f"confirm_decline_{po.poid}", disabled=pending):
+                            st.session_state["decline_po_show_reason"][po.poid] = False
+                            _submit_write(
+                                supplier_id, snapshot, "update_purchase_order_status", "warning",
+                                "Order Declined!",
+                                poid=po.poid,
+                                status="Declined",
+                                supplier_note=decline_note,
+                                expected_version=po.rowversion
+                            )
+
+                    with cancel_col:
+                        if st.button("Cancel", key=f"cancel_decline_{po.poid}"):
+                            st.session_state["decline_po_show_reason"][po.poid] = False
+                            _rerun_card()
+
+        elif po.status == "Accepted":
+            if st.button("Mark as Shipping", key=f"ship_{po.poid}", disabled=pending):
+                _submit_write(
+                    supplier_id, snapshot, "update_purchase_order_status", "info",
+                    "Order marked as Shipping.",
+                    poid=po.poid, status="Shipping", expected_version=po.rowversion
+                )
+
+        elif po.status == "Shipping":
+            if st.button("Mark as Delivered", key=f"delivered_{po.poid}", disabled=pending):
+                _submit_write(
+                    supplier_id, snapshot, "update_purchase_order_status", "success",
+                    "Order marked as Delivered.",
+                    poid=po.poid, status="Delivered", expected_version=po.rowversion
+                )
+
+_po_card_fragment = st.fragment(_show_po_card)
+
+def show_purchase_orders_page(supplier, data=None):
     """Displays active purchase orders. Supplier can propose item-level changes (qty/price)
-       and also propose an overall new delivery date & status at the order level."""
+       and also propose an overall new delivery date & status at the order level.
+       `data` is the optional result of load_purchase_order_pages (avoids refetching)."""
     st.subheader("📦 Track Purchase Orders")
 
     # For controlling the 'decline reason' flow
     if "decline_po_show_reason" not in st.session_state:
         st.session_state["decline_po_show_reason"] = {}
 
-    # For controlling "modify item proposal" at item-level
-    if "modify_item_proposal" not in st.session_state:
-        st.session_state["modify_item_proposal"] = {}
+    # Outcome of the last action on each PO (shown once, by its card)
+    if "po_card_messages" not in st.session_state:
+        st.session_state["po_card_messages"] = {}
+
+    # Writes this session queued (write-behind mode): poid -> {key: (kind, message)}
+    if "po_queued_writes" not in st.session_state:
+        st.session_state["po_queued_writes"] = {}
+
+    # Orders refetched by their card after a write; a full rerun reads them afresh
+    st.session_state["po_card_reloads"] = {}
+
+    # Active POs come from the change feed's in-memory snapshot when it is running
+    # (no queries on reruns; only changed POs are refetched, by the feed)
+    snapshot = get_po_snapshot(supplier.supplierid)
+    updated = set()
+    if snapshot is not None:
+        version, purchase_orders = snapshot.orders()
+        items_by_po = {po.poid: po.items for po in purchase_orders}
+        seen = st.session_state.get("po_snapshot_seen")
+        if seen and seen[0] == supplier.supplierid:
+            updated = snapshot.changed_since(seen[1])
+        st.session_state["po_snapshot_seen"] = (supplier.supplierid, version)
+        _watch_snapshot(snapshot, version)
+    elif data is not None:
+        purchase_orders = data["active"]
+        items_by_po = data["items_by_po"]
+    else:
+        purchase_orders = get_purchase_orders_for_supplier(supplier.supplierid)
+        # Fetch items of all POs in one round trip
+        items_by_po = get_items_for_purchase_orders([po.poid for po in purchase_orders or []])
 
-    # Fetch active POs
-    purchase_orders = get_purchase_orders_for_supplier(supplier["supplierid"])
     if not purchase_orders:
         st.info("No active purchase orders.")
         return
 
+    show_export_controls(supplier.supplierid, "active_export", statuses=list(ACTIVE_PO_STATUSES))
+
+    queue = get_po_write_queue()
+    if queue is not None and st.session_state["po_queued_writes"]:
+        _watch_write_queue(queue, snapshot)
+
+    show_card = _po_card_fragment if PO_CARD_FRAGMENTS else _show_po_card
     for po in purchase_orders:
-        with st.expander(f"PO ID: {po['poid']} | Status: {po['status']}"):
-            # Basic PO info
-            st.write(f"**Order Date:** {po['orderdate']}")
-            st.write(f"**Expected Delivery:** {po['expecteddelivery'] or 'Not Set'}")
-            st.write(f"**Proposed Delivery:** {po.get('supproposeddeliver') or 'None'}")
-            st.write(f"**Proposed Status:** {po.get('proposedstatus') or 'None'}")
-            st.write(f"**Current Status:** {po['status']}")
-
-            # Show items in a table + item-level proposals
-            items = get_purchase_order_items(po["poid"])
-            if items:
-                st.subheader("Ordered Items")
-
-                rows = []
-                for item in items:
-                    # Build <img> HTML
-                    if item["itempicture"]:
-                        img_html = f'<img src="{item["itempicture"]}" width="50" />'
-                    else:
-                        img_html = "No Image"
-
-                    # Proposed quantity/price
-                    sup_qty = item.get("supproposedquantity") or ""
-                    sup_price = item.get("supproposedprice") or ""
-
-                    rows.append({
-                        "ItemID": item["itemid"],
-                        "Picture": img_html,
-                        "Item Name": item["itemnameenglish"],
-                        "Ordered Qty": item["orderedquantity"],
-                        "Est. Price": item["estimatedprice"] or "N/A",
-                        "SupQty": sup_qty,
-                        "SupPrice": sup_price
-                    })
-
-                df = pd.DataFrame(rows, columns=[
-                    "ItemID", "Picture", "Item Name", 
-                    "Ordered Qty", "Est. Price",
-                    "SupQty", "SupPrice"
-                ])
-                df_html = df.to_html(escape=False, index=False)
-                st.markdown(df_html, unsafe_allow_html=True)
-
-                # Let the supplier pick an item to propose new qty/price
-                st.write("**Propose Changes for an Item**")
-                item_ids = [str(r["ItemID"]) for r in rows]
-                selected_item = st.selectbox("Select an item to modify:", item_ids, key=f"item_select_{po['poid']}")
-
-                if selected_item:
-                    selected_item = int(selected_item)
-                    colA, colB = st.columns(2)
-                    new_qty = colA.number_input("Proposed Qty", min_value=0, value=0, key=f"qty_{po['poid']}_{selected_item}")
-                    new_price = colB.number_input("Proposed Price", min_value=0.0, value=0.0, step=0.1, key=f"price_{po['poid']}_{selected_item}")
-
-                    if st.button("Submit Item Proposal", key=f"submit_item_{po['poid']}_{selected_item}"):
-                        update_po_item_proposal(
-                            poid=po["poid"],
-                            itemid=selected_item,
-                            sup_qty=new_qty,
-                            sup_price=new_price
-                        )
-                        st.success(f"Proposed changes saved for item {selected_item}!")
-                        st.rerun()
-
-            # Propose entire PO changes (delivery date, proposed status, note, etc.)
-            st.write("---")
-            st.write("**Propose Overall PO Changes** (like new delivery date, status, or note)")
-            new_deliv = st.date_input("SupProposedDeliver", key=f"po_delivery_{po['poid']}")
-            new_note = st.text_area("Supplier Note", key=f"po_note_{po['poid']}",
-                                    value=po.get("suppliernote") or "")
-            if st.button("Save PO Proposal", key=f"save_poprop_{po['poid']}"):
-                update_po_order_proposal(
-                    poid=po["poid"],
-                    proposed_deliver=new_deliv,
-                    proposed_status="Proposed",  # or "Adjusted" if you prefer
-                    supplier_note=new_note
-                )
-                st.success("Entire PO proposal saved! Status now 'Proposed'.")
-                st.rerun()
-
-            # Supplier Actions at order level
-            st.write("---")
-            if po["status"] == "Pending":
-                st.subheader("Respond to Order")
-                col1, col2 = st.columns(2)
-
-                with col1:
-                    if st.button("Accept Order", key=f"accept_{po['poid']}"):
-                        deliver_date = st.date_input(
-                            "Final Delivery Date (If needed)", 
-                            key=f"date_{po['poid']}"
-                        )
-                        update_purchase_order_status(
-                            poid=po["poid"],
-                            status="Accepted",
-                            expected_delivery=deliver_date or None
-                        )
-                        st.success("Order Accepted!")
-                        st.rerun()
-
-                with col2:
-                    # Decline with reason
-                    if not st.session_state["decline_po_show_reason"].get(po["poid"], False):
-                        if st.button("Decline Order", key=f"decline_{po['poid']}"):
-                            st.session_state["decline_po_show_reason"][po["poid"]] = True
-                            st.rerun()
-                    else:
-                        st.write("**Reason for Declination**")
-                        decline_note = st.text_area("Please provide a reason:", key=f"note_{po['poid']}")
-
-                        confirm_col, cancel_col = st.columns(2)
-                        with confirm_col:
-                            if st.button("Confirm Decline", key=f"confirm_decline_{po['poid']}"):
-                                update_purchase_order_status(
-                                    poid=po["poid"],
-                                    status="Declined",
-                                    supplier_note=decline_note
-                                )
-                                st.warning("Order Declined!")
-                                st.session_state["decline_po_show_reason"][po["poid"]] = False
-                                st.rerun()
-
-                        with cancel_col:
-                            if st.button("Cancel", key=f"cancel_decline_{po['poid']}"):
-                                st.session_state["decline_po_show_reason"][po["poid"]] = False
-                                st.rerun()
-
-            elif po["status"] == "Accepted":
-                if st.button("Mark as Shipping", key=f"ship_{po['poid']}"):
-                    update_purchase_order_status(poid=po["poid"], status="Shipping")
-                    st.info("Order marked as Shipping.")
-                    st.rerun()
-
-            elif po["status"] == "Shipping":
-                if st.button("Mark as Delivered", key=f"delivered_{po['poid']}"):
-                    update_purchase_order_status(poid=po["poid"], status="Delivered")
-                    st.success("Order marked as Delivered.")
-                    st.rerun()
+        show_card(supplier.supplierid, po, items_by_po.get(po.poid, []), po.poid in updated, snapshot)
@@ -0,0 +1,398 @@
+import functools
+import pickle
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+import streamlit as st
+
+DEFAULT_SHARED_CACHE_PATH = "query_cache.sqlite3"
+
+
+def _freeze(value):
+    """Turns list/dict/set arguments into hashable equivalents for cache keys."""
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, set):
+        return frozenset(_freeze(v) for v in value)
+    return value
+
+
+class QueryCache:
+    """
+    TTL-bounded cache of read-query results with tag-based invalidation.
+
+    Every entry carries tags such as ("supplier", 7) or ("po", 42). Write functions
+    call `invalidate(...)` with the tags they affect, dropping only those entries.
+
+    To guarantee a write is never followed by a stale read, a result is only stored
+    if no invalidation happened while it was being fetched (see `generation`).
+
+    Entries live in this process only; see SQLiteQueryCache for a cache shared by
+    several server processes.
+    """
+
+    shared = False  # whether other processes see the same entries
+
+    def __init__(self, ttl=60.0, max_entries=2048):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = {}  # key -> (expires_at, value, tags)
+        self._tags = {}     # tag -> set of keys
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._counters = {}
+        self._stats = {"hits": 0, "misses": 0, "invalidations": 0, "skipped_stores": 0}
+
+    @property
+    def generation(self):
+        """Incremented on every invalidation; capture it before fetching a result."""
+        return self._generation
+
+    def counter(self, name):
+        """Current value of a named counter kept with the cache (0 until bumped)."""
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def bump(self, name):
+        """Increments a named counter, e.g. to tell every session some state changed."""
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + 1
+
+    def _drop(self, key):
+        _, _, tags = self._entries.pop(key)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def get(self, key):
+        """Returns (True, value) on a fresh hit, (False, None) otherwise."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._stats["hits"] += 1
+                return True, entry[1]
+            if entry is not None:
+                self._drop(key)
+            self._stats["misses"] += 1
+            return False, None
+
+    def set(self, key, value, tags=(), generation=None, ttl=None):
+        """
+        Stores a result under `key`. If `generation` is given and an invalidation
+        happened since it was captured, the result may be stale and is not stored.
+        """
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                self._stats["skipped_stores"] += 1
+                return
+            if key in self._entries:
+                self._drop(key)
+            elif len(self._entries) >= self.max_entries:
+                # Evict the entry closest to expiry
+                self._drop(min(self._entries, key=lambda k: self._entries[k][0]))
+            tags = frozenset(tags)
+            self._entries[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value, tags)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+
+    def invalidate(self, *tags):
+        """Drops every entry carrying any of `tags`."""
+        with self._lock:
+            self._generation += 1
+            self._stats["invalidations"] += 1
+            for tag in tags:
+                for key in list(self._tags.get(tag, ())):
+                    self._drop(key)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._tags.clear()
+
+    def stats(self):
+        """Returns hit/miss counters, the hit rate and the current entry count."""
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot["entries"] = len(self._entries)
+        lookups = snapshot["hits"] + snapshot["misses"]
+        snapshot["hit_rate"] = snapshot["hits"] / lookups if lookups else 0.0
+        return snapshot
+
+
+def _key_text(value):
+    """Deterministic text of a cache key or tag, the same in every process."""
+    if isinstance(value, tuple):
+        return "(" + ", ".join(_key_text(v) for v in value) + ")"
+    if isinstance(value, frozenset):
+        # Set iteration order depends on the process's hash seed
+        return "frozenset(" + ", ".join(sorted(_key_text(v) for v in value)) + ")"
+    return repr(value)
+
+
+SHARED_CACHE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_expires_at_idx ON entries (expires_at);
+CREATE TABLE IF NOT EXISTS entry_tags (
+    tag TEXT NOT NULL,
+    key TEXT NOT NULL,
+    PRIMARY KEY (tag, key)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS entry_tags_key_idx ON entry_tags (key);
+CREATE TRIGGER IF NOT EXISTS entries_drop_tags AFTER DELETE ON entries
+BEGIN
+    DELETE FROM entry_tags WHERE key = OLD.key;
+END;
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO counters (name, value) VALUES ('generation', 0);
+"""
+
+
+class SQLiteQueryCache:
+    """
+    QueryCache kept in a SQLite file opened by every server process on the host.
+
+    Entries, tags, counters and the invalidation generation are shared, so a write
+    in one process invalidates what all of them cached (and the store-unless-
+    invalidated guarantee holds across processes), and a result is fetched once
+    per host instead of once per process. A lookup costs a local SQLite read and
+    an unpickle instead of a dict lookup.
+
+    Values are pickled: the file must only be writable by this app's processes.
+    """
+
+    shared = True
+
+    def __init__(self, path=DEFAULT_SHARED_CACHE_PATH, ttl=60.0, max_entries=2048):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._local = threading.local()  # one connection per thread
+        self._lock = threading.Lock()
+        self._stores = 0
+        self._stats = {"hits": 0, "misses": 0, "invalidations": 0, "skipped_stores": 0}
+        self._db().executescript(SHARED_CACHE_SCHEMA)
+
+    def _db(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=10.0, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")  # a cache may lose its last writes on power loss
+            self._local.db = db
+        return db
+
+    @contextmanager
+    def _write(self):
+        """A write transaction that takes the file's write lock up front."""
+        db = self._db()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            yield db
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+
+    def _count(self, key):
+        with self._lock:
+            self._stats[key] += 1
+
+    @property
+    def generation(self):
+        """Incremented on every invalidation, by any process; capture it before fetching a result."""
+        return self.counter("generation")
+
+    def counter(self, name):
+        """Current value of a named counter shared by all processes (0 until bumped)."""
+        row = self._db().execute("SELECT value FROM counters WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else 0
+
+    def bump(self, name):
+        """Increments a named counter for every process."""
+        with self._write() as db:
+            db.execute("INSERT INTO counters (name, value) VALUES (?, 1) "
+                       "ON CONFLICT (name) DO UPDATE SET value = value + 1", (name,))
+
+    def get(self, key):
+        """Returns (True, value) on a fresh hit, (False, None) otherwise."""
+        row = self._db().execute(
+            "SELECT value FROM entries WHERE key = ? AND expires_at > ?", (_key_text(key), time.time())
+        ).fetchone()
+        if row is None:
+            self._count("misses")
+            return False, None
+        self._count("hits")
+        return True, pickle.loads(row[0])
+
+    def set(self, key, value, tags=(), generation=None, ttl=None):
+        """
+        Stores a result under `key`, unless an invalidation (in any process)
+        happened since `generation` was captured.
+        """
+        key = _key_text(key)
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        now = time.time()
+        with self._lock:
+            self._stores += 1
+            evict = self._stores % 64 == 0
+        with self._write() as db:
+            if generation is not None and generation != self.counter("generation"):
+                self._count("skipped_stores")
+                return
+            db.execute("DELETE FROM entry_tags WHERE key = ?", (key,))
+            db.execute("INSERT OR REPLACE INTO entries (key, value, expires_at) VALUES (?, ?, ?)",
+                       (key, data, now + (self.ttl if ttl is None else ttl)))
+            db.executemany("INSERT OR IGNORE INTO entry_tags (tag, key) VALUES (?, ?)",
+                           [(_key_text(tag), key) for tag in set(tags)])
+            if evict:
+                # Every so often: drop expired entries, then those closest to expiry beyond max_entries
+                db.execute("DELETE FROM entries WHERE expires_at <= ?", (now,))
+                db.execute("DELETE FROM entries WHERE key IN (SELECT key FROM entries ORDER BY expires_at "
+                           "LIMIT max(0, (SELECT count(*) FROM entries) - ?))", (self.max_entries,))
+
+    def invalidate(self, *tags):
+        """Drops every entry carrying any of `tags`, in every process."""
+        texts = [_key_text(tag) for tag in tags]
+        marks = ",".join("?" * len(texts))
+        with self._write() as db:
+            db.execute("UPDATE counters SET value = value + 1 WHERE name = 'generation'")
+            if texts:
+                db.execute(f"DELETE FROM entries WHERE key IN (SELECT key FROM entry_tags WHERE tag IN ({marks}))",
+                           texts)
+        self._count("invalidations")
+
+    def clear(self):
+        with self._write() as db:
+            db.execute("UPDATE counters SET value = value + 1 WHERE name = 'generation'")
+            db.execute("DELETE FROM entries")
+
+    def stats(self):
+        """Returns this process's hit/miss counters, its hit rate and the shared entry count."""
+        with self._lock:
+            snapshot = dict(self._stats)
+        snapshot["entries"] = self._db().execute("SELECT count(*) FROM entries").fetchone()[0]
+        lookups = snapshot["hits"] + snapshot["misses"]
+        snapshot["hit_rate"] = snapshot["hits"] / lookups if lookups else 0.0
+        return snapshot
+
+
+# [cache] backend -> factory(config section)
+CACHE_BACKENDS = {
+    "memory": lambda config: QueryCache(
+        ttl=float(config.get("ttl", 60)),
+        max_entries=int(config.get("max_entries", 2048)),
+    ),
+    "sqlite": lambda config: SQLiteQueryCache(
+        config.get("path", DEFAULT_SHARED_CACHE_PATH),
+        ttl=float(config.get("ttl", 60)),
+        max_entries=int(config.get("max_entries", 2048)),
+    ),
+}
+
+@st.cache_resource
+def get_query_cache():
+    """
+    Process-wide query cache. Optional settings under [cache] in secrets:
+    backend ("memory", the default, or "sqlite" to share one cache between the
+    server processes of a host, at `path`), ttl (seconds), max_entries.
+    """
+    config = st.secrets.get("cache", {})
+    backend = config.get("backend", "memory")
+    if backend not in CACHE_BACKENDS:
+        raise ValueError(f"Unknown [cache] backend {backend!r}; expected one of {sorted(CACHE_BACKENDS)}")
+    return CACHE_BACKENDS[backend](config)
+
+def get_query_cache_stats():
+    """Returns cache counters (hits, misses, hit_rate, ...) for monitoring."""
+    return get_query_cache().stats()
+
+def invalidate(*tags):
+    """Invalidates cached results carrying any of the given tags."""
+    get_query_cache().invalidate(*tags)
+
+def supplier_tag(supplier_id):
+    return ("supplier", supplier_id)
+
+def po_tag(poid):
+    return ("po", poid)
+
+def cached_query(tags, ttl=None):
+    """
+    Decorator caching a read function's result in the process-wide query cache.
+
+    Args:
+        tags (callable): tags(result, *args, **kwargs) -> iterable of tags the
+            result depends on (e.g. its supplier and POIDs).
+        ttl (float, optional): Overrides the cache's default TTL for this function.
+
+    Cached results are shared between callers and must not be mutated.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            cache = get_query_cache()
+            key = (func.__module__, func.__qualname__, _freeze(args), _freeze(kwargs))
+            found, value = cache.get(key)
+            if found:
+                return value
+            generation = cache.generation
+            value = func(*args, **kwargs)
+            cache.set(key, value, tags(value, *args, **kwargs), generation=generation, ttl=ttl)
+            return value
+
+        wrapper.uncached = func
+        return wrapper
+    return decorator
+
+def cached_per_key(tags, ttl=None):
+    """
+    Decorator caching a bulk read function, func(keys) -> {key: result}, one entry
+    per key: a call fetches only the keys not cached yet (still in one call), so
+    asking for one more key doesn't refetch the others.
+
+    Args:
+        tags (callable): tags(result, key) -> iterable of tags one key's result
+            depends on.
+        ttl (float, optional): Overrides the cache's default TTL for this function.
+
+    Returns {key: result} for every requested key. Cached results are shared
+    between callers and must not be mutated.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(keys):
+            cache = get_query_cache()
+            results, missing = {}, []
+            for key in dict.fromkeys(keys):
+                found, value = cache.get((func.__module__, func.__qualname__, _freeze(key)))
+                if found:
+                    results[key] = value
+                else:
+                    missing.append(key)
+            if missing:
+                generation = cache.generation
+                fetched = func(missing)
+                for key in missing:
+                    cache.set((func.__module__, func.__qualname__, _freeze(key)), fetched[key],
+                              tags(fetched[key], key), generation=generation, ttl=ttl)
+                results.update(fetched)
+            return {key: results[key] for key in keys}
+
+        wrapper.uncached = func
+        return wrapper
+    return decorator
@@ -0,0 +1,147 @@
+import json
+import sys
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Latency histogram bucket upper bounds, in milliseconds (last bucket is +Inf)
+LATENCY_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+# Modules that are plumbing, not call sites
+_INTERNAL_MODULES = {"db_handler", "async_db_handler", "query_metrics", "query_cache", "contextlib", "functools"}
+
+_lock = threading.Lock()
+_sites = {}
+_local = threading.local()
+
+
+def find_call_site():
+    """Returns "module:function" of the first caller outside the DB plumbing modules."""
+    frame = sys._getframe(1)
+    while frame is not None:
+        module = frame.f_globals.get("__name__", "")
+        if module not in _INTERNAL_MODULES:
+            return f"{module}:{frame.f_code.co_name}"
+        frame = frame.f_back
+    return "unknown"
+
+
+def result_size(rows):
+    """Approximate payload size of a result: total length of its str/bytes values."""
+    if not rows:
+        return 0
+    total = 0
+    for row in rows:
+        for value in (row.values() if isinstance(row, dict) else row):
+            if isinstance(value, (str, bytes, bytearray, memoryview)):
+                total += len(value)
+    return total
+
+
+def current_trace():
+    """The per-rerun trace list of this thread, or None if no trace is active."""
+    return getattr(_local, "trace", None)
+
+
+@contextmanager
+def trace_queries():
+    """Collects every query issued by this thread (e.g. one page render) into a list."""
+    previous = current_trace()
+    trace = []
+    _local.trace = trace
+    try:
+        yield trace
+    finally:
+        _local.trace = previous
+
+
+def record_query(call_site, query, elapsed, rows=0, nbytes=0, trace=None):
+    """
+    Records one executed query.
+
+    Args:
+        call_site (str): "module:function" that issued the query.
+        query (str): SQL text (kept in traces only).
+        elapsed (float): Duration in seconds.
+        rows (int): Rows returned or affected.
+        nbytes (int): Approximate bytes returned.
+        trace (list, optional): Trace to append to (default: this thread's active trace).
+    """
+    elapsed_ms = elapsed * 1000
+    with _lock:
+        site = _sites.get(call_site)
+        if site is None:
+            site = _sites[call_site] = {
+                "count": 0, "total_ms": 0.0, "max_ms": 0.0, "rows": 0, "bytes": 0,
+                "buckets": [0] * (len(LATENCY_BUCKETS_MS) + 1),
+            }
+        site["count"] += 1
+        site["total_ms"] += elapsed_ms
+        site["max_ms"] = max(site["max_ms"], elapsed_ms)
+        site["rows"] += rows
+        site["bytes"] += nbytes
+        site["buckets"][bisect_left(LATENCY_BUCKETS_MS, elapsed_ms)] += 1
+
+    trace = trace if trace is not None else current_trace()
+    if trace is not None:
+        trace.append({
+            "call_site": call_site,
+            "query": " ".join(query.split())[:200],
+            "ms": elapsed_ms,
+            "rows": rows,
+            "bytes": nbytes,
+        })
+
+
+def summarize_trace(trace):
+    """Returns (query count, total ms, total bytes) of a trace."""
+    return len(trace), sum(q["ms"] for q in trace), sum(q["bytes"] for q in trace)
+
+
+def get_query_metrics():
+    """Returns a snapshot of per-call-site metrics."""
+    with _lock:
+        return {
+            site: dict(stats, buckets=list(stats["buckets"]))
+            for site, stats in _sites.items()
+        }
+
+
+def reset_query_metrics():
+    with _lock:
+        _sites.clear()
+
+
+def export_metrics_json(indent=2):
+    """Per-call-site metrics as JSON (bucket bounds in ms, "inf" for the last one)."""
+    return json.dumps({
+        "bucket_bounds_ms": list(LATENCY_BUCKETS_MS) + ["inf"],
+        "call_sites": get_query_metrics(),
+    }, indent=indent)
+
+
+def export_metrics_prometheus(prefix="amas_query"):
+    """Per-call-site metrics in the Prometheus text exposition format."""
+    lines = [
+        f"# HELP {prefix}_duration_seconds Database query latency by call site.",
+        f"# TYPE {prefix}_duration_seconds histogram",
+    ]
+    metrics = get_query_metrics()
+    for site, stats in sorted(metrics.items()):
+        label = site.replace("\\", "\\\\").replace('"', '\\"')
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS_MS + (None,), stats["buckets"]):
+            cumulative += count
+            le = "+Inf" if bound is None else repr(bound / 1000)
+            lines.append(f'{prefix}_duration_seconds_bucket{{call_site="{label}",le="{le}"}} {cumulative}')
+        lines.append(f'{prefix}_duration_seconds_sum{{call_site="{label}"}} {stats["total_ms"] / 1000}')
+        lines.append(f'{prefix}_duration_seconds_count{{call_site="{label}"}} {stats["count"]}')
+
+    for name, key, help_text in (("rows_total", "rows", "Rows returned or affected"),
+                                 ("bytes_total", "bytes", "Approximate bytes returned")):
+        lines.append(f"# HELP {prefix}_{name} {help_text} by call site.")
+        lines.append(f"# TYPE {prefix}_{name} counter")
+        for site, stats in sorted(metrics.items()):
+            label = site.replace("\\", "\\\\").replace('"', '\\"')
+            lines.append(f'{prefix}_{name}{{call_site="{label}"}} {stats[key]}')
+    return "\n".join(lines) + "\n"
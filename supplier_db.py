@@ -1,4 +1,16 @@
+import streamlit as st
 from db_handler import run_query
+from query_cache import cached_query, get_query_cache, invalidate, supplier_tag
+from models import Supplier
+
+# Session-state key of the memoized supplier record of the logged-in user
+SUPPLIER_SESSION_KEY = "supplier_record"
+
+# Query-cache counter bumped by save_supplier_details so every session's memo (not
+# just the saving session's) is refreshed on its next rerun, in every server process
+# when the cache is shared ([cache] backend). Saves are rare, so one counter is
+# enough, and it can be read before the upsert without knowing the supplier ID.
+SUPPLIER_GENERATION = "supplier_generation"
 
 # List of required fields with their labels
 SUPPLIER_FIELDS = {
@@ -14,27 +26,79 @@ SUPPLIER_FIELDS = {
     "bankdetails": "Bank Details"
 }
 
+def supplier_email_tag(email):
+    return ("supplier_email", email)
+
+def _supplier_tags(result, email):
+    tags = [supplier_email_tag(email)]
+    if result:
+        tags.append(supplier_tag(result.supplierid))
+    return tags
+
+# Supplier columns in models.Supplier field order
+SUPPLIER_COLUMNS = """supplierid, suppliername, suppliertype, country, city, address, postalcode,
+    contactname, contactphone, contactemail, paymentterms, bankdetails"""
+
+SUPPLIER_BY_EMAIL_QUERY = f"SELECT {SUPPLIER_COLUMNS} FROM supplier WHERE contactemail = %s"
+
+@cached_query(_supplier_tags)
 def get_supplier_by_email(email):
-    """Retrieve supplier record by email."""
-    query = "SELECT * FROM supplier WHERE contactemail = %s"
-    result = run_query(query, (email,))
+    """Retrieve supplier record (a models.Supplier) by email."""
+    result = run_query(SUPPLIER_BY_EMAIL_QUERY, (email,), row_factory=Supplier.from_row, use_replica=True)
     return result[0] if result else None
 
+INSERT_SUPPLIER_QUERY = f"""
+INSERT INTO supplier (suppliername, contactemail)
+VALUES (%s, %s)
+ON CONFLICT (contactemail) DO NOTHING
+RETURNING {SUPPLIER_COLUMNS};
+"""
+
 def create_supplier(contactemail):
-    """Insert a new supplier record with minimal data (empty name)."""
-    query = """
-    INSERT INTO supplier (suppliername, contactemail)
-    VALUES (%s, %s)
-    RETURNING supplierid, suppliername, contactemail;
     """
+    Return the supplier record for this email, inserting it with minimal data
+    (empty name) if it doesn't exist yet. An existing supplier costs one SELECT and
+    no write. Concurrent first logins can't create duplicates (the unique index on
+    contactemail makes all but one insert do nothing; those read the winner's row).
+    """
+    # On the primary: a lagging replica would make an existing supplier look new
+    result = run_query(SUPPLIER_BY_EMAIL_QUERY, (contactemail,), row_factory=Supplier.from_row)
+    if result:
+        return result[0]
+
     params = ("", contactemail)  # 🔥 Supplier name left empty for user input
-    result = run_query(query, params)
+    result = run_query(INSERT_SUPPLIER_QUERY, params, row_factory=Supplier.from_row)
+    if result:
+        # Drop a cached "no such supplier" lookup
+        invalidate(supplier_email_tag(contactemail))
+        return result[0]
+
+    # Another login inserted it since the SELECT
+    result = run_query(SUPPLIER_BY_EMAIL_QUERY, (contactemail,), row_factory=Supplier.from_row)
     return result[0] if result else None
 
+def _bump_supplier_generation():
+    get_query_cache().bump(SUPPLIER_GENERATION)
+
 def get_or_create_supplier(contactemail):
-    """Fetch supplier by email; create if not exists."""
-    supplier = get_supplier_by_email(contactemail)
-    return supplier if supplier else create_supplier(contactemail)
+    """
+    Fetch supplier by email; create if not exists (one round trip for an existing supplier).
+    The record is memoized in session state for the logged-in email, so reruns
+    don't query the DB until save_supplier_details changes it.
+    """
+    generation = get_query_cache().counter(SUPPLIER_GENERATION)
+    memo = st.session_state.get(SUPPLIER_SESSION_KEY)
+    if memo and memo["email"] == contactemail and memo["generation"] == generation:
+        return memo["record"]
+
+    supplier = create_supplier(contactemail)
+    if supplier:
+        st.session_state[SUPPLIER_SESSION_KEY] = {
+            "email": contactemail,
+            "generation": generation,
+            "record": supplier,
+        }
+    return supplier
 
 def get_missing_fields(supplier):
     """
@@ -43,7 +107,7 @@ def get_missing_fields(supplier):
     """
     missing_fields = [
         key for key, label in SUPPLIER_FIELDS.items()
-        if not supplier.get(key) or supplier[key] == ""
+        if not getattr(supplier, key)
     ]
     return missing_fields
 
@@ -96,3 +160,6 @@ def save_supplier_details(supplierid, form_data):
         supplierid,
     )
     run_query(query, params)
+    invalidate(supplier_tag(supplierid))
+    _bump_supplier_generation()
+    st.session_state.pop(SUPPLIER_SESSION_KEY, None)
@@ -0,0 +1,130 @@
+import os
+import sys
+import uuid
+
+import pytest
+
+# Tests import the app's modules from the repo root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Process-wide resources (st.cache_resource) built from the secrets a test sets up
+APP_RESOURCES = (
+    ("db_handler", "get_db_config"),
+    ("db_handler", "get_pool"),
+    ("db_handler", "get_replica_router"),
+    ("query_cache", "get_query_cache"),
+    ("purchase_order.thumbnails", "get_thumbnail_cache"),
+    ("purchase_order.po_feed", "get_po_change_feed"),
+    ("purchase_order.po_write_queue", "get_po_write_queue"),
+)
+
+
+@pytest.fixture
+def make_schema():
+    """
+    Creates schemas of their own in $TEST_DSN's database (the test is skipped
+    without one), each holding the app's tables (benchmarks/schema.sql) with every
+    migration applied; returns their DSNs. The schemas are dropped afterwards.
+    """
+    psycopg2 = pytest.importorskip("psycopg2")
+    from psycopg2.extensions import make_dsn
+    from migrate import REPO_DIR, migrate
+
+    dsn = os.environ.get("TEST_DSN")
+    if not dsn:
+        pytest.skip("set TEST_DSN to a PostgreSQL database to run")
+    try:
+        admin = psycopg2.connect(dsn, connect_timeout=3)
+    except psycopg2.OperationalError as e:
+        pytest.skip(f"PostgreSQL at TEST_DSN not reachable: {e}")
+    admin.autocommit = True
+    schemas = []
+
+    def create():
+        schema = f"test_{uuid.uuid4().hex[:12]}"
+        with admin.cursor() as cur:
+            cur.execute(f"CREATE SCHEMA {schema}")
+        schemas.append(schema)
+        schema_dsn = make_dsn(dsn, options=f"-csearch_path={schema}")
+        conn = psycopg2.connect(schema_dsn)
+        try:
+            with conn, conn.cursor() as cur, open(os.path.join(REPO_DIR, "benchmarks", "schema.sql")) as f:
+                cur.execute(f.read())
+        finally:
+            conn.close()
+        migrate(schema_dsn, log=lambda message: None)
+        return schema_dsn
+
+    try:
+        yield create
+    finally:
+        with admin.cursor() as cur:
+            for schema in schemas:
+                cur.execute(f"DROP SCHEMA {schema} CASCADE")
+        admin.close()
+
+
+@pytest.fixture
+def database(make_schema, monkeypatch):
+    """
+    DSN of a fresh schema (see make_schema) that the app's modules use: st.secrets
+    is a plain dict with its [neon] section, which tests may extend (e.g. [feed]).
+    Process-wide resources built from it are stopped and dropped afterwards.
+    """
+    st = pytest.importorskip("streamlit")
+    import importlib
+
+    dsn = make_schema()
+    monkeypatch.setattr(st, "secrets", {"neon": {"dsn": dsn, "pool_max_size": 16}})
+    try:
+        yield dsn
+    finally:
+        from db_handler import get_pool
+        from purchase_order.po_feed import get_po_change_feed
+        from purchase_order.po_write_queue import get_po_write_queue
+
+        for worker in (get_po_change_feed(), get_po_write_queue()):
+            if worker is not None:
+                worker.stop()
+        get_pool().closeall()
+        for module, name in APP_RESOURCES:
+            getattr(importlib.import_module(module), name).clear()
+
+
+@pytest.fixture
+def add_orders(database):
+    """
+    Returns add(email, statuses, lines=2): inserts a supplier (unless one has this
+    email) with one order per status, each with `lines` item lines, straight into
+    the test's schema; returns (SupplierID, [POIDs]).
+    """
+    import psycopg2
+
+    def add(email, statuses, lines=2):
+        conn = psycopg2.connect(database)
+        try:
+            with conn, conn.cursor() as cur:
+                cur.execute("SELECT supplierid FROM supplier WHERE contactemail = %s", (email,))
+                row = cur.fetchone()
+                if row is None:
+                    cur.execute("INSERT INTO supplier (suppliername, contactemail) VALUES (%s, %s) "
+                                "RETURNING supplierid", (f"Supplier {email}", email))
+                    row = cur.fetchone()
+                supplier_id = row[0]
+                cur.execute("INSERT INTO Item (ItemNameEnglish) SELECT 'Item ' || n FROM generate_series(1, %s) n "
+                            "RETURNING ItemID", (lines,))
+                itemids = [itemid for itemid, in cur.fetchall()]
+                poids = []
+                for status in statuses:
+                    cur.execute("INSERT INTO PurchaseOrders (SupplierID, OrderDate, ExpectedDelivery, Status) "
+                                "VALUES (%s, current_date, current_date + 30, %s) RETURNING POID",
+                                (supplier_id, status))
+                    poid = cur.fetchone()[0]
+                    cur.executemany("INSERT INTO PurchaseOrderItems (POID, ItemID, OrderedQuantity, EstimatedPrice) "
+                                    "VALUES (%s, %s, 10, 2.50)", [(poid, itemid) for itemid in itemids])
+                    poids.append(poid)
+            return supplier_id, poids
+        finally:
+            conn.close()
+
+    return add
@@ -0,0 +1,22 @@
+"""Placeholder conversion from psycopg2 style to asyncpg style."""
+import pytest
+
+pytest.importorskip("streamlit")
+
+from async_db_handler import to_asyncpg_query
+
+
+def test_placeholders_are_numbered_in_order():
+    assert to_asyncpg_query("SELECT * FROM t WHERE a = %s AND b = ANY(%s) LIMIT %s") == \
+        "SELECT * FROM t WHERE a = $1 AND b = ANY($2) LIMIT $3"
+
+
+def test_quoted_text_and_comments_are_left_alone():
+    query = """SELECT '%s', 'it''s %s', "col%s" FROM t -- %s
+    WHERE a = %s /* %s */ AND b LIKE 'x%%'"""
+    assert to_asyncpg_query(query) == """SELECT '%s', 'it''s %s', "col%s" FROM t -- %s
+    WHERE a = $1 /* %s */ AND b LIKE 'x%'"""
+
+
+def test_escaped_percent():
+    assert to_asyncpg_query("SELECT 10 %% 3, %s") == "SELECT 10 % 3, $1"
@@ -0,0 +1,100 @@
+"""
+The PO change feed keeps a supplier's snapshot equal to what the database holds:
+after notifications for changed, added, item-edited and archived orders, and
+after its listening connection is killed and changes made meanwhile are missed.
+
+Needs a PostgreSQL to run against, given as $TEST_DSN (skipped otherwise); see
+the `database` fixture in conftest.py.
+"""
+import time
+
+import pytest
+
+pytest.importorskip("streamlit")
+psycopg2 = pytest.importorskip("psycopg2")
+
+EMAIL = "feed@test.example"
+
+
+def _wait_for(condition, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def _database_orders(supplier_id):
+    from purchase_order.po_handler import ACTIVE_PO_STATUSES, get_purchase_orders_with_items
+    return sorted(get_purchase_orders_with_items.uncached(supplier_id, ACTIVE_PO_STATUSES), key=lambda po: po.poid)
+
+
+def _snapshot_orders(snapshot):
+    return sorted(snapshot.orders()[1], key=lambda po: po.poid)
+
+
+@pytest.fixture
+def writer(database):
+    """A connection of its own, as the buyer app's would be."""
+    conn = psycopg2.connect(database)
+    conn.autocommit = True
+    yield conn
+    conn.close()
+
+
+@pytest.fixture
+def feed(database):
+    from purchase_order.po_feed import POChangeFeed
+
+    feed = POChangeFeed(database, reconnect_delay=0.5)
+    assert feed.start(), "change feed is not listening"
+    yield feed
+    feed.stop()
+
+
+def _change(writer, snapshot, query, params):
+    """Runs a change from the writer's connection and waits for the snapshot to apply it."""
+    version = snapshot.version
+    with writer.cursor() as cur:
+        cur.execute(query, params)
+    assert _wait_for(lambda: snapshot.version != version), f"not applied: {query}"
+
+
+def test_snapshot_follows_notifications(feed, writer, add_orders):
+    supplier_id, poids = add_orders(EMAIL, ["Pending", "Accepted", "Shipping"])
+    snapshot = feed.snapshot(supplier_id)
+    assert _snapshot_orders(snapshot) == _database_orders(supplier_id)
+
+    _change(writer, snapshot, "UPDATE PurchaseOrders SET SupplierNote = 'changed' WHERE POID = %s", (poids[0],))
+    assert snapshot.changed_since(snapshot.version - 1) == {poids[0]}
+    _change(writer, snapshot, "UPDATE PurchaseOrderItems SET SupProposedQuantity = 7 WHERE POID = %s", (poids[1],))
+    _change(writer, snapshot, "UPDATE PurchaseOrders SET Status = 'Declined' WHERE POID = %s", (poids[2],))
+    version = snapshot.version
+    _, (added,) = add_orders(EMAIL, ["Pending"])
+    assert _wait_for(lambda: snapshot.get(added) is not None and snapshot.version > version)
+
+    orders = _snapshot_orders(snapshot)
+    assert orders == _database_orders(supplier_id)
+    assert poids[2] not in {po.poid for po in orders}
+    assert feed.stats()["errors"] == 0
+
+
+def test_snapshot_reloads_after_reconnect(feed, writer, database, add_orders):
+    supplier_id, poids = add_orders(EMAIL, ["Pending", "Accepted"])
+    snapshot = feed.snapshot(supplier_id)
+    reloads = feed.stats()["reloads"]
+
+    with writer.cursor() as cur:
+        cur.execute("SELECT pg_terminate_backend(pid) FROM pg_stat_activity "
+                    "WHERE pid <> pg_backend_pid() AND query = %s", (f"LISTEN {feed.channel}",))
+    assert _wait_for(lambda: not feed.listening)
+
+    # Made while nobody listens: its notification is lost
+    with writer.cursor() as cur:
+        cur.execute("UPDATE PurchaseOrders SET SupplierNote = 'missed' WHERE POID = %s", (poids[0],))
+    assert _wait_for(lambda: feed.listening and feed.stats()["reconnects"] == 1)
+
+    assert feed.stats()["reloads"] == reloads + 1
+    assert snapshot.get(poids[0]).suppliernote == "missed"
+    assert _snapshot_orders(snapshot) == _database_orders(supplier_id)
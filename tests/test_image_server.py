@@ -0,0 +1,59 @@
+"""
+The image server remembers pictures that don't decode, so it doesn't fetch and
+decode them again on every request, but only the most recently requested ones:
+the memory stays bounded however many broken pictures are requested.
+
+Needs a PostgreSQL to run against, given as $TEST_DSN (skipped otherwise); see
+the `make_schema` fixture in conftest.py.
+"""
+import pytest
+
+pytest.importorskip("streamlit")
+psycopg2 = pytest.importorskip("psycopg2")
+
+import image_server
+from image_server import VariantStore
+
+GARBAGE = b"not a picture"
+
+
+@pytest.fixture
+def decodes(monkeypatch):
+    """Counts render_variant calls."""
+    calls = []
+    render_variant = image_server.render_variant
+
+    def counting(image_bytes, variant):
+        calls.append(image_bytes)
+        return render_variant(image_bytes, variant)
+
+    monkeypatch.setattr(image_server, "render_variant", counting)
+    return calls
+
+
+def test_undecodable_pictures_are_remembered_within_a_bound(make_schema, decodes):
+    dsn = make_schema()
+    conn = psycopg2.connect(dsn)
+    try:
+        with conn, conn.cursor() as cur:
+            cur.execute("INSERT INTO Item (ItemNameEnglish, ItemPicture) SELECT 'Item ' || n, %s "
+                        "FROM generate_series(1, 3) n RETURNING ItemID", (GARBAGE,))
+            first, second, third = (itemid for itemid, in cur.fetchall())
+    finally:
+        conn.close()
+
+    store = VariantStore(dsn, max_undecodable=2)
+    try:
+        assert store.get(first, "thumb") is None
+        assert store.get(second, "thumb") is None
+        assert store.get(first, "thumb") is None  # remembered, and now the most recent
+        assert len(decodes) == 2
+
+        assert store.get(third, "thumb") is None  # drops the least recently requested
+        assert len(store._undecodable) == 2
+        assert store.get(first, "thumb") is None
+        assert len(decodes) == 3
+        assert store.get(second, "thumb") is None  # forgotten: decoded once more
+        assert len(decodes) == 4
+    finally:
+        store.close()
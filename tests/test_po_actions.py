@@ -0,0 +1,150 @@
+"""
+Every Track PO action, clicked headlessly (Streamlit's AppTest) with full-app
+reruns (PO_CARD_FRAGMENTS = False, the old behaviour) and with per-card
+fragments: each must land in the database, and with fragments cost only the
+refetch of the order acted on. Queries and render time per action are printed
+(pytest -s) for comparison.
+
+AppTest replays a fragment rerun as a run of its script, so the fragment case
+renders just the cards acted on, while the full-app case renders the whole page.
+
+Needs a PostgreSQL to run against, given as $TEST_DSN (skipped otherwise); see
+the `database` fixture in conftest.py.
+"""
+import time
+
+import pytest
+
+pytest.importorskip("streamlit")
+psycopg2 = pytest.importorskip("psycopg2")
+pytest.importorskip("pandas")
+
+from query_metrics import get_query_metrics, reset_query_metrics
+
+EMAIL = "actions@test.example"
+
+# (label of the button to click, order it acts on, (Status, SupplierNote) of that order afterwards)
+ACTIONS = (
+    ("Save PO Proposal", 0, ("Pending", "Can deliver in two weeks")),
+    ("Accept Order", 0, ("Accepted", "Can deliver in two weeks")),
+    ("Mark as Shipping", 0, ("Shipping", "Can deliver in two weeks")),
+    ("Mark as Delivered", 0, ("Delivered", "Can deliver in two weeks")),
+    ("Decline Order", 1, ("Pending", None)),
+    ("Confirm Decline", 1, ("Declined", "Out of stock")),
+)
+
+# Active orders of the supplier besides the two acted on, so a full rerun has more to render
+OTHER_ORDERS = 6
+
+
+def _render_full_app(email):
+    """What a full-app rerun executes: supplier lookup, then the whole PO page."""
+    import streamlit as st
+    from supplier_db import get_or_create_supplier
+    from purchase_order import track_po
+    from purchase_order.main_po import show_main_po_page
+
+    track_po.PO_CARD_FRAGMENTS = False
+    supplier = get_or_create_supplier(email)
+    st.session_state["po_view"] = "📦 Track PO"
+    show_main_po_page(supplier)
+    # After st.rerun(), AppTest keeps the elements of the interrupted run that the
+    # rerun didn't overwrite, e.g. the card of an order an action just archived
+    st.empty()
+
+
+def _render_cards(supplier_id, poids):
+    """What a fragment rerun executes: the PO cards, with the orders they were rendered from."""
+    import streamlit as st
+    from purchase_order import track_po
+    from purchase_order.po_feed import get_po_snapshot
+    from purchase_order.po_handler import ACTIVE_PO_STATUSES, get_purchase_orders_by_id
+
+    track_po.PO_CARD_FRAGMENTS = True
+    if "test_orders" not in st.session_state:
+        # The page's first render: fragment reruns reuse the arguments it passed
+        st.session_state["decline_po_show_reason"] = {}
+        st.session_state["po_card_messages"] = {}
+        st.session_state["po_card_reloads"] = {}
+        st.session_state["po_queued_writes"] = {}
+        st.session_state["test_orders"] = get_purchase_orders_by_id(supplier_id, poids, ACTIVE_PO_STATUSES)
+    snapshot = get_po_snapshot(supplier_id)
+    for po in st.session_state["test_orders"]:
+        track_po._po_card_fragment(supplier_id, po, po.items, False, snapshot)
+
+
+def _card(at, poid):
+    for expander in at.expander:
+        if expander.label.startswith(f"PO ID: {poid} "):
+            return expander
+    raise LookupError(f"no card for PO {poid}")
+
+
+def _order_state(dsn, poid):
+    conn = psycopg2.connect(dsn)
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT Status, SupplierNote FROM PurchaseOrders WHERE POID = %s", (poid,))
+            return cur.fetchone()
+    finally:
+        conn.close()
+
+
+def _click_through(at, poids, dsn):
+    """Clicks through ACTIONS, checking each landed; returns {label: (queries, ms)}."""
+    at.run()
+    assert not at.exception, at.exception
+    results = {}
+    for label, index, expected in ACTIONS:
+        poid = poids[index]
+        card = _card(at, poid)
+        if label == "Save PO Proposal":
+            card.text_area(key=f"po_note_{poid}").input(expected[1])
+        elif label == "Confirm Decline":
+            card.text_area(key=f"note_{poid}").input(expected[1])
+        button = next(button for button in card.button if button.label == label)
+
+        reset_query_metrics()
+        start = time.perf_counter()
+        button.click().run()
+        ms = (time.perf_counter() - start) * 1000
+        assert not at.exception, f"{label}: {at.exception}"
+        assert _order_state(dsn, poid) == expected, label
+        results[label] = (sum(stats["count"] for stats in get_query_metrics().values()), ms)
+    return results
+
+
+def test_po_actions_rerun_only_their_card(database, add_orders):
+    from streamlit.testing.v1 import AppTest
+
+    _, full_app_poids = add_orders(EMAIL, ["Pending", "Pending"])
+    supplier_id, card_poids = add_orders(EMAIL, ["Pending", "Pending"])
+    add_orders(EMAIL, ["Accepted"] * OTHER_ORDERS)
+    conn = psycopg2.connect(database)
+    try:
+        with conn, conn.cursor() as cur:
+            # AppTest can't replay an empty st.date_input (the proposal form's delivery date)
+            cur.execute("UPDATE PurchaseOrders SET SupProposedDeliver = current_date + 14")
+    finally:
+        conn.close()
+
+    full_app = _click_through(AppTest.from_function(_render_full_app, args=(EMAIL,), default_timeout=60),
+                              full_app_poids, database)
+    cards = _click_through(AppTest.from_function(_render_cards, args=(supplier_id, card_poids),
+                                                 default_timeout=60), card_poids, database)
+
+    print(f"\n{'action':<20} {'full app':>20} {'fragment':>20}")
+    for label, _, _ in ACTIONS:
+        (full_queries, full_ms), (card_queries, card_ms) = full_app[label], cards[label]
+        print(f"{label:<20} {full_queries:>5} q {full_ms:>9.1f} ms {card_queries:>5} q {card_ms:>9.1f} ms")
+
+    for label, _, (status, _) in ACTIONS:
+        if label == "Decline Order":
+            # Only opens the reason form: nothing to write or refetch either way
+            assert full_app[label][0] == cards[label][0] == 0
+            continue
+        # The write, then the order's header and lines in one query
+        assert cards[label][0] == 2, label
+        # The write, then the supplier's active orders, then the lines of the order
+        # acted on unless it left the list (the other orders' lines are still cached)
+        assert full_app[label][0] == (2 if status in ("Delivered", "Declined") else 3), label
@@ -0,0 +1,43 @@
+"""
+Parquet exports keep prices exact at their columns' precision and scale, and fall
+back to float64 when the column has none.
+"""
+from datetime import date
+from decimal import Decimal
+
+import pytest
+
+pytest.importorskip("streamlit")
+pytest.importorskip("psycopg2")
+pa = pytest.importorskip("pyarrow")
+pq = pytest.importorskip("pyarrow.parquet")
+
+from purchase_order.po_export import write_parquet
+
+
+def _line(estimated_price, proposed_price=None):
+    return (1, date(2024, 1, 2), None, "Delivered", None, None, None,
+            7, "Item", 3, estimated_price, None, proposed_price)
+
+
+def _export(tmp_path, rows, numeric_columns):
+    path = tmp_path / "orders.parquet"
+    with open(path, "wb") as out:
+        assert write_parquet(rows, out, numeric_columns=numeric_columns) == len(rows)
+    return pq.read_table(path)
+
+
+def test_prices_use_the_columns_scale(tmp_path):
+    rows = [_line(Decimal("1.255"), Decimal("123456789012.5"))]
+    table = _export(tmp_path, rows, {"estimatedprice": (12, 3), "supproposedprice": (14, 1)})
+    assert table.schema.field("estimatedprice").type == pa.decimal128(12, 3)
+    assert table.column("estimatedprice").to_pylist() == [Decimal("1.255")]
+    assert table.column("supproposedprice").to_pylist() == [Decimal("123456789012.5")]
+
+
+def test_unconstrained_numeric_falls_back_to_float(tmp_path):
+    rows = [_line(Decimal("1.23456789"))]
+    table = _export(tmp_path, rows, {"estimatedprice": (None, None)})
+    assert table.schema.field("estimatedprice").type == pa.float64()
+    assert table.schema.field("supproposedprice").type == pa.float64()
+    assert table.column("estimatedprice").to_pylist() == [1.23456789]
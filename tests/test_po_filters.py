@@ -0,0 +1,25 @@
+"""
+Status filters of the PO queries: no selection (None) means every allowed status,
+an empty selection matches nothing.
+"""
+import pytest
+
+pytest.importorskip("streamlit")
+pytest.importorskip("psycopg2")
+
+from purchase_order.po_handler import ARCHIVED_PO_STATUSES, _archived_page_query, _po_filters
+
+
+def test_none_selects_all_allowed_statuses():
+    conditions, params = _po_filters(7, None, ARCHIVED_PO_STATUSES)
+    assert params == [7, list(ARCHIVED_PO_STATUSES)]
+
+
+def test_empty_selection_matches_nothing():
+    assert _po_filters(7, [], ARCHIVED_PO_STATUSES) is None
+    assert _archived_page_query(7, statuses=[]) == (None, None)
+
+
+def test_selection_is_limited_to_allowed_statuses():
+    conditions, params = _po_filters(7, ["Declined", "Pending"], ARCHIVED_PO_STATUSES)
+    assert params == [7, ["Declined"]]
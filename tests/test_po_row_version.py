@@ -0,0 +1,70 @@
+"""
+An order's RowVersion changes with its lines too: each statement inserting,
+updating or deleting lines bumps it once, so a write based on the lines a
+supplier saw conflicts after someone else changed them, and the version
+update_po_proposals returns is the order's final one.
+
+Needs a PostgreSQL to run against, given as $TEST_DSN (skipped otherwise); see
+the `database` fixture in conftest.py.
+"""
+import pytest
+
+pytest.importorskip("streamlit")
+psycopg2 = pytest.importorskip("psycopg2")
+
+EMAIL = "versions@test.example"
+
+
+@pytest.fixture
+def cur(database):
+    conn = psycopg2.connect(database)
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        yield cur
+    conn.close()
+
+
+def _version(cur, poid):
+    cur.execute("SELECT RowVersion FROM PurchaseOrders WHERE POID = %s", (poid,))
+    return cur.fetchone()[0]
+
+
+def test_line_changes_bump_the_order_once_per_statement(cur, add_orders):
+    _, (poid, other) = add_orders(EMAIL, ["Pending", "Pending"], lines=3)
+    version, other_version = _version(cur, poid), _version(cur, other)
+
+    cur.execute("UPDATE PurchaseOrderItems SET SupProposedQuantity = 5 WHERE POID = %s", (poid,))
+    assert _version(cur, poid) == version + 1
+    cur.execute("DELETE FROM PurchaseOrderItems WHERE POID = %s AND ItemID = "
+                "(SELECT min(ItemID) FROM PurchaseOrderItems WHERE POID = %s)", (poid, poid))
+    assert _version(cur, poid) == version + 2
+    cur.execute("INSERT INTO Item (ItemNameEnglish) VALUES ('Extra') RETURNING ItemID")
+    cur.execute("INSERT INTO PurchaseOrderItems (POID, ItemID, OrderedQuantity) VALUES (%s, %s, 1)",
+                (poid, cur.fetchone()[0]))
+    assert _version(cur, poid) == version + 3
+    # A statement changing no line bumps nothing
+    cur.execute("UPDATE PurchaseOrderItems SET SupProposedQuantity = 5 WHERE POID = %s AND false", (poid,))
+    assert _version(cur, poid) == version + 3
+    assert _version(cur, other) == other_version
+
+
+def test_write_based_on_changed_lines_conflicts(cur, add_orders):
+    from purchase_order.po_handler import CONFLICT_VERSION, update_po_order_proposal, update_po_proposals
+
+    _, (poid,) = add_orders(EMAIL, ["Pending"])
+    cur.execute("SELECT ItemID FROM PurchaseOrderItems WHERE POID = %s ORDER BY ItemID", (poid,))
+    itemid = cur.fetchone()[0]
+    seen = _version(cur, poid)
+
+    # Another app changes a line after the supplier read the order
+    cur.execute("UPDATE PurchaseOrderItems SET OrderedQuantity = 20 WHERE POID = %s AND ItemID = %s",
+                (poid, itemid))
+    result = update_po_proposals(poid, [(itemid, 8, 2.0)], supplier_note="stale", expected_version=seen)
+    assert (result["updated"], result["conflict"]) == (False, CONFLICT_VERSION)
+
+    result = update_po_proposals(poid, [(itemid, 8, 2.0)], supplier_note="fresh",
+                                 expected_version=result["rowversion"])
+    assert result["updated"] and result["changed_items"] == 1
+    assert result["rowversion"] == _version(cur, poid)
+    # The returned version is good for the next write
+    assert update_po_order_proposal(poid, supplier_note="next", expected_version=result["rowversion"])["updated"]
@@ -0,0 +1,134 @@
+"""
+The query cache must never serve data older than a completed write: a result
+fetched while an invalidation happened is not stored, invalidating a PO drops
+every entry depending on it, and entries expire at their TTL. Runs against
+both backends (in-process and shared SQLite).
+"""
+import pytest
+
+pytest.importorskip("streamlit")
+
+import query_cache
+from query_cache import QueryCache, SQLiteQueryCache, cached_per_key, cached_query, po_tag, supplier_tag
+
+
+class FakeClock:
+    """Stands in for the time module in query_cache: monotonic() and time() move only when told."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(query_cache, "time", fake)
+    return fake
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def cache(request, tmp_path, clock, monkeypatch):
+    if request.param == "memory":
+        cache = QueryCache(ttl=60)
+    else:
+        cache = SQLiteQueryCache(str(tmp_path / "cache.sqlite3"), ttl=60)
+    # cached_query looks the process-wide cache up on every call
+    monkeypatch.setattr(query_cache, "get_query_cache", lambda: cache)
+    return cache
+
+
+def test_result_fetched_during_an_invalidation_is_not_stored(cache):
+    calls = []
+
+    @cached_query(lambda result, supplier_id: [supplier_tag(supplier_id)])
+    def get_orders(supplier_id):
+        calls.append(supplier_id)
+        if len(calls) == 1:
+            # A write commits while this read is in flight: its result may be stale
+            query_cache.invalidate(supplier_tag(supplier_id))
+        return f"orders v{len(calls)}"
+
+    assert get_orders(7) == "orders v1"
+    assert get_orders(7) == "orders v2"  # refetched, not the racing result
+    assert get_orders(7) == "orders v2"  # now cached
+    assert len(calls) == 2
+    assert cache.stats()["skipped_stores"] == 1
+
+
+def test_set_with_an_outdated_generation_is_skipped(cache):
+    generation = cache.generation
+    cache.invalidate(po_tag(1))
+    cache.set("key", "stale", [po_tag(1)], generation=generation)
+    assert cache.get("key") == (False, None)
+
+
+def test_invalidating_a_po_drops_listings_and_items(cache):
+    fetches = {"listing": 0, "items": 0}
+
+    @cached_query(lambda result, supplier_id: [supplier_tag(supplier_id)] + [po_tag(poid) for poid in result])
+    def list_orders(supplier_id):
+        fetches["listing"] += 1
+        return [41, 42]
+
+    @cached_query(lambda result, poid: [po_tag(poid)])
+    def get_items(poid):
+        fetches["items"] += 1
+        return [f"line of {poid}"]
+
+    list_orders(7), get_items(42), get_items(41)
+    list_orders(7), get_items(42), get_items(41)
+    assert fetches == {"listing": 1, "items": 2}
+
+    query_cache.invalidate(po_tag(42))
+    list_orders(7), get_items(42), get_items(41)
+    # The listing and PO 42's lines are refetched; PO 41's lines are still cached
+    assert fetches == {"listing": 2, "items": 3}
+
+
+def test_bulk_reads_fetch_only_uncached_keys(cache):
+    fetched = []
+
+    @cached_per_key(lambda items, poid: [po_tag(poid)])
+    def get_items(poids):
+        fetched.append(list(poids))
+        return {poid: [f"line of {poid}"] for poid in poids}
+
+    assert get_items([41, 42]) == {41: ["line of 41"], 42: ["line of 42"]}
+    # Opening one more order fetches just that one
+    assert get_items([41, 42, 43]) == {41: ["line of 41"], 42: ["line of 42"], 43: ["line of 43"]}
+    assert get_items([43]) == {43: ["line of 43"]}
+    query_cache.invalidate(po_tag(42))
+    get_items([41, 42, 43])
+    assert get_items([]) == {}
+    assert fetched == [[41, 42], [43], [42]]
+
+
+def test_entries_expire_at_their_ttl(cache, clock):
+    cache.set("key", "value", [po_tag(1)])
+    clock.now += 59.9
+    assert cache.get("key") == (True, "value")
+    clock.now += 0.1
+    assert cache.get("key") == (False, None)
+
+    cache.set("short", "value", ttl=5)
+    clock.now += 5
+    assert cache.get("short") == (False, None)
+
+
+def test_hit_rate_counters(cache):
+    @cached_query(lambda result, n: [po_tag(n)])
+    def get(n):
+        return n
+
+    for n in (1, 1, 1, 2, 2):  # 2 misses, then 3 hits
+        get(n)
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (3, 2)
+    assert stats["hit_rate"] == pytest.approx(0.6)
+    assert stats["entries"] == 2
@@ -0,0 +1,118 @@
+"""
+Reads routed to read replicas ([neon] replica_dsns) come from a replica, except
+within read_your_writes_seconds of a write, when they stay on the primary: a
+write of this process's, or (with the shared query cache) another process's.
+An unreachable replica is failed over, and with none left reads fall back to
+the primary.
+
+The "replica" is a second schema holding the same supplier under another name,
+so each read shows where it was served from.
+
+Needs a PostgreSQL to run against, given as $TEST_DSN (skipped otherwise); see
+the `database` fixture in conftest.py.
+"""
+import time
+
+import pytest
+
+st = pytest.importorskip("streamlit")
+psycopg2 = pytest.importorskip("psycopg2")
+
+EMAIL = "replica@test.example"
+REPLICA_MARK = "served by replica"
+READ_YOUR_WRITES = 0.5
+
+# Nothing listens there: connecting fails at once
+UNREACHABLE_DSN = "postgresql://postgres@127.0.0.1:1/amas?connect_timeout=1"
+
+
+@pytest.fixture
+def replica(database, make_schema, add_orders, monkeypatch):
+    """
+    Returns configure(listed_first=(), **neon): points [neon] at the replica, after
+    the `listed_first` DSNs, and returns the POID of the supplier's order on the
+    primary.
+    """
+    import db_handler
+
+    replica_dsn = make_schema()
+    _, (poid,) = add_orders(EMAIL, ["Pending"])
+    conn = psycopg2.connect(replica_dsn)
+    try:
+        with conn, conn.cursor() as cur:
+            cur.execute("INSERT INTO supplier (suppliername, contactemail) VALUES (%s, %s)", (REPLICA_MARK, EMAIL))
+    finally:
+        conn.close()
+    # Writes of earlier tests in this process must not hold reads on the primary
+    monkeypatch.setattr(db_handler, "_last_write", float("-inf"))
+    monkeypatch.setattr(db_handler, "_seen_generation", None)
+
+    def configure(listed_first=(), **neon):
+        st.secrets["neon"].update(replica_dsns=[*listed_first, replica_dsn],
+                                  read_your_writes_seconds=READ_YOUR_WRITES, **neon)
+        return poid
+
+    yield configure
+    from db_handler import get_replica_router
+
+    router = get_replica_router()
+    if router is not None:
+        for pool in router.pools:
+            pool.closeall()
+
+
+def _from_replica():
+    from supplier_db import get_supplier_by_email
+    return get_supplier_by_email.uncached(EMAIL).suppliername == REPLICA_MARK
+
+
+def test_reads_stay_on_the_primary_after_a_write(replica):
+    from db_handler import get_replica_router
+    from purchase_order.po_handler import update_po_order_proposal
+
+    poid = replica()
+    assert _from_replica()
+
+    update_po_order_proposal(poid, supplier_note="written to the primary")
+    assert not _from_replica()
+    time.sleep(READ_YOUR_WRITES)
+    assert _from_replica()
+
+    stats = get_replica_router().stats()
+    assert stats["reads"] == [2]
+    assert stats["failovers"] == stats["primary_fallbacks"] == 0
+
+
+def test_reads_stay_on_the_primary_after_another_process_writes(replica, tmp_path):
+    from query_cache import SQLiteQueryCache, po_tag
+
+    poid = replica()
+    path = str(tmp_path / "query_cache.sqlite3")
+    st.secrets["cache"] = {"backend": "sqlite", "path": path}
+
+    # A process that just started can't tell how recent the last write was
+    assert not _from_replica()
+    time.sleep(READ_YOUR_WRITES)
+    assert _from_replica()
+
+    # Another process's write invalidates the shared cache
+    SQLiteQueryCache(path).invalidate(po_tag(poid))
+    assert not _from_replica()
+    time.sleep(READ_YOUR_WRITES)
+    assert _from_replica()
+
+
+def test_unreachable_replicas_are_failed_over(replica):
+    from db_handler import get_replica_router
+
+    replica(listed_first=[UNREACHABLE_DSN], replica_retry_after=600)
+
+    router = get_replica_router()
+    assert all(_from_replica() for _ in range(4))
+    stats = router.stats()
+    assert stats["failovers"] == 1 and stats["down"] == [0]
+    assert stats["reads"] == [0, 4]
+
+    router.mark_down(1, "simulated outage")
+    assert not _from_replica()
+    assert router.stats()["primary_fallbacks"] == 1
@@ -0,0 +1,86 @@
+"""
+The SupplierPOStats rows triggers maintain stay equal to a rebuild from the
+orders (refresh_supplier_po_stats) through status changes, line edits, an order
+moved to another supplier and orders deleted with or without their lines
+cascading.
+
+Needs a PostgreSQL to run against, given as $TEST_DSN (skipped otherwise); see
+the `make_schema` fixture in conftest.py.
+"""
+import pytest
+
+psycopg2 = pytest.importorskip("psycopg2")
+
+STATS_QUERY = """
+SELECT SupplierID, PendingCount, AcceptedCount, ShippingCount, DeclinedCount, DeliveredCount,
+       CompletedCount, DueDeliveredCount, OnTimeCount, LeadTimeDaysTotal, LeadTimeCount,
+       EstimatedValue, ProposedValue
+FROM SupplierPOStats
+ORDER BY SupplierID
+"""
+
+
+@pytest.fixture
+def cur(make_schema):
+    conn = psycopg2.connect(make_schema())
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        # As in the production schema: deleting an order deletes its lines
+        cur.execute("ALTER TABLE PurchaseOrderItems DROP CONSTRAINT purchaseorderitems_poid_fkey, "
+                    "ADD FOREIGN KEY (POID) REFERENCES PurchaseOrders (POID) ON DELETE CASCADE")
+        yield cur
+    conn.close()
+
+
+def _stats(cur):
+    cur.execute(STATS_QUERY)
+    return [row for row in cur.fetchall() if any(row[1:])]
+
+
+def _rebuilt(cur):
+    """The rows refresh_supplier_po_stats computes from the orders (left unapplied)."""
+    cur.execute("BEGIN")
+    try:
+        cur.execute("SELECT refresh_supplier_po_stats(SupplierID) "
+                    "FROM (SELECT SupplierID FROM SupplierPOStats UNION SELECT SupplierID FROM PurchaseOrders) s")
+        return _stats(cur)
+    finally:
+        cur.execute("ROLLBACK")
+
+
+def _add_order(cur, supplier_id, status, prices):
+    cur.execute("INSERT INTO PurchaseOrders (SupplierID, OrderDate, ExpectedDelivery, Status) "
+                "VALUES (%s, current_date - 10, current_date, %s) RETURNING POID", (supplier_id, status))
+    poid = cur.fetchone()[0]
+    for price in prices:
+        cur.execute("INSERT INTO Item (ItemNameEnglish) VALUES ('Item') RETURNING ItemID")
+        cur.execute("INSERT INTO PurchaseOrderItems (POID, ItemID, OrderedQuantity, EstimatedPrice) "
+                    "VALUES (%s, %s, 4, %s)", (poid, cur.fetchone()[0], price))
+    return poid
+
+
+def test_stats_match_a_rebuild(cur):
+    cur.execute("INSERT INTO supplier (suppliername) VALUES ('A'), ('B') RETURNING supplierid")
+    a, b = (row[0] for row in cur.fetchall())
+    pending = _add_order(cur, a, "Pending", [2.50, 10])
+    moved = _add_order(cur, a, "Accepted", [3, 7.25])
+    cascaded = _add_order(cur, b, "Shipping", [1.10, 2.20, 3.30])
+    emptied = _add_order(cur, b, "Pending", [5])
+    assert _stats(cur) == _rebuilt(cur)
+
+    cur.execute("UPDATE PurchaseOrders SET Status = 'Delivered' WHERE POID = %s", (pending,))
+    cur.execute("UPDATE PurchaseOrderItems SET SupProposedQuantity = 2, SupProposedPrice = 9 WHERE POID = %s",
+                (pending,))
+    assert _stats(cur) == _rebuilt(cur)
+
+    cur.execute("UPDATE PurchaseOrders SET SupplierID = %s WHERE POID = %s", (b, moved))
+    cur.execute("UPDATE PurchaseOrders SET SupplierNote = 'moved' WHERE POID = %s", (moved,))
+    assert _stats(cur) == _rebuilt(cur)
+
+    cur.execute("DELETE FROM PurchaseOrders WHERE POID = %s", (cascaded,))
+    cur.execute("DELETE FROM PurchaseOrderItems WHERE POID = %s", (emptied,))
+    cur.execute("DELETE FROM PurchaseOrders WHERE POID = %s", (emptied,))
+    stats = _stats(cur)
+    assert stats == _rebuilt(cur)
+    # Only the moved order is left with B: 4 * 3 + 4 * 7.25
+    assert [row[-2] for row in stats if row[0] == b] == [41]
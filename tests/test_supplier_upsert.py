@@ -0,0 +1,84 @@
+"""
+Concurrent first logins as the same new email (get_or_create_supplier, the login
+path): exactly one supplier row must exist, and only the insert that created it
+counts as a write. Later logins cost one SELECT and no write.
+
+Needs a PostgreSQL to run against, given as $TEST_DSN (skipped otherwise); see
+the `database` fixture in conftest.py.
+"""
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+st = pytest.importorskip("streamlit")
+psycopg2 = pytest.importorskip("psycopg2")
+
+import db_handler
+from query_metrics import get_query_metrics, reset_query_metrics
+
+THREADS = 16
+LOGINS = 200
+
+
+class _SessionStates(threading.local):
+    """Stands in for st.session_state: one per thread, replaced by new_session()."""
+
+    def __init__(self):
+        self.state = {}
+
+    def new_session(self):
+        self.state = {}
+
+    def get(self, key, default=None):
+        return self.state.get(key, default)
+
+    def __setitem__(self, key, value):
+        self.state[key] = value
+
+    def pop(self, key, default=None):
+        return self.state.pop(key, default)
+
+
+def _login_round(email, monkeypatch):
+    """Runs LOGINS concurrent logins as `email`; returns (supplier IDs, round trips, writes noted)."""
+    from supplier_db import get_or_create_supplier
+
+    sessions = _SessionStates()
+    monkeypatch.setattr(st, "session_state", sessions)
+    writes = []
+    monkeypatch.setattr(db_handler, "note_write", lambda: writes.append(1))
+
+    def login(_):
+        sessions.new_session()  # each login is a new session, with nothing memoized
+        return get_or_create_supplier(email).supplierid
+
+    reset_query_metrics()
+    with ThreadPoolExecutor(max_workers=THREADS) as pool:
+        supplier_ids = set(pool.map(login, range(LOGINS)))
+    round_trips = sum(stats["count"] for site, stats in get_query_metrics().items()
+                      if site.startswith("supplier_db:"))
+    return supplier_ids, round_trips, len(writes)
+
+
+def test_concurrent_first_logins_create_one_supplier(database, monkeypatch):
+    email = f"race-{uuid.uuid4().hex[:8]}@test.example"
+    supplier_ids, round_trips, writes = _login_round(email, monkeypatch)
+
+    conn = psycopg2.connect(database)
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT count(*) FROM supplier WHERE contactemail = %s", (email,))
+            rows = cur.fetchone()[0]
+    finally:
+        conn.close()
+
+    assert rows == 1
+    assert len(supplier_ids) == 1
+    assert writes == 1
+    # A SELECT each, an INSERT for those that found nothing, a SELECT more for those that lost the race
+    assert LOGINS <= round_trips <= 3 * LOGINS
+
+    # The supplier exists now: a SELECT per login, nothing written
+    assert _login_round(email, monkeypatch) == (supplier_ids, LOGINS, 0)
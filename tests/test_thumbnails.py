@@ -0,0 +1,64 @@
+"""
+A picture that can't be decoded is remembered as such, so it is neither fetched
+nor decoded again on the next render.
+"""
+import pytest
+
+pytest.importorskip("streamlit")
+pytest.importorskip("psycopg2")
+
+from models import PurchaseOrderItem
+from purchase_order import po_handler, thumbnails
+from purchase_order.thumbnails import UNDECODABLE, ThumbnailCache
+from query_cache import SQLiteQueryCache
+
+GARBAGE = b"not a picture"
+
+
+@pytest.fixture
+def decodes(monkeypatch):
+    """Counts make_thumbnail calls."""
+    calls = []
+    make_thumbnail = thumbnails.make_thumbnail
+
+    def counting(*args, **kwargs):
+        calls.append(args)
+        return make_thumbnail(*args, **kwargs)
+
+    monkeypatch.setattr(thumbnails, "make_thumbnail", counting)
+    return calls
+
+
+def test_undecodable_picture_is_cached(decodes):
+    cache = ThumbnailCache()
+    assert cache.get(7, "hash") is None
+    assert cache.put(7, "hash", GARBAGE) is None
+    assert cache.get(7, "hash") == UNDECODABLE
+    assert cache.get(7, "other hash") is None  # a new picture is tried again
+    assert len(decodes) == 1
+
+
+def test_undecodable_picture_is_shared(tmp_path, decodes):
+    path = str(tmp_path / "cache.sqlite3")
+    ThumbnailCache(shared=SQLiteQueryCache(path)).put(7, "hash", GARBAGE)
+    assert ThumbnailCache(shared=SQLiteQueryCache(path)).get(7, "hash") == UNDECODABLE
+
+
+def test_undecodable_picture_is_fetched_once(monkeypatch, decodes):
+    fetches = []
+
+    def run_query(query, params=None, **kwargs):
+        fetches.append(params)
+        return [{"itemid": 7, "picturehash": "hash", "itempicture": GARBAGE}]
+
+    cache = ThumbnailCache()
+    monkeypatch.setattr(po_handler, "get_image_base_url", lambda: None)
+    monkeypatch.setattr(po_handler, "get_thumbnail_cache", lambda: cache)
+    monkeypatch.setattr(po_handler, "run_query", run_query)
+
+    for _ in range(3):
+        item = PurchaseOrderItem(7, "Item", "hash", 1, None, None, None)
+        po_handler._attach_thumbnails([item])
+        assert item.itempicture is None
+    assert len(fetches) == 1
+    assert len(decodes) == 1
@@ -0,0 +1,128 @@
+"""
+The write-behind queue applies every journaled write exactly once: a batch the
+database committed but the journal never recorded (the process died in between)
+is replayed from its idempotency keys without writing again, and writes queued
+while the database can't be reached are applied once it is back.
+
+Each write bumps its order's RowVersion once, so RowVersion shows whether a write
+was lost or applied twice.
+
+Needs a PostgreSQL to run against, given as $TEST_DSN (skipped otherwise); see
+the `database` fixture in conftest.py.
+"""
+import threading
+import time
+
+import pytest
+
+st = pytest.importorskip("streamlit")
+psycopg2 = pytest.importorskip("psycopg2")
+
+EMAIL = "queue@test.example"
+
+# Nothing listens there: connecting fails at once
+UNREACHABLE_DSN = "postgresql://postgres@127.0.0.1:1/amas?connect_timeout=1"
+
+
+def _orders(dsn, poids):
+    conn = psycopg2.connect(dsn)
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT POID, RowVersion, SupplierNote FROM PurchaseOrders WHERE POID = ANY(%s)", (poids,))
+            return {poid: (version, note) for poid, version, note in cur.fetchall()}
+    finally:
+        conn.close()
+
+
+def _wait_for(condition, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+@pytest.fixture
+def journal(tmp_path):
+    return str(tmp_path / "journal.sqlite3")
+
+
+def test_write_committed_before_a_crash_is_replayed_once(database, add_orders, journal):
+    from purchase_order.po_write_queue import APPLIED, QUEUED, POWriteQueue
+
+    class CrashingQueue(POWriteQueue):
+        """Dies after its first batch commits, before the journal records it."""
+        crashed = threading.Event()
+
+        def _finish(self, outcomes):
+            self.crashed.set()
+            self._stopping.set()
+
+    _, poids = add_orders(EMAIL, ["Pending", "Accepted"])
+    before = _orders(database, poids)
+
+    queue = CrashingQueue(journal)
+    keys = [queue.enqueue("update_po_order_proposal", {"poid": poid, "supplier_note": f"note {poid}"})
+            for poid in poids]
+    queue.start()
+    assert CrashingQueue.crashed.wait(10)
+    queue.stop()
+    queue._db.close()
+
+    committed = _orders(database, poids)
+    for poid in poids:
+        assert committed[poid] == (before[poid][0] + 1, f"note {poid}")
+
+    # The restarted process finds the batch still queued in the journal
+    queue = POWriteQueue(journal)
+    assert [queue.status(key)["state"] for key in keys] == [QUEUED, QUEUED]
+    queue.start()
+    try:
+        assert queue.drain(10)
+    finally:
+        # Joins the worker, which counts a batch after recording it in the journal
+        queue.stop()
+    stats = queue.stats()
+
+    assert stats["replayed"] == len(poids)
+    assert stats["applied"] == len(poids)
+    for key, poid in zip(keys, poids):
+        status = queue.status(key)
+        assert status["state"] == APPLIED
+        assert not status["result"]["conflict"]
+    assert _orders(database, poids) == committed
+
+
+def test_writes_queued_during_an_outage_are_applied_once(database, add_orders, journal):
+    import db_handler
+    from purchase_order.po_write_queue import APPLIED, POWriteQueue
+
+    _, poids = add_orders(EMAIL, ["Pending", "Accepted"])
+    before = _orders(database, poids)
+    writes = [(poids[n % len(poids)], f"write {n}") for n in range(10)]
+
+    st.secrets["neon"]["dsn"] = UNREACHABLE_DSN
+    queue = POWriteQueue(journal, base_delay=0.05, max_delay=0.2, max_attempts=1000).start()
+    try:
+        keys = [queue.enqueue("update_po_order_proposal", {"poid": poid, "supplier_note": note})
+                for poid, note in writes]
+        assert _wait_for(lambda: queue.stats()["retries"] >= 2)
+        assert queue.pending() == len(writes)
+
+        st.secrets["neon"]["dsn"] = database
+        db_handler.get_db_config.clear()
+        db_handler.get_pool.clear()
+        assert queue.drain(10)
+    finally:
+        queue.stop()
+    stats = queue.stats()
+
+    assert stats["applied"] == len(writes)
+    assert stats["failed"] == stats["conflicts"] == 0
+    assert all(queue.status(key)["state"] == APPLIED for key in keys)
+    after = _orders(database, poids)
+    for poid in poids:
+        count = sum(1 for written, _ in writes if written == poid)
+        last_note = [note for written, note in writes if written == poid][-1]
+        assert after[poid] == (before[poid][0] + count, last_note)